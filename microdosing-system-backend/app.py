@@ -4,7 +4,7 @@ pymysql.install_as_MySQLdb()
 
 from flask import Flask, send_from_directory
 from config import Config
-from extensions import db, ma, migrate, jwt
+from extensions import db, ma, migrate, jwt, modbus, acquisition, socketio, weight_buffer, weight_rollups, barcodes, barcode_exporter, export_jobs, authz, master_cache, barcode_index, dosing, weight_filters, traces
 from flask_cors import CORS
 
 def create_app():
@@ -12,19 +12,32 @@ def create_app():
     app.config.from_object(Config)
 
     db.init_app(app)
+    master_cache.init_app(app)
+    barcode_index.init_app(app)
     ma.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    authz.init_app(app)
+    modbus.init_app(app)
+    weight_buffer.init_app(app)
+    barcodes.init_app(app)
+    barcode_exporter.init_app(app)
     CORS(app, supports_credentials=True, origins=["http://localhost:5173", "http://localhost:5000"])
+    socketio.init_app(app, cors_allowed_origins=["http://localhost:5173", "http://localhost:5000"])
 
     with app.app_context():
         try:
             from models.user import User
             from models.material import Material
             from models.recipe import Recipe, RecipeMaterial
-            from models.production import ProductionOrder, Batch, BatchMaterialDispensing, MaterialTransaction
+            from models.production import ProductionOrder, Batch, BatchMaterialDispensing, MaterialTransaction, DispensingTrace
             from models.weight import WeightEntry
             from models.storage import StorageBucket
+            from models.export_job import ExportJob
+            from models.dosing import DosingProfile
+            from models.scale import Scale
+            from models.master_data import MasterDataVersion
+            master_cache.register(Recipe, RecipeMaterial, Material, StorageBucket)
 
             if not app.config["FLASK_ENV"] == "production":
                 db.create_all()
@@ -40,6 +53,9 @@ def create_app():
             from routes.weight_routes import weight_bp
             from routes.storage_routes import storage_bp
             from routes.scale_routes import scale_bp
+            from routes.export_routes import export_bp
+            from routes.barcode_routes import barcode_bp
+            from routes.scan_routes import scan_bp
 
             app.register_blueprint(storage_bp, url_prefix="/api")
             app.register_blueprint(user_bp, url_prefix="/api")
@@ -48,6 +64,23 @@ def create_app():
             app.register_blueprint(production_bp, url_prefix="/api")
             app.register_blueprint(weight_bp, url_prefix="/api")
             app.register_blueprint(scale_bp, url_prefix='/api/scale')
+            app.register_blueprint(export_bp, url_prefix="/api")
+            app.register_blueprint(barcode_bp, url_prefix="/api")
+            app.register_blueprint(scan_bp, url_prefix="/api")
+
+            acquisition.init_app(app)
+            weight_filters.init_app(app)
+            traces.init_app(app)
+            dosing.init_app(app)
+            weight_rollups.init_app(app)
+            export_jobs.init_app(app)
+
+            from routes.scale_events import ScaleNamespace, broadcaster, NAMESPACE
+            broadcaster.init_app(app)
+            socketio.on_namespace(ScaleNamespace(NAMESPACE))
+
+            from routes.export_routes import ExportNamespace, EXPORT_NAMESPACE
+            socketio.on_namespace(ExportNamespace(EXPORT_NAMESPACE))
 
         except Exception as e:
             print(f"⚠️ Error registering Blueprints: {e}")
@@ -23,3 +23,118 @@ class Config:
     JWT_COOKIE_CSRF_PROTECT = False  #  Temporarily set to False for testing
     JWT_CSRF_IN_COOKIES = True
     JWT_ACCESS_CSRF_HEADER_NAME = "X-CSRF-TOKEN"
+    AUTHZ_CACHE_TTL = float(os.getenv("AUTHZ_CACHE_TTL", 30))  # seconds a user's role/status is trusted without a DB read
+
+    # ✅ Scale (Modbus TCP) connection pool
+    SCALE_HOST = os.getenv("SCALE_HOST", "localhost")
+    SCALE_PORT = int(os.getenv("SCALE_PORT", 502))
+    SCALE_SLAVE = int(os.getenv("SCALE_SLAVE", 1))
+    SCALE_MODEL = os.getenv("SCALE_MODEL", "default")  # key into models.scale.REGISTER_MAPS
+    SCALE_REGISTER_MAPS = os.getenv("SCALE_REGISTER_MAPS")  # JSON, extra register maps per scale model
+    MODBUS_POOL_SIZE = int(os.getenv("MODBUS_POOL_SIZE", 2))  # connections per (host, port, slave)
+    MODBUS_TIMEOUT = float(os.getenv("MODBUS_TIMEOUT", 1.0))  # seconds
+    MODBUS_BACKOFF_MAX = float(os.getenv("MODBUS_BACKOFF_MAX", 30.0))  # reconnect backoff cap, seconds
+    MODBUS_IDLE_CHECK = float(os.getenv("MODBUS_IDLE_CHECK", 5.0))  # probe sockets idle longer than this
+
+    # ✅ Background scale acquisition
+    SCALE_ACQUISITION_ENABLED = os.getenv("SCALE_ACQUISITION_ENABLED", "true").lower() == "true"
+    SCALE_POLL_INTERVAL = float(os.getenv("SCALE_POLL_INTERVAL", 0.2))  # seconds between reads of each scale, unless the scale sets its own
+    SCALE_STALE_AFTER = float(os.getenv("SCALE_STALE_AFTER", 1.0))  # samples older than this are flagged stale
+    SCALE_RING_SIZE = int(os.getenv("SCALE_RING_SIZE", 256))  # samples kept in memory per scale
+    SCALES = os.getenv("SCALES")  # JSON list, used while the scale table is empty, e.g. [{"id": 1, "host": "10.0.0.5", "port": 502, "slave": 1, "model": "default"}]
+    SCALE_REGISTRY_REFRESH = float(os.getenv("SCALE_REGISTRY_REFRESH", 60))  # seconds between re-reads of the scale table; 0 = only on edits
+    SCALE_BREAKER_THRESHOLD = int(os.getenv("SCALE_BREAKER_THRESHOLD", 3))  # consecutive failed polls before a scale is skipped
+    SCALE_BREAKER_RESET = float(os.getenv("SCALE_BREAKER_RESET", 5.0))  # seconds before a skipped scale is probed again
+    SCALE_BREAKER_RESET_MAX = float(os.getenv("SCALE_BREAKER_RESET_MAX", 60.0))  # cap as failed probes double that wait
+
+    # ✅ Shared sample table (one polling process per host, every worker reads)
+    SCALE_TABLE_PATH = os.getenv("SCALE_TABLE_PATH", "" if os.name == "nt" else None)  # unset = a temp file per DATABASE_URL; "" = each process polls on its own
+    SCALE_TABLE_SLOTS = int(os.getenv("SCALE_TABLE_SLOTS", 256))  # max scales in the table
+    SCALE_TABLE_FOLLOW_INTERVAL = float(os.getenv("SCALE_TABLE_FOLLOW_INTERVAL", 0.02))  # seconds between a follower's scans for new samples
+    SCALE_TABLE_ELECTION_INTERVAL = float(os.getenv("SCALE_TABLE_ELECTION_INTERVAL", 2.0))  # seconds between a follower's attempts to take over polling
+
+    # ✅ Weight filtering and stable capture
+    WEIGHT_FILTER = os.getenv("WEIGHT_FILTER", "ema")  # smoother after the median stage: ema, moving_average or none
+    WEIGHT_FILTER_WINDOW = int(os.getenv("WEIGHT_FILTER_WINDOW", 5))  # samples, moving_average
+    WEIGHT_FILTER_ALPHA = float(os.getenv("WEIGHT_FILTER_ALPHA", 0.3))  # ema weight of the newest sample
+    WEIGHT_MEDIAN_WINDOW = int(os.getenv("WEIGHT_MEDIAN_WINDOW", 5))  # samples; 1 disables spike rejection
+    WEIGHT_STABLE_WINDOW = float(os.getenv("WEIGHT_STABLE_WINDOW", 0.5))  # seconds without motion the weight must hold
+    WEIGHT_STABLE_STD = float(os.getenv("WEIGHT_STABLE_STD", 0.005))  # max standard deviation over that window
+    WEIGHT_CAPTURE_TIMEOUT = float(os.getenv("WEIGHT_CAPTURE_TIMEOUT", 5.0))  # seconds a capture waits for a stable weight
+
+    # ✅ Material requirements planning
+    MRP_SET_POINT_UNIT = os.getenv("MRP_SET_POINT_UNIT", "kg")  # unit of recipe set points (the scales' unit): kg, g or mg
+
+    # ✅ Dispensing weight traces
+    DISPENSING_TRACE_MAX_SAMPLES = int(os.getenv("DISPENSING_TRACE_MAX_SAMPLES", 100000))  # per trace; later samples are dropped and the trace marked truncated
+    DISPENSING_TRACE_SYNC_INTERVAL = float(os.getenv("DISPENSING_TRACE_SYNC_INTERVAL", 1.0))  # seconds between checks for traces started or stopped by other workers
+    DISPENSING_TRACE_MAX_DURATION = float(os.getenv("DISPENSING_TRACE_MAX_DURATION", 3600))  # a trace still recording this long is stored as it stands and marked truncated
+
+    # ✅ Closed-loop dosing
+    DOSING_TICK = float(os.getenv("DOSING_TICK", 0.02))  # seconds between controller steps
+    DOSING_FINE_FRACTION = float(os.getenv("DOSING_FINE_FRACTION", 0.1))  # switch coarse -> fine this fraction below the set point
+    DOSING_DEFAULT_TOLERANCE = float(os.getenv("DOSING_DEFAULT_TOLERANCE", 0.1))  # accepted |actual - set point|, in weight units, for recipe lines without a tolerance
+    DOSING_DEFAULT_INFLIGHT_TIME = float(os.getenv("DOSING_DEFAULT_INFLIGHT_TIME", 0.2))  # feeder-to-scale seconds before a material has a learned profile
+    DOSING_LEARNING_GAIN = float(os.getenv("DOSING_LEARNING_GAIN", 0.3))  # weight of the latest run in the learned in-flight time
+    DOSING_RATE_WINDOW = float(os.getenv("DOSING_RATE_WINDOW", 0.2))  # seconds the live feed rate is measured over
+    DOSING_STABLE_BAND = float(os.getenv("DOSING_STABLE_BAND", 0.01))  # max spread of a settled weight
+    DOSING_SETTLE_TIME = float(os.getenv("DOSING_SETTLE_TIME", 0.5))  # seconds within the band before verifying
+    DOSING_MAX_SETTLE_TIME = float(os.getenv("DOSING_MAX_SETTLE_TIME", 10.0))  # verify anyway after this long
+    DOSING_TIMEOUT = float(os.getenv("DOSING_TIMEOUT", 300.0))  # whole run, seconds
+    DOSING_MAX_TOPUPS = int(os.getenv("DOSING_MAX_TOPUPS", 3))  # fine pulses after an underweight verify
+    DOSING_MIN_JOG = float(os.getenv("DOSING_MIN_JOG", 0.1))  # shortest top-up pulse, seconds
+    DOSING_ACTUATORS = os.getenv("DOSING_ACTUATORS")  # JSON per scale id, e.g. {"1": {"type": "modbus", "coarse_coil": 0, "fine_coil": 1}}; default manual
+    DOSING_SIMULATOR = os.getenv("DOSING_SIMULATOR")  # JSON options for services.dosing.SimulatedPlant
+
+    # ✅ Socket.IO live weight push
+    SOCKET_MAX_RATE = float(os.getenv("SOCKET_MAX_RATE", 20.0))  # max weight events per second per subscriber
+    SOCKET_PUSH_TICK = float(os.getenv("SOCKET_PUSH_TICK", 0.05))  # broadcaster wake-up interval, seconds
+    SOCKET_ACK_TIMEOUT = float(os.getenv("SOCKET_ACK_TIMEOUT", 5.0))  # unacknowledged push older than this = slow client
+    SOCKET_MAX_DROPPED = int(os.getenv("SOCKET_MAX_DROPPED", 200))  # samples skipped for a slow client before disconnecting
+
+    # ✅ Buffered weight ingestion (POST /api/weights/bulk?buffered=true)
+    WEIGHT_BUFFER_MAX_ROWS = int(os.getenv("WEIGHT_BUFFER_MAX_ROWS", 500))  # flush once this many samples are queued
+    WEIGHT_BUFFER_MAX_AGE = float(os.getenv("WEIGHT_BUFFER_MAX_AGE", 1.0))  # ...or once the oldest is this old, seconds
+    WEIGHT_BUFFER_MAX_PENDING = int(os.getenv("WEIGHT_BUFFER_MAX_PENDING", 50000))  # drop oldest beyond this
+
+    # ✅ Weight history rollups and retention
+    WEIGHT_ROLLUP_ENABLED = os.getenv("WEIGHT_ROLLUP_ENABLED", "true").lower() == "true"
+    WEIGHT_ROLLUP_INTERVAL = float(os.getenv("WEIGHT_ROLLUP_INTERVAL", 60))  # seconds between rollup/prune cycles
+    WEIGHT_ROLLUP_BATCH_SIZE = int(os.getenv("WEIGHT_ROLLUP_BATCH_SIZE", 5000))  # raw rows folded per transaction
+    WEIGHT_ROLLUP_SETTLE_SECONDS = float(os.getenv("WEIGHT_ROLLUP_SETTLE_SECONDS", 120))  # rows wait this long before rollup; must exceed the longest insert transaction
+    WEIGHT_PRUNE_BATCH_SIZE = int(os.getenv("WEIGHT_PRUNE_BATCH_SIZE", 1000))  # raw rows deleted per transaction
+    WEIGHT_RAW_RETENTION_DAYS = int(os.getenv("WEIGHT_RAW_RETENTION_DAYS", 30))  # 0 = keep raw samples forever
+    WEIGHT_MINUTE_ROLLUP_RETENTION_DAYS = int(os.getenv("WEIGHT_MINUTE_ROLLUP_RETENTION_DAYS", 365))  # hour/day rollups are kept
+
+    # ✅ Barcode Excel exports
+    BARCODE_EXPORT_WORKERS = int(os.getenv("BARCODE_EXPORT_WORKERS", 2))  # render processes; 0/1 = render inline
+    BARCODE_EXPORT_CHUNK_SIZE = int(os.getenv("BARCODE_EXPORT_CHUNK_SIZE", 500))  # rows fetched and rendered per batch
+
+    # ✅ Rendered barcode cache (/api/barcodes, exports)
+    BARCODE_CACHE_MAX_BYTES = int(os.getenv("BARCODE_CACHE_MAX_BYTES", 32 * 1024 * 1024))  # in-memory LRU, per process
+    BARCODE_CACHE_DIR = os.getenv("BARCODE_CACHE_DIR")  # defaults to <instance>/barcodes
+    BARCODE_DISK_CACHE_MAX_BYTES = int(os.getenv("BARCODE_DISK_CACHE_MAX_BYTES", 256 * 1024 * 1024))  # 0 = memory only
+
+    # ✅ Background export jobs (POST .../export/barcodes)
+    EXPORT_JOBS_ENABLED = os.getenv("EXPORT_JOBS_ENABLED", "true").lower() == "true"
+    EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", 2))  # worker threads per process
+    EXPORT_JOB_POLL_INTERVAL = float(os.getenv("EXPORT_JOB_POLL_INTERVAL", 2.0))  # seconds an idle worker sleeps between checks for jobs queued by other processes
+    EXPORT_RESULT_DIR = os.getenv("EXPORT_RESULT_DIR")  # finished files; defaults to <instance>/exports
+    EXPORT_RESULT_TTL = int(os.getenv("EXPORT_RESULT_TTL", 3600))  # seconds a finished export stays downloadable
+    EXPORT_CLEANUP_INTERVAL = float(os.getenv("EXPORT_CLEANUP_INTERVAL", 300))  # seconds between expiry sweeps
+    EXPORT_JOB_STALE_AFTER = float(os.getenv("EXPORT_JOB_STALE_AFTER", 600))  # running job without progress this long = failed
+
+    # ✅ Inventory ledger
+    INVENTORY_ALLOW_NEGATIVE = os.getenv("INVENTORY_ALLOW_NEGATIVE", "true").lower() == "true"  # false = reject removals below zero
+
+    # ✅ Master data read cache (recipes, materials, storage buckets)
+    MASTER_CACHE_ENABLED = os.getenv("MASTER_CACHE_ENABLED", "true").lower() == "true"
+    MASTER_CACHE_MAX_ENTRIES = int(os.getenv("MASTER_CACHE_MAX_ENTRIES", 512))  # cached responses per process
+    MASTER_CACHE_REVALIDATE_INTERVAL = float(os.getenv("MASTER_CACHE_REVALIDATE_INTERVAL", 5))  # seconds between checks for other processes' writes; 0 = off
+
+    # ✅ Material browsing
+    MATERIAL_COUNT_CACHE_TTL = float(os.getenv("MATERIAL_COUNT_CACHE_TTL", 60))  # seconds a filtered total is reused
+    MATERIAL_COUNT_CACHE_SIZE = int(os.getenv("MATERIAL_COUNT_CACHE_SIZE", 256))  # filter sets whose totals are kept (LRU)
+
+    # ✅ Barcode scanning
+    BARCODE_INDEX_REFRESH_INTERVAL = float(os.getenv("BARCODE_INDEX_REFRESH_INTERVAL", 60))  # seconds between full rebuilds of the scan index
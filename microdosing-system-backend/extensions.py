@@ -3,8 +3,36 @@ from flask_sqlalchemy import SQLAlchemy # type: ignore
 from flask_marshmallow import Marshmallow # type: ignore
 from flask_migrate import Migrate # type: ignore
 from flask_jwt_extended import JWTManager # type: ignore
+from flask_socketio import SocketIO # type: ignore
+from services.modbus_pool import ModbusConnectionManager
+from services.scale_acquisition import ScaleAcquisition
+from services.weight_buffer import WeightBuffer
+from services.weight_rollup import WeightRollupService
+from services.barcodes import BarcodeStore
+from services.authz import AuthzCache
+from services.master_cache import MasterDataCache
+from services.barcode_export import BarcodeExporter
+from services.export_jobs import ExportJobQueue
+from services.barcode_index import BarcodeIndex
+from services.dosing import DosingEngine
+from services.weight_filter import WeightFilters
+from services.weight_trace import TraceRecorder
 
 db = SQLAlchemy()
 ma = Marshmallow()
 migrate = Migrate()
 jwt = JWTManager()
+socketio = SocketIO()
+modbus = ModbusConnectionManager()
+acquisition = ScaleAcquisition()
+weight_buffer = WeightBuffer()
+weight_rollups = WeightRollupService()
+barcodes = BarcodeStore()
+authz = AuthzCache()
+master_cache = MasterDataCache()
+barcode_exporter = BarcodeExporter()
+export_jobs = ExportJobQueue()
+barcode_index = BarcodeIndex()
+dosing = DosingEngine()
+weight_filters = WeightFilters()
+traces = TraceRecorder()
@@ -0,0 +1,231 @@
+"""Hardware-in-the-loop style benchmark of the scale path against simulated indicators.
+
+Starts --scales simulated Modbus TCP indicators (services/scale_simulator.py),
+points the app at them through SCALES / DOSING_ACTUATORS, then:
+
+  1. reads every scale through GET /api/scale/values (acquisition cache) and
+     directly over Modbus, reporting latency percentiles and throughput;
+  2. doses one recipe material per scale, all scales at once, --dosings
+     rounds in a row, reporting cycle time, accuracy and top-ups per round
+     (later rounds show the learned in-flight compensation).
+
+Runs on a plain Linux box with no hardware or MySQL (a throwaway SQLite
+database is used unless --database-url is given). Same --seed, same plant:
+
+    python hil_harness.py --scales 4 --dosings 5 --seed 7
+    python hil_harness.py --scales 8 --error-rate 0.02 --stall-rate 0.01 --json
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda pct: values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+    return {"n": len(values), "p50": round(pick(50), 3), "p90": round(pick(90), 3),
+            "p99": round(pick(99), 3), "max": round(values[-1], 3)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scales", type=int, default=2)
+    parser.add_argument("--port", type=int, default=5020, help="first simulator port")
+    parser.add_argument("--reads", type=int, default=200, help="reads per scale and path")
+    parser.add_argument("--dosings", type=int, default=3, help="dosing rounds (all scales per round)")
+    parser.add_argument("--set-point", type=float, default=4.0)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="kg; stored as the recipe lines' tolerance")
+    parser.add_argument("--poll-interval", type=float, default=0.02, help="SCALE_POLL_INTERVAL")
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated seconds per Modbus request")
+    parser.add_argument("--jitter", type=float, default=0.001)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--noise", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    return parser.parse_args()
+
+
+def configure(args, indicators, workdir):
+    """Environment for the app; must be set before app/config are imported"""
+    configs = [indicator.scale_config(i + 1) for i, indicator in enumerate(indicators)]
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'hil.db')}",
+        "FLASK_ENV": "development",
+        "SCALES": json.dumps([scale for scale, _ in configs]),
+        "DOSING_ACTUATORS": json.dumps({str(scale["id"]): actuator for scale, actuator in configs}),
+        "SCALE_ACQUISITION_ENABLED": "true",
+        "SCALE_POLL_INTERVAL": str(args.poll_interval),
+        "WEIGHT_ROLLUP_ENABLED": "false",
+        "EXPORT_JOBS_ENABLED": "false",
+        "BARCODE_CACHE_DIR": os.path.join(workdir, "barcodes"),
+        "SCALE_TABLE_PATH": os.path.join(workdir, "scale-table"),
+    })
+
+
+def seed_recipe(db, scale_ids, set_point, tolerance):
+    """One Released recipe with a material line per scale; returns {scale_id: recipe_material_id}"""
+    from werkzeug.security import generate_password_hash
+    from models.user import User
+    from models.material import Material
+    from models.recipe import Recipe, RecipeMaterial
+
+    user = User(username=f"hil-{int(time.time())}", full_name="HIL harness", email=f"hil-{time.time()}@example.com",
+                password_hash=generate_password_hash("hil"), role="admin", status="active")
+    db.session.add(user)
+    db.session.flush()
+    recipe = Recipe(name="HIL benchmark", code=f"HIL-{int(time.time() * 1000)}", version="1",
+                    status="Released", created_by=user.user_id)
+    db.session.add(recipe)
+    db.session.flush()
+    lines = {}
+    for scale_id in scale_ids:
+        material = Material(title=f"HIL material {recipe.recipe_id}-{scale_id}", unit_of_measure="Kilogram (kg)",
+                            current_quantity=1000, minimum_quantity=0, maximum_quantity=10000,
+                            status="Released")
+        db.session.add(material)
+        db.session.flush()
+        line = RecipeMaterial(recipe_id=recipe.recipe_id, material_id=material.material_id,
+                              set_point=set_point, tolerance=tolerance, status="pending")
+        db.session.add(line)
+        db.session.flush()
+        lines[scale_id] = line.recipe_material_id
+    db.session.commit()
+    return lines
+
+
+def bench_reads(client, scale_clients, reads):
+    results = {}
+    for scale_id, scale_client in scale_clients.items():
+        route, stale, started = [], 0, time.perf_counter()
+        for _ in range(reads):
+            t0 = time.perf_counter()
+            body = client.get(f"/api/scale/values?scale_id={scale_id}").get_json()
+            route.append((time.perf_counter() - t0) * 1000)
+            stale += bool(body.get("stale"))
+        route_seconds = time.perf_counter() - started
+
+        direct, failures, started = [], 0, time.perf_counter()
+        for _ in range(reads):
+            t0 = time.perf_counter()
+            failures += scale_client.get_scale_values() is None
+            direct.append((time.perf_counter() - t0) * 1000)
+        direct_seconds = time.perf_counter() - started
+
+        results[scale_id] = {
+            "route_ms": _percentiles(route),
+            "route_per_second": round(reads / route_seconds, 1),
+            "route_stale": stale,
+            "modbus_ms": _percentiles(direct),
+            "modbus_per_second": round(reads / direct_seconds, 1),
+            "modbus_failures": failures,
+        }
+    return results
+
+
+def bench_dosing(client, lines, rounds, timeout=120.0):
+    summary = []
+    for round_no in range(1, rounds + 1):
+        runs = {}
+        for scale_id, recipe_material_id in lines.items():
+            response = client.post(f"/api/scale/start-dosing/{recipe_material_id}?scale_id={scale_id}")
+            body = response.get_json()
+            if response.status_code != 202:
+                raise RuntimeError(f"start-dosing on scale {scale_id} failed: {body}")
+            runs[scale_id] = body["run"]["run_id"]
+
+        finished, deadline = {}, time.monotonic() + timeout
+        while len(finished) < len(runs) and time.monotonic() < deadline:
+            time.sleep(0.1)
+            for scale_id, run_id in runs.items():
+                if scale_id not in finished:
+                    run = client.get(f"/api/scale/dosing/{run_id}").get_json()["run"]
+                    if run["state"] in ("done", "failed", "aborted"):
+                        finished[scale_id] = run
+
+        done = [r for r in finished.values() if r["state"] == "done"]
+        errors = [abs(r["final_weight"] - r["set_point"]) for r in finished.values() if r["final_weight"] is not None]
+        summary.append({
+            "round": round_no,
+            "done": len(done),
+            "failed": len(runs) - len(done),
+            "cycle_seconds": _percentiles([r["cycle_seconds"] for r in finished.values()]),
+            "abs_error": _percentiles(errors),
+            "topups": sum(r["topups"] for r in finished.values()),
+            "inflight_time": round(sum(r["inflight_time"] for r in finished.values()) / max(len(finished), 1), 4),
+            "messages": sorted({r["message"] for r in finished.values() if r["message"]}),
+        })
+    return summary
+
+
+def run(args):
+    from services.scale_simulator import start_indicators
+
+    workdir = tempfile.mkdtemp(prefix="hil-")
+    indicators = start_indicators(
+        args.scales, port=args.port, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, stall_rate=args.stall_rate, noise=args.noise, seed=args.seed,
+    )
+    configure(args, indicators, workdir)
+
+    import app as backend
+    from extensions import db, acquisition, modbus
+
+    try:
+        client = backend.app.test_client()
+        with backend.app.app_context():
+            lines = seed_recipe(db, list(acquisition.channels), args.set_point, args.tolerance)
+        time.sleep(max(args.poll_interval * 5, 0.2))  # let the acquisition ring fill
+
+        scale_clients = {scale_id: channel.client for scale_id, channel in acquisition.channels.items()}
+        return {
+            "scales": args.scales,
+            "poll_interval": args.poll_interval,
+            "simulator": {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+                          "stall_rate": args.stall_rate, "noise": args.noise, "seed": args.seed},
+            "reads": bench_reads(client, scale_clients, args.reads),
+            "dosing": bench_dosing(client, lines, args.dosings),
+            "acquisition": acquisition.status(),
+            "pools": modbus.stats(),
+            "indicators": [indicator.stats() for indicator in indicators],
+        }
+    finally:
+        acquisition.stop()
+        for indicator in indicators:
+            indicator.stop()
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # The app logs with print(); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        summary = run(args)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{args.scales} simulated scales, poll every {args.poll_interval}s, "
+          f"latency {args.latency * 1000:g}ms, errors {args.error_rate:.0%}, stalls {args.stall_rate:.0%}")
+    for scale_id, reads in summary["reads"].items():
+        print(f"scale {scale_id}: /values p50 {reads['route_ms'].get('p50')}ms p99 {reads['route_ms'].get('p99')}ms "
+              f"({reads['route_per_second']}/s, {reads['route_stale']} stale) | "
+              f"modbus p50 {reads['modbus_ms'].get('p50')}ms p99 {reads['modbus_ms'].get('p99')}ms "
+              f"({reads['modbus_per_second']}/s, {reads['modbus_failures']} failed)")
+    for row in summary["dosing"]:
+        print(f"dosing round {row['round']}: {row['done']} done, {row['failed']} failed, "
+              f"cycle p50 {row['cycle_seconds'].get('p50')}s max {row['cycle_seconds'].get('max')}s, "
+              f"|error| max {row['abs_error'].get('max')}, top-ups {row['topups']}, "
+              f"in-flight {row['inflight_time']}s {'; '.join(row['messages'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""Add scale_id to weight_entry
+
+Revision ID: 5b8e21c4d7a3
+Revises: 13c31406bc39
+Create Date: 2026-10-18 09:12:40.118264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e21c4d7a3'
+down_revision = '13c31406bc39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('weight_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('scale_id', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('weight_entry', schema=None) as batch_op:
+        batch_op.drop_column('scale_id')
@@ -0,0 +1,28 @@
+"""Index weight_entry by timestamp
+
+Revision ID: 9d4f6a0e2c51
+Revises: 5b8e21c4d7a3
+Create Date: 2026-10-18 10:03:17.552901
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4f6a0e2c51'
+down_revision = '5b8e21c4d7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('weight_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_weight_entry_timestamp', ['timestamp'], unique=False)
+        batch_op.create_index('ix_weight_entry_scale_id_timestamp', ['scale_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('weight_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_weight_entry_scale_id_timestamp')
+        batch_op.drop_index('ix_weight_entry_timestamp')
@@ -0,0 +1,32 @@
+"""Add master_data_version
+
+Revision ID: a3d7c9e2f518
+Revises: b4f8e1c7d352
+Create Date: 2026-10-19 09:12:40.581923
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d7c9e2f518'
+down_revision = 'b4f8e1c7d352'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table('master_data_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table, [
+        {'name': name, 'version': 0}
+        for name in ('Recipe', 'RecipeMaterial', 'Material', 'StorageBucket')
+    ])
+
+
+def downgrade():
+    op.drop_table('master_data_version')
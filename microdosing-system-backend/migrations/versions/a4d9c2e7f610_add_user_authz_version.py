@@ -0,0 +1,26 @@
+"""Add user.authz_version
+
+Revision ID: a4d9c2e7f610
+Revises: f2c6d8a1b374
+Create Date: 2026-10-18 15:03:22.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d9c2e7f610'
+down_revision = 'f2c6d8a1b374'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('authz_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('authz_version')
@@ -0,0 +1,34 @@
+"""Index material browsing: (title, material_id) keyset and FULLTEXT search
+
+Revision ID: a8c4e2f6d195
+Revises: d5a1e8c3b946
+Create Date: 2026-10-18 18:12:09.441870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c4e2f6d195'
+down_revision = 'd5a1e8c3b946'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.create_index('ix_material_title_material_id', ['title', 'material_id'], unique=False)
+
+    # FULLTEXT is MySQL-only; other backends fall back to LIKE in GET /materials
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ix_material_fulltext', 'material', ['title', 'description', 'supplier', 'barcode_id'],
+                        unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ix_material_fulltext', table_name='material')
+
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.drop_index('ix_material_title_material_id')
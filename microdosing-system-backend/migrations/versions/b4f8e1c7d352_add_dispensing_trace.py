@@ -0,0 +1,38 @@
+"""Add dispensing_trace
+
+Revision ID: b4f8e1c7d352
+Revises: e9b2d7f4a631
+Create Date: 2026-10-18 23:05:31.274610
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4f8e1c7d352'
+down_revision = 'e9b2d7f4a631'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dispensing_trace',
+    sa.Column('dispensing_id', sa.Integer(), nullable=False),
+    sa.Column('scale_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('recording', 'complete', name='dispensing_trace_status_enum'), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('duration', sa.Float(), nullable=True),
+    sa.Column('sample_count', sa.Integer(), nullable=True),
+    sa.Column('truncated', sa.Boolean(), nullable=False),
+    sa.Column('encoding', sa.String(length=20), nullable=True),
+    sa.Column('size_bytes', sa.Integer(), nullable=True),
+    sa.Column('data', sa.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql'), nullable=True),
+    sa.ForeignKeyConstraint(['dispensing_id'], ['batch_material_dispensing.dispensing_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('dispensing_id')
+    )
+
+
+def downgrade():
+    op.drop_table('dispensing_trace')
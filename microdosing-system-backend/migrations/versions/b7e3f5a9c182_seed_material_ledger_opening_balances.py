@@ -0,0 +1,43 @@
+"""Seed material_transaction with opening balances
+
+Material.current_quantity is now maintained from the ledger, so every
+material gets one transaction covering the difference between its stored
+balance and its existing transactions.
+
+Revision ID: b7e3f5a9c182
+Revises: a4d9c2e7f610
+Create Date: 2026-10-18 16:20:09.642715
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3f5a9c182'
+down_revision = 'a4d9c2e7f610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        INSERT INTO material_transaction (material_id, transaction_type, quantity, description)
+        SELECT material_id,
+               CASE WHEN difference > 0 THEN 'addition' ELSE 'removal' END,
+               ABS(difference),
+               'Opening balance'
+        FROM (
+            SELECT m.material_id,
+                   m.current_quantity - COALESCE(SUM(CASE WHEN t.transaction_type = 'addition'
+                                                          THEN t.quantity ELSE -t.quantity END), 0) AS difference
+            FROM material m
+            LEFT JOIN material_transaction t ON t.material_id = m.material_id
+            GROUP BY m.material_id, m.current_quantity
+        ) balances
+        WHERE difference <> 0
+    """)
+
+
+def downgrade():
+    op.execute("DELETE FROM material_transaction WHERE description = 'Opening balance'")
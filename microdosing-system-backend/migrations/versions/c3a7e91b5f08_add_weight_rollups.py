@@ -0,0 +1,51 @@
+"""Add weight_rollup and weight_rollup_state
+
+Revision ID: c3a7e91b5f08
+Revises: 9d4f6a0e2c51
+Create Date: 2026-10-18 10:41:05.309117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a7e91b5f08'
+down_revision = '9d4f6a0e2c51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('weight_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scale_id', sa.Integer(), nullable=False),
+    sa.Column('resolution', sa.Enum('minute', 'hour', 'day', name='rollup_resolution_enum'), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('min_weight', sa.Float(), nullable=False),
+    sa.Column('max_weight', sa.Float(), nullable=False),
+    sa.Column('sum_weight', sa.Float(), nullable=False),
+    sa.Column('sum_sq_weight', sa.Float(), nullable=False),
+    sa.Column('stable_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('scale_id', 'resolution', 'bucket_start', name='uq_weight_rollup_bucket')
+    )
+    with op.batch_alter_table('weight_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_weight_rollup_resolution_bucket', ['resolution', 'bucket_start'], unique=False)
+
+    op.create_table('weight_rollup_state',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_entry_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('weight_rollup_state')
+    with op.batch_alter_table('weight_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_weight_rollup_resolution_bucket')
+
+    op.drop_table('weight_rollup')
@@ -0,0 +1,34 @@
+"""Add dosing_profile
+
+Revision ID: c6f1b9d3e827
+Revises: a8c4e2f6d195
+Create Date: 2026-10-18 19:02:47.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6f1b9d3e827'
+down_revision = 'a8c4e2f6d195'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dosing_profile',
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('scale_id', sa.Integer(), nullable=False),
+    sa.Column('inflight_time', sa.Float(), nullable=False),
+    sa.Column('preact', sa.Float(), nullable=True),
+    sa.Column('fine_rate', sa.Float(), nullable=True),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['material_id'], ['material.material_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('material_id', 'scale_id')
+    )
+
+
+def downgrade():
+    op.drop_table('dosing_profile')
@@ -0,0 +1,26 @@
+"""Add tolerance to recipe_material
+
+Revision ID: c8e4a2f6d913
+Revises: a3d7c9e2f518
+Create Date: 2026-10-20 10:41:17.266054
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e4a2f6d913'
+down_revision = 'a3d7c9e2f518'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recipe_material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tolerance', sa.Numeric(precision=10, scale=3), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('recipe_material', schema=None) as batch_op:
+        batch_op.drop_column('tolerance')
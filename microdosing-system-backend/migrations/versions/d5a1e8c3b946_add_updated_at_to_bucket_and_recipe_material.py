@@ -0,0 +1,32 @@
+"""Add updated_at to storage_bucket and recipe_material
+
+Revision ID: d5a1e8c3b946
+Revises: b7e3f5a9c182
+Create Date: 2026-10-18 17:05:41.803527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a1e8c3b946'
+down_revision = 'b7e3f5a9c182'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('storage_bucket', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True))
+
+    with op.batch_alter_table('recipe_material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('recipe_material', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('storage_bucket', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,28 @@
+"""Index production_order for filtered, keyset-paginated listing
+
+Revision ID: e18b4d2a6c93
+Revises: c3a7e91b5f08
+Create Date: 2026-10-18 11:20:48.640215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e18b4d2a6c93'
+down_revision = 'c3a7e91b5f08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('production_order', schema=None) as batch_op:
+        batch_op.create_index('ix_production_order_scheduled', ['scheduled_date', 'order_id'], unique=False)
+        batch_op.create_index('ix_production_order_status', ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('production_order', schema=None) as batch_op:
+        batch_op.drop_index('ix_production_order_status')
+        batch_op.drop_index('ix_production_order_scheduled')
@@ -0,0 +1,44 @@
+"""Add scale registry
+
+Revision ID: e9b2d7f4a631
+Revises: c6f1b9d3e827
+Create Date: 2026-10-18 21:36:12.480913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b2d7f4a631'
+down_revision = 'c6f1b9d3e827'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scale',
+    sa.Column('scale_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('station', sa.String(length=50), nullable=True),
+    sa.Column('host', sa.String(length=255), nullable=False),
+    sa.Column('port', sa.Integer(), server_default='502', nullable=False),
+    sa.Column('slave', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('model', sa.String(length=50), server_default='default', nullable=False),
+    sa.Column('poll_interval', sa.Float(), nullable=True),
+    sa.Column('timeout', sa.Float(), nullable=True),
+    sa.Column('enabled', sa.Boolean(), server_default=sa.true(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('scale_id'),
+    sa.UniqueConstraint('name')
+    )
+    with op.batch_alter_table('scale', schema=None) as batch_op:
+        batch_op.create_index('ix_scale_station', ['station'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('scale', schema=None) as batch_op:
+        batch_op.drop_index('ix_scale_station')
+
+    op.drop_table('scale')
@@ -0,0 +1,25 @@
+from extensions import db
+
+
+class DosingProfile(db.Model):
+    """What the dosing engine has learned about feeding one material on one scale"""
+    __tablename__ = 'dosing_profile'
+
+    material_id = db.Column(db.Integer, db.ForeignKey("material.material_id", ondelete="CASCADE"), primary_key=True)
+    scale_id = db.Column(db.Integer, primary_key=True)  # 0 = the simulated plant
+    inflight_time = db.Column(db.Float, nullable=False, default=0)  # seconds from feeder to scale; preact = feed rate x this
+    preact = db.Column(db.Float, nullable=True)  # weight that landed after the last run's cutoff
+    fine_rate = db.Column(db.Float, nullable=True)  # weight per second on fine feed, sizes top-up pulses
+    samples = db.Column(db.Integer, nullable=False, default=0)  # finished runs folded in
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def to_dict(self):
+        return {
+            "material_id": self.material_id,
+            "scale_id": self.scale_id,
+            "inflight_time": self.inflight_time,
+            "preact": self.preact,
+            "fine_rate": self.fine_rate,
+            "samples": self.samples,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -0,0 +1,60 @@
+from extensions import db
+from datetime import datetime
+import uuid
+
+class ExportJob(db.Model):
+    """A background export; the finished file lives in the export result store until expires_at"""
+    __tablename__ = 'export_job'
+    __table_args__ = (
+        db.Index('ix_export_job_status_created_at', 'status', 'created_at'),
+    )
+
+    job_id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = db.Column(db.String(50), nullable=False)  # key into export_jobs.specs, e.g. "recipes"
+    status = db.Column(db.Enum("queued", "running", "done", "failed", name="export_job_status_enum"),
+                       nullable=False, default="queued")
+    total = db.Column(db.Integer, nullable=True)  # rows to export, known once the job starts
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    file_name = db.Column(db.String(255), nullable=True)  # download name
+    result_path = db.Column(db.String(500), nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)  # heartbeat while running
+
+    @property
+    def progress(self):
+        if self.status == "done":
+            return 100.0
+        if not self.total:
+            return 0.0
+        return round(100.0 * self.processed / self.total, 1)
+
+    @property
+    def eta_seconds(self):
+        """Remaining time extrapolated from the rate so far; None until there is a rate"""
+        if self.status != "running" or not self.started_at or not self.total or not self.processed:
+            return None
+        elapsed = (datetime.utcnow() - self.started_at).total_seconds()
+        return round(elapsed / self.processed * (self.total - self.processed), 1)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "progress": self.progress,
+            "eta_seconds": self.eta_seconds,
+            "file_name": self.file_name,
+            "size_bytes": self.size_bytes,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+        }
@@ -0,0 +1,9 @@
+from extensions import db
+
+
+class MasterDataVersion(db.Model):
+    """Change counter of a master data table, bumped in the same transaction as every write to it"""
+    __tablename__ = "master_data_version"
+
+    name = db.Column(db.String(50), primary_key=True)  # model class name
+    version = db.Column(db.BigInteger, nullable=False, default=0)
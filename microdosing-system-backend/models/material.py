@@ -1,5 +1,10 @@
 from extensions import db, ma  # ✅ Import from extensions
 class Material(db.Model):
+    __table_args__ = (
+        db.Index('ix_material_title_material_id', 'title', 'material_id'),
+        db.Index('ix_material_fulltext', 'title', 'description', 'supplier', 'barcode_id', mysql_prefix='FULLTEXT'),
+    )
+
     material_id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
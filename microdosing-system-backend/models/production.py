@@ -1,8 +1,13 @@
 from extensions import db, ma  # ✅ Import from extensions
 from models.user import User  # ✅ Import the User model for relationship
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
 
 class ProductionOrder(db.Model):
     __tablename__ = "production_order"
+    __table_args__ = (
+        db.Index("ix_production_order_scheduled", "scheduled_date", "order_id"),  # keyset pagination
+        db.Index("ix_production_order_status", "status"),
+    )
     
     order_id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
@@ -61,6 +66,34 @@ class BatchMaterialDispensing(db.Model):
     status = db.Column(db.Enum("pending", "dispensed", "verified"), nullable=False, default="pending")
     batch = db.relationship('Batch', backref='batch_material_dispensings', passive_deletes=True)
 
+class DispensingTrace(db.Model):
+    """Weight curve of one dispensing, encoded by services.weight_trace"""
+    __tablename__ = "dispensing_trace"
+
+    dispensing_id = db.Column(db.Integer, db.ForeignKey("batch_material_dispensing.dispensing_id", ondelete="CASCADE"), primary_key=True)
+    scale_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.Enum("recording", "complete", name="dispensing_trace_status_enum"), nullable=False, default="recording")
+    started_at = db.Column(db.DateTime, nullable=False)  # UTC
+    duration = db.Column(db.Float, nullable=True)  # seconds from start to the last sample
+    sample_count = db.Column(db.Integer, nullable=True)
+    truncated = db.Column(db.Boolean, nullable=False, default=False)  # hit DISPENSING_TRACE_MAX_SAMPLES, expired, or missed its start
+    encoding = db.Column(db.String(20), nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=True)
+    data = db.Column(db.LargeBinary().with_variant(MEDIUMBLOB(), "mysql"), nullable=True)
+
+    def to_dict(self):
+        return {
+            "dispensing_id": self.dispensing_id,
+            "scale_id": self.scale_id,
+            "status": self.status,
+            "started_at": self.started_at.isoformat() + "Z" if self.started_at else None,
+            "duration": self.duration,
+            "sample_count": self.sample_count,
+            "truncated": self.truncated,
+            "encoding": self.encoding,
+            "size_bytes": self.size_bytes,
+        }
+
 # Ensure MaterialTransaction is defined or imported correctly
 try:
     from models.material import MaterialTransaction
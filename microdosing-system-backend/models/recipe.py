@@ -58,7 +58,9 @@ class RecipeMaterial(db.Model):
         server_default="pending"
     )
 
-    margin = db.Column(db.Numeric(5, 2), nullable=True)
+    margin = db.Column(db.Numeric(5, 2), nullable=True)  # deviation of the last captured weight, %
+    tolerance = db.Column(db.Numeric(10, 3), nullable=True)  # accepted |actual - set point| when dosing; NULL = DOSING_DEFAULT_TOLERANCE
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
     # Define the relationship after both models are defined
     bucket = db.relationship("StorageBucket", backref="recipe_materials")
@@ -1,76 +1,178 @@
-from pymodbus.client import ModbusTcpClient
+import json
+from collections import namedtuple
 from pymodbus.payload import BinaryPayloadDecoder
 from pymodbus.constants import Endian
+from extensions import db, ma, modbus
+
+# kind is "float32" (two registers) or "bool" (one register, non-zero = True).
+# Fields with group="alarms" are returned nested under "alarms".
+RegisterField = namedtuple("RegisterField", ["name", "address", "kind", "group"], defaults=[None])
+
+_FIELD_WIDTH = {"float32": 2, "bool": 1}
+_ENDIAN = {"big": Endian.BIG, "little": Endian.LITTLE}
+
+
+class RegisterMap:
+    """Where each value lives on an indicator and how to read it in as few PDUs as possible"""
+
+    def __init__(self, fields, byteorder="big", wordorder="big", max_gap=8, max_count=125):
+        self.fields = list(fields)
+        self.byteorder = byteorder
+        self.wordorder = wordorder
+        self.max_gap = max_gap  # unused registers we'd rather read than pay another round trip for
+        self.max_count = max_count  # Modbus limit for one read_holding_registers request
+
+    def subset(self, names):
+        return RegisterMap(
+            [f for f in self.fields if f.name in names],
+            self.byteorder, self.wordorder, self.max_gap, self.max_count
+        )
+
+    def plan(self):
+        """Merge overlapping and nearby field ranges into [(address, count), ...]"""
+        spans = sorted((f.address, f.address + _FIELD_WIDTH[f.kind]) for f in self.fields)
+        blocks = []
+        for start, end in spans:
+            if blocks:
+                block_start, block_end = blocks[-1]
+                if start <= block_end + self.max_gap and max(end, block_end) - block_start <= self.max_count:
+                    blocks[-1] = (block_start, max(end, block_end))
+                    continue
+            blocks.append((start, end))
+        return [(start, end - start) for start, end in blocks]
+
+    def decode(self, blocks):
+        """blocks: [(address, registers), ...] as returned by the plan's reads"""
+        buffer = {}
+        for address, registers in blocks:
+            for offset, value in enumerate(registers):
+                buffer[address + offset] = value
+
+        values = {}
+        for field in self.fields:
+            registers = [buffer[field.address + i] for i in range(_FIELD_WIDTH[field.kind])]
+            if field.kind == "float32":
+                decoder = BinaryPayloadDecoder.fromRegisters(
+                    registers, byteorder=_ENDIAN[self.byteorder], wordorder=_ENDIAN[self.wordorder]
+                )
+                value = round(decoder.decode_32bit_float(), 2)
+            else:
+                value = bool(registers[0])
+
+            if field.group:
+                values.setdefault(field.group, {})[field.name] = value
+            else:
+                values[field.name] = value
+        return values
+
+    @classmethod
+    def from_dict(cls, data):
+        fields = [RegisterField(f["name"], int(f["address"]), f.get("kind", "float32"), f.get("group"))
+                  for f in data["fields"]]
+        options = {k: data[k] for k in ("byteorder", "wordorder", "max_gap", "max_count") if k in data}
+        return cls(fields, **options)
+
+
+REGISTER_MAPS = {
+    # Gross (40001-40002), tare/net (40003-40004), alarms (40004-40007)
+    "default": RegisterMap([
+        RegisterField("gross_weight", 0, "float32"),
+        RegisterField("tare_weight", 2, "float32"),
+        RegisterField("net_weight", 2, "float32"),
+        RegisterField("overrange", 3, "bool", "alarms"),
+        RegisterField("underrange", 4, "bool", "alarms"),
+        RegisterField("motion", 5, "bool", "alarms"),
+        RegisterField("negative", 6, "bool", "alarms"),
+    ]),
+}
+
+
+def load_register_maps(config_value):
+    """Add/override scale models from SCALE_REGISTER_MAPS ({"model": {"fields": [...]}, ...})"""
+    if not config_value:
+        return
+    if isinstance(config_value, str):
+        config_value = json.loads(config_value)
+    for model, data in config_value.items():
+        REGISTER_MAPS[model] = RegisterMap.from_dict(data)
+
+
+class Scale(db.Model):
+    """A weighing indicator on the plant network, polled by services.scale_acquisition"""
+    __tablename__ = "scale"
+
+    scale_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    station = db.Column(db.String(50), nullable=True, index=True)  # dosing station / plant area the scale serves
+    host = db.Column(db.String(255), nullable=False)
+    port = db.Column(db.Integer, nullable=False, default=502, server_default="502")
+    slave = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    model = db.Column(db.String(50), nullable=False, default="default", server_default="default")  # key into REGISTER_MAPS
+    poll_interval = db.Column(db.Float, nullable=True)  # seconds between reads; null = SCALE_POLL_INTERVAL
+    timeout = db.Column(db.Float, nullable=True)  # seconds per read; null = MODBUS_TIMEOUT
+    enabled = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def to_config(self):
+        """Shape of one SCALES entry, what the acquisition engine is configured from"""
+        return {
+            "id": self.scale_id,
+            "name": self.name,
+            "station": self.station,
+            "host": self.host,
+            "port": self.port,
+            "slave": self.slave,
+            "model": self.model,
+            "poll_interval": self.poll_interval,
+            "timeout": self.timeout,
+        }
+
+
+class ScaleSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Scale
+        load_instance = True
+        dump_only = ("scale_id", "created_at", "updated_at")
+
 
 class ScaleClient:
-    def __init__(self, host='localhost', port=502):
+    def __init__(self, host=None, port=None, slave=None, model=None):
+        # None falls back to SCALE_HOST / SCALE_PORT / SCALE_SLAVE / SCALE_MODEL
         self.host = host
         self.port = port
-        
+        self.slave = slave
+        self.model = model
+
+    @property
+    def pool(self):
+        return modbus.pool(self.host, self.port, self.slave)
+
+    @property
+    def register_map(self):
+        return REGISTER_MAPS[self.model or modbus.default_model]
+
+    def _read(self, address, count):
+        return self.pool.execute(
+            lambda client, slave: client.read_holding_registers(address=address, count=count, slave=slave)
+        )
+
+    def read_map(self, register_map):
+        blocks = [(address, self._read(address, count).registers) for address, count in register_map.plan()]
+        return register_map.decode(blocks)
+
     def get_net_weight(self):
-        """Get the net weight from register 40003 (address 2)"""
-        client = ModbusTcpClient(self.host, port=self.port)
+        """Get the net weight (register 40003 on the default map)"""
         try:
-            result = client.read_holding_registers(address=2, count=2, slave=1)
-            if not result.isError():
-                decoder = BinaryPayloadDecoder.fromRegisters(
-                    result.registers,
-                    byteorder=Endian.BIG,
-                    wordorder=Endian.BIG
-                )
-                return round(decoder.decode_32bit_float(), 2)
-            return None
+            return self.read_map(self.register_map.subset({"net_weight"}))["net_weight"]
         except Exception as e:
             print(f"Error reading net weight: {str(e)}")
             return None
-        finally:
-            client.close()
-            
+
     def get_scale_values(self):
-        client = ModbusTcpClient(self.host, port=self.port)
+        """Gross, tare, net and alarms, read in as few requests as the register map allows"""
         try:
-            # Read weights in separate calls to avoid alignment issues
-            # Gross (40001-40002) - address 0
-            gross_result = client.read_holding_registers(address=0, count=2, slave=1)
-            # Tare (40003-40004) - address 2
-            tare_result = client.read_holding_registers(address=2, count=2, slave=1)
-            # Net (40003-40004) - same as tare (calculated as gross - tare)
-            net_result = client.read_holding_registers(address=2, count=2, slave=1)
-
-            if not gross_result.isError() and not tare_result.isError():
-                # Decode weights
-                gross_decoder = BinaryPayloadDecoder.fromRegisters(
-                    gross_result.registers, byteorder=Endian.BIG, wordorder=Endian.BIG
-                )
-                tare_decoder = BinaryPayloadDecoder.fromRegisters(
-                    tare_result.registers, byteorder=Endian.BIG, wordorder=Endian.BIG
-                )
-                net_decoder = BinaryPayloadDecoder.fromRegisters(
-                    net_result.registers, byteorder=Endian.BIG, wordorder=Endian.BIG
-                )
-                
-                gross = round(gross_decoder.decode_32bit_float(), 2)
-                tare = round(tare_decoder.decode_32bit_float(), 2)
-                net = round(net_decoder.decode_32bit_float(), 2)
-                
-                # Read alarms (addresses 3-6 for 40004-40007)
-                alarm_result = client.read_holding_registers(address=3, count=4, slave=1)
-                alarms = {
-                    'overrange': bool(alarm_result.registers[0]) if not alarm_result.isError() else False,
-                    'underrange': bool(alarm_result.registers[1]) if not alarm_result.isError() else False,
-                    'motion': bool(alarm_result.registers[2]) if not alarm_result.isError() else False,
-                    'negative': bool(alarm_result.registers[3]) if not alarm_result.isError() else False
-                }
-                
-                return {
-                    'gross_weight': gross,
-                    'tare_weight': tare,
-                    'net_weight': net,
-                    'alarms': alarms
-                }
-            return None
+            return self.read_map(self.register_map)
         except Exception as e:
             print(f"Error reading scale values: {str(e)}")
-            return None
-        finally:
-            client.close()
\ No newline at end of file
+            return None
\ No newline at end of file
@@ -18,6 +18,7 @@ class StorageBucket(db.Model):
         db.TIMESTAMP, 
         server_default=db.func.current_timestamp()
     ) 
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
     material = db.relationship("Material", backref="storage_buckets")
 
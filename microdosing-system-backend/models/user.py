@@ -8,6 +8,7 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.Enum("operator", "admin"), nullable=False)
     status = db.Column(db.Enum("active", "inactive"), default="active")
+    authz_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")  # bumped when role/status change
     created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
     updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
 
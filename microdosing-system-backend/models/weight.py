@@ -3,9 +3,12 @@ from datetime import datetime
 
 class WeightEntry(db.Model):
     __tablename__ = 'weight_entry'
+    __table_args__ = (
+        db.Index('ix_weight_entry_scale_id_timestamp', 'scale_id', 'timestamp'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     current_weight = db.Column(db.Float, nullable=False)
     tare_weight = db.Column(db.Float, nullable=False)
     gross_weight = db.Column(db.Float, nullable=False)
@@ -13,8 +16,54 @@ class WeightEntry(db.Model):
     status = db.Column(db.Integer, nullable=False)  # 0 = Stable, 1 = Unstable
     filter_level = db.Column(db.Integer, nullable=False)
     digital_output_status = db.Column(db.String(10), nullable=False)
+    scale_id = db.Column(db.Integer, nullable=True)  # which indicator produced the sample
 
 class WeightEntrySchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = WeightEntry
         load_instance = True
+
+
+class WeightRollup(db.Model):
+    """Per-scale aggregate of weight_entry rows over a minute, hour or day"""
+    __tablename__ = 'weight_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('scale_id', 'resolution', 'bucket_start', name='uq_weight_rollup_bucket'),
+        db.Index('ix_weight_rollup_resolution_bucket', 'resolution', 'bucket_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    scale_id = db.Column(db.Integer, nullable=False, default=0)  # 0 = samples without a scale_id
+    resolution = db.Column(db.Enum("minute", "hour", "day", name="rollup_resolution_enum"), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    min_weight = db.Column(db.Float, nullable=False)
+    max_weight = db.Column(db.Float, nullable=False)
+    sum_weight = db.Column(db.Float, nullable=False, default=0)
+    sum_sq_weight = db.Column(db.Float, nullable=False, default=0)  # kept so stddev can be merged incrementally
+    stable_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    @property
+    def mean(self):
+        return self.sum_weight / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        if not self.count:
+            return None
+        variance = self.sum_sq_weight / self.count - self.mean ** 2
+        return max(variance, 0.0) ** 0.5
+
+    @property
+    def stable_ratio(self):
+        return self.stable_count / self.count if self.count else None
+
+
+class WeightRollupState(db.Model):
+    """High-water mark of weight_entry ids already folded into weight_rollup"""
+    __tablename__ = 'weight_rollup_state'
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_entry_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
@@ -0,0 +1,76 @@
+# routes/barcode_routes.py
+from flask import Blueprint, request, jsonify, make_response
+from extensions import barcodes
+from services.barcodes import FORMATS, SYMBOLOGIES, BarcodeSpec, spec_digest
+
+barcode_bp = Blueprint("barcodes", __name__)
+
+MAX_VALUE_LENGTH = 80
+MAX_PIXELS = 4000
+
+
+def _int_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    value = int(value)
+    if not 0 < value <= MAX_PIXELS:
+        raise ValueError(f"{name} must be between 1 and {MAX_PIXELS}")
+    return value
+
+
+def _float_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    value = float(value)
+    if not 0 < value <= 100:
+        raise ValueError(f"{name} must be between 0 and 100 mm")
+    return value
+
+
+@barcode_bp.route("/barcodes/<string:value>.<any(png, svg):fmt>", methods=["GET"])
+def get_barcode_image(value, fmt):
+    """Render a barcode; ?symbology=code128&width=&height=&module_width=&module_height=&text=true
+
+    The URL (value + query) fully determines the image, so responses are
+    immutable and the ETag is known before anything is rendered.
+    """
+    if not value or len(value) > MAX_VALUE_LENGTH:
+        return jsonify({"error": f"Barcode value must be 1-{MAX_VALUE_LENGTH} characters"}), 400
+    symbology = request.args.get("symbology", "code128").lower()
+    if symbology not in SYMBOLOGIES:
+        return jsonify({"error": f"Unsupported symbology {symbology}"}), 400
+    try:
+        spec = BarcodeSpec(
+            value=value,
+            symbology=symbology,
+            fmt=fmt,
+            width=_int_arg("width") if fmt == "png" else None,
+            height=_int_arg("height") if fmt == "png" else None,
+            module_width=_float_arg("module_width"),
+            module_height=_float_arg("module_height"),
+            text=request.args.get("text", "true").lower() != "false",
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    digest = spec_digest(spec)
+    if request.if_none_match.contains(digest):
+        response = make_response("", 304)
+    else:
+        try:
+            data, digest = barcodes.get_or_render(spec)
+        except Exception as e:
+            # python-barcode raises assorted errors for values the symbology can't encode
+            return jsonify({"error": f"Cannot render {symbology} barcode: {e}"}), 400
+        response = make_response(data)
+        response.mimetype = FORMATS[fmt]
+    response.set_etag(digest)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@barcode_bp.route("/barcodes/stats", methods=["GET"])
+def barcode_cache_stats():
+    return jsonify(barcodes.stats()), 200
@@ -0,0 +1,70 @@
+# routes/export_routes.py
+from flask import Blueprint, jsonify, send_file
+from flask_socketio import Namespace, join_room, leave_room # type: ignore
+from extensions import db, socketio, export_jobs
+from models.export_job import ExportJob
+from services.barcode_export import XLSX_MIMETYPE
+
+export_bp = Blueprint("exports", __name__)
+
+EXPORT_NAMESPACE = "/exports"
+
+
+def export_job_room(job_id):
+    return f"export_job:{job_id}"
+
+
+@export_bp.route("/export_jobs/<string:job_id>", methods=["GET"])
+def get_export_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@export_bp.route("/export_jobs/<string:job_id>/download", methods=["GET"])
+def download_export_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+    if job.status in ("queued", "running"):
+        return jsonify({"error": "Export is not finished yet", **job.to_dict()}), 409
+    path = export_jobs.result_file(job)
+    if not path:
+        return jsonify({"error": job.error or "Export file is no longer available"}), 410
+    return send_file(path, download_name=job.file_name, as_attachment=True, mimetype=XLSX_MIMETYPE)
+
+
+@export_bp.route("/export_jobs/stats", methods=["GET"])
+def export_job_stats():
+    return jsonify(export_jobs.stats()), 200
+
+
+class ExportNamespace(Namespace):
+    """Export job progress.
+
+    Clients emit ``subscribe`` with ``{"job_id": "..."}`` and receive
+    ``export_progress`` events (the same body as GET /api/export_jobs/<job_id>)
+    until the job is done or failed.
+    """
+
+    def on_subscribe(self, data):
+        job_id = (data or {}).get("job_id")
+        job = db.session.get(ExportJob, job_id) if job_id else None
+        if job is None:
+            return {"success": False, "message": "Export job not found"}
+        join_room(export_job_room(job_id))
+        return {"success": True, **job.to_dict()}
+
+    def on_unsubscribe(self, data):
+        job_id = (data or {}).get("job_id")
+        if job_id:
+            leave_room(export_job_room(job_id))
+        return {"success": True}
+
+
+def _emit_progress(payload):
+    socketio.emit("export_progress", payload, to=export_job_room(payload["job_id"]), namespace=EXPORT_NAMESPACE)
+
+
+export_jobs.add_listener(_emit_progress)
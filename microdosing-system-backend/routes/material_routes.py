@@ -1,18 +1,20 @@
 from flask import Flask, Blueprint  , request,current_app, jsonify,abort # type: ignore
-from extensions import db
+from extensions import db, export_jobs, master_cache
 from models.material import Material, MaterialTransaction, MaterialSchema, MaterialTransactionSchema
 from models.recipe import RecipeMaterial , Recipe
 from sqlalchemy.exc import IntegrityError # type: ignore
 from flask import send_file
-import io
-import os
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as ExcelImage
-import barcode
-from barcode.writer import ImageWriter
-from PIL import Image as PILImage
+from services.barcode_export import XLSX_MIMETYPE
+from services.export_jobs import ExportSpec, run_export
+from services.conditional import conditional
+from services.inventory import InsufficientStock, InventoryError, Posting, parse_posting, post_transactions, reconcile
+from decimal import Decimal
+from sqlalchemy import and_, or_, text
+from sqlalchemy.dialects.mysql import match
 import re
-import tempfile
+import threading
+import time
+from collections import OrderedDict
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 from sqlalchemy.orm import aliased
@@ -33,73 +35,40 @@ materials_schema = MaterialSchema(many=True)
 transaction_schema = MaterialTransactionSchema()
 transactions_schema = MaterialTransactionSchema(many=True)
 
+MATERIAL_BARCODE_EXPORT = ExportSpec(
+    title="Material Barcodes",
+    headers=["Title", "Barcode ID", "Scannable Barcode"],
+    barcode_column=1,
+    statement=lambda: db.select(Material.title, Material.barcode_id)
+    .where(Material.barcode_id.isnot(None), Material.barcode_id != "")
+    .order_by(Material.material_id),
+    download_name="materials_with_barcodes.xlsx",
+)
+export_jobs.register("materials", MATERIAL_BARCODE_EXPORT)
+
 @material_bp.route("/materials/export/barcodes", methods=["GET"])
 def export_materials_excel_with_barcodes():
     try:
-        materials = Material.query.all()
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Material Barcodes"
-        ws.append(["Title", "Barcode ID", "Scannable Barcode"])
-
-        row_number = 2
-
-        for material in materials:
-            if material.barcode_id:
-                barcode_id = material.barcode_id
-
-                try:
-                    # Create a temp directory and save barcode
-                    temp_dir = tempfile.gettempdir()
-                    barcode_filename = f"{barcode_id}"
-                    barcode_path = os.path.join(temp_dir, f"{barcode_filename}.png")
-
-                    code128 = Code128(barcode_id, writer=ImageWriter())
-                    code128.save(os.path.join(temp_dir, barcode_filename))  # Don't include .png here
-
-                    # Resize for Excel
-                    image = PILImage.open(barcode_path)
-                    image = image.resize((200, 60))
-                    image.save(barcode_path)
-
-                    # Fill Excel
-                    ws.cell(row=row_number, column=1, value=material.title)
-                    ws.cell(row=row_number, column=2, value=barcode_id)
-
-                    img = ExcelImage(barcode_path)
-                    img.width = 150
-                    img.height = 50
-                    ws.add_image(img, f"C{row_number}")
-
-                    # Optional: delete temp image after
-                    os.remove(barcode_path)
-
-                    row_number += 1
-
-                except Exception as e:
-                    print(f"Failed to generate barcode for {barcode_id}: {e}")
-                    # Still add text if image fails
-                    ws.cell(row=row_number, column=1, value=material.title)
-                    ws.cell(row=row_number, column=2, value=barcode_id)
-                    row_number += 1
-
-        # Save to bytes
-        stream = io.BytesIO()
-        wb.save(stream)
-        stream.seek(0)
+        stream = run_export(MATERIAL_BARCODE_EXPORT)
 
         return send_file(
             stream,
-            download_name="materials_with_barcodes.xlsx",
+            download_name=MATERIAL_BARCODE_EXPORT.download_name,
             as_attachment=True,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mimetype=XLSX_MIMETYPE
         )
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@material_bp.route("/materials/export/barcodes", methods=["POST"])
+def queue_materials_barcode_export():
+    """Same workbook as the GET, built in the background; poll /api/export_jobs/<job_id>"""
+    job = export_jobs.submit("materials")
+    return jsonify(job.to_dict()), 202
+
+
 # ➤ Create a new Material
 @material_bp.route("/materials", methods=["POST"])
 def add_material():
@@ -126,7 +95,7 @@ def add_material():
             title=data.get("title"),
             description=data.get("description"),
             unit_of_measure=data.get("unit_of_measure"),
-            current_quantity=current_quantity,
+            current_quantity=0,  # the opening balance is posted to the ledger below
             minimum_quantity=minimum_quantity,
             maximum_quantity=maximum_quantity,
             plant_area_location=data.get("plant_area_location"),
@@ -139,6 +108,14 @@ def add_material():
         )
 
         db.session.add(new_material)
+        db.session.flush()
+        if current_quantity:
+            post_transactions(db.session, [Posting(
+                new_material.material_id,
+                "addition" if current_quantity > 0 else "removal",
+                abs(Decimal(str(current_quantity))),
+                "Opening balance",
+            )])
         db.session.commit()
 
         return jsonify({
@@ -155,6 +132,7 @@ def add_material():
         }), 201
 
     except Exception as e:
+        db.session.rollback()
         print(f"Error in add_material: {e}")  # For debugging
         return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
 
@@ -201,9 +179,10 @@ def get_active_material():
 
     
 @material_bp.route("/materials/all", methods=["GET"])
+@conditional(Material)
 def get_all_materials():
-    materials = Material.query.all()
-    return jsonify(materials_schema.dump(materials)), 200
+    materials = master_cache.get_or_load("materials:all", ["Material"], lambda: materials_schema.dump(Material.query.all()))
+    return jsonify(materials), 200
 
 @material_bp.route('/change-status-to-completed/<int:material_id>', methods=['POST'])
 def change_status_to_completed(material_id):
@@ -279,26 +258,109 @@ def get_material_by_barcode(barcode):
         return jsonify({"error": str(e)}), 500
 
 
+_material_counts = OrderedDict()  # filter key -> (count, counted_at), least recently used first
+_material_counts_lock = threading.Lock()
+
+
+def _material_search_filter(q):
+    """FULLTEXT match on MySQL (ix_material_fulltext); LIKE elsewhere"""
+    if db.engine.dialect.name == "mysql":
+        # Every word must appear, as a prefix: "sod chlor" -> "+sod* +chlor*"
+        terms = " ".join(f"+{word}*" for word in re.findall(r"\w+", q))
+        return match(Material.title, Material.description, Material.supplier, Material.barcode_id,
+                     against=terms).in_boolean_mode()
+    pattern = f"%{q}%"
+    return or_(Material.title.ilike(pattern), Material.description.ilike(pattern),
+               Material.supplier.ilike(pattern), Material.barcode_id.ilike(pattern))
+
+
+def _approximate_material_count(key, query):
+    """Row count for a filter set, recomputed at most every MATERIAL_COUNT_CACHE_TTL seconds
+
+    Keys include the search text, so only the MATERIAL_COUNT_CACHE_SIZE most
+    recently used filter sets are kept.
+    """
+    ttl = current_app.config.get("MATERIAL_COUNT_CACHE_TTL", 60)
+    with _material_counts_lock:
+        cached = _material_counts.get(key)
+        if cached and time.monotonic() - cached[1] < ttl:
+            _material_counts.move_to_end(key)
+            return cached[0]
+
+    count = None
+    if not key and db.engine.dialect.name == "mysql":
+        # InnoDB's estimate is free; only trust it once the table is big enough for COUNT(*) to hurt
+        estimate = db.session.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'material'"
+        )).scalar()
+        if estimate and estimate > 100000:
+            count = int(estimate)
+    if count is None:
+        count = query.order_by(None).count()
+    max_entries = current_app.config.get("MATERIAL_COUNT_CACHE_SIZE", 256)
+    with _material_counts_lock:
+        _material_counts.pop(key, None)
+        _material_counts[key] = (count, time.monotonic())
+        while len(_material_counts) > max_entries:
+            _material_counts.popitem(last=False)
+    return count
+
+
 @material_bp.route("/materials", methods=["GET"])
 def get_materials():
-    # Get query parameters from frontend: ?page=1&limit=20
+    """
+    ?q=                        search title, description, supplier and barcode
+    ?status=&plant_area=       exact filters; ?below_minimum=true for stock under minimum_quantity
+    ?limit=&cursor=            keyset pagination on (title, material_id); pass back next_cursor
+    ?page=                     legacy offset paging, still supported (slower on deep pages)
+    total is approximate: cached per filter set for MATERIAL_COUNT_CACHE_TTL seconds
+    """
+    limit = min(request.args.get("limit", 20, type=int), 1000)
     page = request.args.get("page", 1, type=int)
-    limit = request.args.get("limit", 20, type=int)
-
-    # Calculate offset for SQL
-    offset = (page - 1) * limit
-
-    # Query only a slice of materials
-    materials = Material.query.offset(offset).limit(limit).all()
-
-    # Count total for frontend pagination UI
-    total = Material.query.count()
+    cursor = request.args.get("cursor")
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+
+    query = Material.query
+    q = request.args.get("q", "").strip()
+    if q:
+        query = query.filter(_material_search_filter(q))
+    if request.args.get("status"):
+        query = query.filter(Material.status == request.args["status"])
+    if request.args.get("plant_area"):
+        query = query.filter(Material.plant_area_location == request.args["plant_area"])
+    below_minimum = request.args.get("below_minimum", "").lower() == "true"
+    if below_minimum:
+        query = query.filter(Material.current_quantity < Material.minimum_quantity)
+
+    count_key = (q, request.args.get("status"), request.args.get("plant_area"), below_minimum)
+    total = _approximate_material_count(count_key if any(count_key) else (), query)
+
+    page_query = query.order_by(Material.title, Material.material_id)
+    if cursor:
+        try:
+            cursor_title, cursor_id = cursor.rsplit("_", 1)
+            cursor_id = int(cursor_id)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+        page_query = page_query.filter(or_(
+            Material.title > cursor_title,
+            and_(Material.title == cursor_title, Material.material_id > cursor_id)
+        ))
+    elif page > 1:
+        page_query = page_query.offset((page - 1) * limit)
+
+    materials = page_query.limit(limit + 1).all()
+    has_more = len(materials) > limit
+    materials = materials[:limit]
 
     return jsonify({
         "materials": materials_schema.dump(materials),
         "total": total,
-        "page": page,
-        "limit": limit
+        "page": None if cursor else page,
+        "limit": limit,
+        "next_cursor": f"{materials[-1].title}_{materials[-1].material_id}" if has_more else None
     }), 200
 
 
@@ -321,14 +383,25 @@ def update_material(material_id):
     material.title = data.get("title", material.title)
     material.description = data.get("description", material.description)
     material.unit_of_measure = data.get("unit_of_measure", material.unit_of_measure)
-    material.current_quantity = data.get("current_quantity", material.current_quantity)
     material.minimum_quantity = data.get("minimum_quantity", material.minimum_quantity)
     material.maximum_quantity = data.get("maximum_quantity", material.maximum_quantity)
     material.plant_area_location = data.get("plant_area_location", material.plant_area_location)
     material.barcode_id = data.get("barcode_id", material.barcode_id)
     material.status = data.get("status", material.status)
 
+    if data.get("current_quantity") is not None:
+        # A new absolute quantity is booked as an adjustment against the row-locked balance
+        balance = db.session.execute(
+            db.select(Material.current_quantity).where(Material.material_id == material_id).with_for_update()
+        ).scalar_one()
+        difference = Decimal(str(data["current_quantity"])) - balance
+        if difference:
+            post_transactions(db.session, [Posting(
+                material_id, "addition" if difference > 0 else "removal", abs(difference), "Manual adjustment"
+            )])
+
     db.session.commit()
+    db.session.refresh(material)
     return jsonify(material_schema.dump(material)), 200
 
 @material_bp.route("/materials/<int:material_id>", methods=["DELETE"])
@@ -382,16 +455,51 @@ def delete_material(material_id):
 @material_bp.route("/material-transactions", methods=["POST"])
 def create_material_transaction():
     data = request.get_json()
-    new_transaction = MaterialTransaction(
-        material_id=data["material_id"],
-        transaction_type=data["transaction_type"],
-        quantity=data["quantity"],
-        description=data.get("description")
-    )
-    db.session.add(new_transaction)
-    db.session.commit()
+    try:
+        posting = parse_posting(data or {})
+        transaction_id, = post_transactions(
+            db.session, [posting], allow_negative=current_app.config.get("INVENTORY_ALLOW_NEGATIVE", True)
+        )
+        db.session.commit()
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 409
+    except InventoryError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    new_transaction = MaterialTransaction.query.get(transaction_id)
     return jsonify(transaction_schema.dump(new_transaction)), 201
 
+# ➤ Post several transactions (e.g. everything a batch consumed) atomically
+@material_bp.route("/material-transactions/batch", methods=["POST"])
+def create_material_transactions_batch():
+    data = request.get_json() or {}
+    items = data.get("postings") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a non-empty list of postings"}), 400
+    try:
+        postings = [parse_posting(item) for item in items]
+        if isinstance(data, dict) and data.get("batch_id"):
+            postings = [p._replace(description=p.description or f"Batch {data['batch_id']}") for p in postings]
+        transaction_ids = post_transactions(
+            db.session, postings, allow_negative=current_app.config.get("INVENTORY_ALLOW_NEGATIVE", True)
+        )
+        db.session.commit()
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 409
+    except InventoryError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"transaction_ids": transaction_ids}), 201
+
+# ➤ Compare stock balances with the ledger; POST resets drifted balances to the ledger
+@material_bp.route("/material-transactions/reconcile", methods=["GET", "POST"])
+def reconcile_material_balances():
+    drift = reconcile(db.session, apply=request.method == "POST")
+    db.session.commit()
+    return jsonify({"applied": request.method == "POST", "materials": drift}), 200
+
 # ➤ Get all Material Transactions
 @material_bp.route("/material-transactions", methods=["GET"])
 def get_material_transactions():
@@ -1,72 +1,43 @@
-from flask import Blueprint, request, jsonify, send_file  # type: ignore
-from extensions import db
-from models.production import ProductionOrder, Batch, BatchMaterialDispensing
+from flask import Blueprint, request, jsonify, send_file, current_app  # type: ignore
+from extensions import db, export_jobs, traces
+from models.production import ProductionOrder, Batch, BatchMaterialDispensing, DispensingTrace
 from models.user import User  # ✅ Needed for username and validation
+from models.recipe import Recipe
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import joinedload
+from datetime import date
 from flask_jwt_extended import jwt_required, get_jwt_identity  # type: ignore
 from routes.user_routes import role_required
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as ExcelImage
-from barcode import Code128
-from barcode.writer import ImageWriter
-from PIL import Image as PILImage
-import os, io, tempfile
+from services.barcode_export import XLSX_MIMETYPE
+from services.export_jobs import ExportSpec, run_export
+from services.downsampling import lttb, minmax
+from services.weight_trace import decode_trace
+from services.mrp import plan
 import traceback
 
 production_bp = Blueprint("production", __name__)
 
+PRODUCTION_ORDER_BARCODE_EXPORT = ExportSpec(
+    title="Production Order Barcodes",
+    headers=["Order Number", "Barcode ID", "Scannable Barcode"],
+    barcode_column=1,
+    statement=lambda: db.select(ProductionOrder.order_number, ProductionOrder.barcode_id)
+    .where(ProductionOrder.barcode_id.isnot(None), ProductionOrder.barcode_id != "")
+    .order_by(ProductionOrder.order_id),
+    download_name="production_orders_with_barcodes.xlsx",
+)
+export_jobs.register("production_orders", PRODUCTION_ORDER_BARCODE_EXPORT)
+
 @production_bp.route("/production_orders/export/barcodes", methods=["GET"])
 def export_production_orders_excel_with_barcodes():
     try:
-        orders = ProductionOrder.query.all()
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Production Order Barcodes"
-        ws.append(["Order Number", "Barcode ID", "Scannable Barcode"])
-
-        row_number = 2
-
-        for order in orders:
-            if order.barcode_id:
-                barcode_id = order.barcode_id
-                try:
-                    temp_dir = tempfile.gettempdir()
-                    filename = f"{barcode_id}"
-                    filepath = os.path.join(temp_dir, f"{filename}.png")
-
-                    code128 = Code128(barcode_id, writer=ImageWriter())
-                    code128.save(filepath)
-
-                    image = PILImage.open(filepath)
-                    image = image.resize((200, 60))
-                    image.save(filepath)
-
-                    ws.cell(row=row_number, column=1, value=order.order_number)
-                    ws.cell(row=row_number, column=2, value=barcode_id)
-
-                    img = ExcelImage(filepath)
-                    img.width = 150
-                    img.height = 50
-                    ws.add_image(img, f"C{row_number}")
-
-                    os.remove(filepath)
-                    row_number += 1
-
-                except Exception as e:
-                    print(f"Failed to generate barcode for {barcode_id}: {e}")
-                    ws.cell(row=row_number, column=1, value=order.order_number)
-                    ws.cell(row=row_number, column=2, value=barcode_id)
-                    row_number += 1
-
-        stream = io.BytesIO()
-        wb.save(stream)
-        stream.seek(0)
+        stream = run_export(PRODUCTION_ORDER_BARCODE_EXPORT)
 
         return send_file(
             stream,
-            download_name="production_orders_with_barcodes.xlsx",
+            download_name=PRODUCTION_ORDER_BARCODE_EXPORT.download_name,
             as_attachment=True,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mimetype=XLSX_MIMETYPE
         )
 
     except Exception as e:
@@ -75,6 +46,13 @@ def export_production_orders_excel_with_barcodes():
         return jsonify({"error": str(e)}), 500
 
 
+@production_bp.route("/production_orders/export/barcodes", methods=["POST"])
+def queue_production_orders_barcode_export():
+    """Same workbook as the GET, built in the background; poll /api/export_jobs/<job_id>"""
+    job = export_jobs.submit("production_orders")
+    return jsonify(job.to_dict()), 202
+
+
 @production_bp.route("/production_orders", methods=["POST"])
 @jwt_required(locations=["headers"])
 @role_required(["admin", "operator"])
@@ -156,23 +134,99 @@ def delete_production_order(order_id):
         return jsonify({"error": str(e)}), 500
 
 
+def _serialize_order(order):
+    return {
+        "order_id": order.order_id,
+        "order_number": order.order_number,
+        "recipe_id": order.recipe_id,
+        "recipe_name": order.recipe.name if order.recipe else None,
+        "batch_size": str(order.batch_size),
+        "scheduled_date": order.scheduled_date.strftime("%Y-%m-%d"),
+        "status": order.status,
+        "created_by": order.created_by,
+        "created_by_username": order.creator.username if order.creator else None
+    }
+
+
 @production_bp.route("/production_orders", methods=["GET"])
 def get_production_orders():
-    orders = ProductionOrder.query.all()
-    result = []
-    for order in orders:
-        user = User.query.get(order.created_by)
-        result.append({
-            "order_id": order.order_id,
-            "order_number": order.order_number,
-            "recipe_id": order.recipe_id,
-            "batch_size": str(order.batch_size),
-            "scheduled_date": order.scheduled_date.strftime("%Y-%m-%d"),
-            "status": order.status,
-            "created_by": order.created_by,
-            "created_by_username": user.username if user else None  # Fetching username here
-        })
-    return jsonify(result)
+    """
+    ?status=                   filter by status (comma separated for several)
+    ?date_from=&date_to=       scheduled_date range, inclusive (YYYY-MM-DD)
+    ?limit=&cursor=            keyset pagination on (scheduled_date, order_id);
+                               without ?limit the full list is returned as before
+    """
+    # Creator and recipe are joined into the same SELECT instead of one lookup per order
+    query = ProductionOrder.query.options(
+        joinedload(ProductionOrder.creator).load_only(User.username),
+        joinedload(ProductionOrder.recipe).load_only(Recipe.name),
+    )
+
+    try:
+        status = request.args.get("status")
+        if status:
+            query = query.filter(ProductionOrder.status.in_(status.split(",")))
+        if request.args.get("date_from"):
+            query = query.filter(ProductionOrder.scheduled_date >= date.fromisoformat(request.args["date_from"]))
+        if request.args.get("date_to"):
+            query = query.filter(ProductionOrder.scheduled_date <= date.fromisoformat(request.args["date_to"]))
+
+        limit = request.args.get("limit", type=int)
+        if limit is not None and limit < 0:
+            return jsonify({"error": "limit must not be negative"}), 400
+        if not limit:
+            orders = query.order_by(ProductionOrder.order_id).all()
+            return jsonify([_serialize_order(order) for order in orders])
+
+        limit = min(limit, 1000)
+        cursor = request.args.get("cursor")
+        if cursor:
+            cursor_date, cursor_id = cursor.rsplit("_", 1)
+            cursor_date, cursor_id = date.fromisoformat(cursor_date), int(cursor_id)
+            query = query.filter(or_(
+                ProductionOrder.scheduled_date > cursor_date,
+                and_(ProductionOrder.scheduled_date == cursor_date, ProductionOrder.order_id > cursor_id)
+            ))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+    orders = query.order_by(ProductionOrder.scheduled_date, ProductionOrder.order_id).limit(limit + 1).all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    next_cursor = None
+    if has_more:
+        next_cursor = f"{orders[-1].scheduled_date.isoformat()}_{orders[-1].order_id}"
+
+    return jsonify({
+        "orders": [_serialize_order(order) for order in orders],
+        "next_cursor": next_cursor,
+        "limit": limit
+    })
+
+
+@production_bp.route("/production_orders/mrp", methods=["GET"])
+def get_material_requirements():
+    """
+    Material demand of production orders against stock, per material and scheduled date
+    ?status=               order statuses (comma separated, default planned)
+    ?date_from=&date_to=   scheduled_date range, inclusive (YYYY-MM-DD)
+    ?material_id=          only these materials (comma separated)
+    ?only_short=true       only materials that end below minimum_quantity
+    """
+    try:
+        statuses = request.args.get("status", "planned").split(",")
+        date_from = date.fromisoformat(request.args["date_from"]) if request.args.get("date_from") else None
+        date_to = date.fromisoformat(request.args["date_to"]) if request.args.get("date_to") else None
+        material_ids = [int(m) for m in request.args["material_id"].split(",")] if request.args.get("material_id") else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+    result = plan(db.session, statuses, date_from, date_to, material_ids,
+                  set_point_unit=current_app.config.get("MRP_SET_POINT_UNIT", "kg"))
+    if request.args.get("only_short", "false").lower() == "true":
+        result["materials"] = [m for m in result["materials"] if m["below_minimum"] > 0]
+    result["shortfalls"] = sum(1 for m in result["materials"] if m["shortfall"] > 0)
+    return jsonify(result), 200
 
 
 @production_bp.route("/production_orders/<int:order_id>", methods=["GET"])
@@ -315,3 +369,61 @@ def get_batch_dispensing():
         for record in dispensing_records
     ]
     return jsonify(result)
+
+
+### DISPENSING WEIGHT TRACES ###
+MAX_TRACE_POINTS = 5000
+
+
+@production_bp.route("/batch_dispensing/<int:dispensing_id>/trace/start", methods=["POST"])
+def start_dispensing_trace(dispensing_id):
+    """Record the weight curve of ?scale_id= (or {"scale_id"}) until .../trace/stop"""
+    data = request.get_json(silent=True) or {}
+    scale_id = data.get("scale_id", request.args.get("scale_id", type=int))
+    try:
+        trace = traces.start(dispensing_id, scale_id)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(trace.to_dict()), 202
+
+
+@production_bp.route("/batch_dispensing/<int:dispensing_id>/trace/stop", methods=["POST"])
+def stop_dispensing_trace(dispensing_id):
+    """Store the trace; any worker can stop it, whichever one started it"""
+    result = traces.stop(dispensing_id)
+    if result is None:
+        return jsonify({"error": "No trace is being recorded for this dispensing"}), 404
+    return jsonify(result), 200
+
+
+@production_bp.route("/batch_dispensing/<int:dispensing_id>/trace", methods=["GET"])
+def get_dispensing_trace(dispensing_id):
+    """
+    Every sample as {"t": seconds since start, "weight"}, or with
+    ?points=&method= downsampled for plotting (method=lttb, or minmax:
+    count/min/max/avg per time bucket)
+    """
+    trace = DispensingTrace.query.get_or_404(dispensing_id)
+    result = trace.to_dict()
+    if trace.data is None:
+        result["points"] = []
+        return jsonify(result), 200
+
+    times, weights = decode_trace(trace.data)
+    points = request.args.get("points", type=int)
+    if points is None:
+        result["points"] = [{"t": t, "weight": w} for t, w in zip(times, weights)]
+        return jsonify(result), 200
+    if points < 2:
+        return jsonify({"error": "points must be at least 2"}), 400
+
+    method = request.args.get("method", "lttb")
+    if method not in ("minmax", "lttb"):
+        return jsonify({"error": "method must be 'minmax' or 'lttb'"}), 400
+    points = min(points, MAX_TRACE_POINTS)
+    result["method"] = method
+    if method == "lttb":
+        result["points"] = [{"t": t, "weight": w} for t, w in lttb(list(zip(times, weights)), points)]
+    else:
+        result["points"] = minmax(list(zip(times, weights)), points)
+    return jsonify(result), 200
@@ -1,78 +1,56 @@
-from flask import Blueprint, request, jsonify, send_file
-from extensions import db
+from flask import Blueprint, request, jsonify, send_file, current_app
+from extensions import db, acquisition, export_jobs, master_cache, weight_filters
 from models.recipe import Recipe, RecipeMaterial, RecipeSchema
+from models.material import Material
+from models.storage import StorageBucket
+from services.scale_acquisition import sample_metadata
 from models.production import ProductionOrder
 from models.user import User
 from sqlalchemy.exc import IntegrityError
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as ExcelImage
-from barcode import Code128
-from barcode.writer import ImageWriter
-from PIL import Image as PILImage
-import io, os, tempfile
+from services.barcode_export import XLSX_MIMETYPE
+from services.export_jobs import ExportSpec, run_export
+from services.conditional import conditional
+import json, hashlib
 from werkzeug.exceptions import BadRequest
 import logging
 
 recipe_bp = Blueprint("recipe", __name__)
 logging.basicConfig(level=logging.DEBUG)
 
+RECIPE_BARCODE_EXPORT = ExportSpec(
+    title="Recipes with Barcodes",
+    headers=["Name", "Code", "Barcode ID", "Scannable Barcode"],
+    barcode_column=2,
+    statement=lambda: db.select(Recipe.name, Recipe.code, Recipe.barcode_id)
+    .where(Recipe.barcode_id.isnot(None), Recipe.barcode_id != "")
+    .order_by(Recipe.recipe_id),
+    download_name="recipes_with_barcodes.xlsx",
+)
+export_jobs.register("recipes", RECIPE_BARCODE_EXPORT)
+
 @recipe_bp.route("/recipes/export/barcodes", methods=["GET"])
 def export_recipes_excel_with_barcodes():
     try:
-        recipes = Recipe.query.all()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Recipes with Barcodes"
-        ws.append(["Name", "Code", "Barcode ID", "Scannable Barcode"])
-
-        row_number = 2
-        for recipe in recipes:
-            if recipe.barcode_id:
-                barcode_id = recipe.barcode_id
-                try:
-                    temp_dir = tempfile.gettempdir()
-                    filename = f"{barcode_id}"
-                    filepath = os.path.join(temp_dir, f"{filename}.png")
-                    code128 = Code128(barcode_id, writer=ImageWriter())
-                    code128.save(os.path.join(temp_dir, filename))
-                    image = PILImage.open(filepath)
-                    image = image.resize((200, 60))
-                    image.save(filepath)
-
-                    ws.cell(row=row_number, column=1, value=recipe.name)
-                    ws.cell(row=row_number, column=2, value=recipe.code)
-                    ws.cell(row=row_number, column=3, value=barcode_id)
-
-                    img = ExcelImage(filepath)
-                    img.width = 150
-                    img.height = 50
-                    ws.add_image(img, f"D{row_number}")
-
-                    os.remove(filepath)
-                    row_number += 1
-
-                except Exception as e:
-                    logging.error(f"Failed to generate barcode for {barcode_id}: {e}")
-                    ws.cell(row=row_number, column=1, value=recipe.name)
-                    ws.cell(row=row_number, column=2, value=recipe.code)
-                    ws.cell(row=row_number, column=3, value=barcode_id)
-                    row_number += 1
-
-        stream = io.BytesIO()
-        wb.save(stream)
-        stream.seek(0)
+        stream = run_export(RECIPE_BARCODE_EXPORT)
 
         return send_file(
             stream,
-            download_name="recipes_with_barcodes.xlsx",
+            download_name=RECIPE_BARCODE_EXPORT.download_name,
             as_attachment=True,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mimetype=XLSX_MIMETYPE
         )
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@recipe_bp.route("/recipes/export/barcodes", methods=["POST"])
+def queue_recipes_barcode_export():
+    """Same workbook as the GET, built in the background; poll /api/export_jobs/<job_id>"""
+    job = export_jobs.submit("recipes")
+    return jsonify(job.to_dict()), 202
+
+
 @recipe_bp.route("/recipes", methods=["GET"])
 def get_recipes():
     recipes = Recipe.query.all()
@@ -122,10 +100,16 @@ def get_paginated_recipes():
     })
 
 @recipe_bp.route("/recipes/all", methods=["GET"])
+@conditional(Recipe)
 def get_all_recipes():
-    recipes = Recipe.query.all()
-    recipe_schema = RecipeSchema(many=True)
-    return jsonify(recipe_schema.dump(recipes)), 200
+    recipes = master_cache.get_or_load(
+        "recipes:all", ["Recipe"], lambda: RecipeSchema(many=True).dump(Recipe.query.all())
+    )
+    return jsonify(recipes), 200
+
+@recipe_bp.route("/master_data/cache/stats", methods=["GET"])
+def master_data_cache_stats():
+    return jsonify(master_cache.stats()), 200
 
 
 
@@ -190,11 +174,16 @@ def create_recipe():
 
 @recipe_bp.route("/recipes/<int:recipe_id>", methods=["GET"])
 def get_recipe(recipe_id):
-    recipe = Recipe.query.get(recipe_id)
-    if not recipe:
+    result = master_cache.get_or_load(f"recipe:{recipe_id}", ["Recipe"], lambda: _recipe_detail(recipe_id))
+    if result is None:
         return jsonify({"error": "Recipe not found"}), 404
+    return jsonify(result)
 
-    result = {
+def _recipe_detail(recipe_id):
+    recipe = Recipe.query.get(recipe_id)
+    if not recipe:
+        return None
+    return {
         "recipe_id": recipe.recipe_id,
         "name": recipe.name,
         "code": recipe.code,
@@ -204,7 +193,6 @@ def get_recipe(recipe_id):
         "created_by": recipe.created_by,
         "no_of_materials" : recipe.no_of_materials
     }
-    return jsonify(result)
 
 
 
@@ -278,19 +266,24 @@ def create_or_update_recipe_material():
         set_point = data.get("set_point")
         status = data.get("status")
         bucket_id = data.get("bucket_id")  # ✅ Extract bucket_id from request
+        tolerance = data.get("tolerance")  # dosing allowance in set point units; None = DOSING_DEFAULT_TOLERANCE
         
         # Use scale flag
         use_scale = data.get("use_scale", False)
 
         # Get actual weight
         if use_scale:
-            from models.scale import ScaleClient
-            scale_client = ScaleClient()
-            actual = scale_client.get_net_weight()
+            try:
+                capture = weight_filters.wait_stable(data.get("scale_id"), data.get("timeout"))
+            except LookupError as e:
+                return jsonify({"error": str(e)}), 404
+            actual = capture.weight
             if actual is None:
                 return jsonify({
                     "error": "Failed to read weight from scale. Please check scale connection."
                 }), 500
+            if not capture.stable and data.get("require_stable", True):
+                return jsonify({"error": f"Scale weight did not settle within {capture.waited}s ({actual})."}), 409
         else:
             actual = data.get("actual")
 
@@ -302,6 +295,8 @@ def create_or_update_recipe_material():
             raise BadRequest("recipe_id and material_id must be integers.")
         if not isinstance(set_point, (int, float)) or not isinstance(actual, (int, float)):
             raise BadRequest("set_point and actual must be numeric values.")
+        if tolerance is not None and (not isinstance(tolerance, (int, float)) or tolerance < 0):
+            raise BadRequest("tolerance must be a non-negative number.")
 
         # ✅ Optional: validate bucket_id exists
         if bucket_id is not None:
@@ -322,6 +317,8 @@ def create_or_update_recipe_material():
             existing_recipe_material.margin = margin
             existing_recipe_material.status = status
             existing_recipe_material.bucket_id = bucket_id  # ✅ Save bucket_id
+            if "tolerance" in data:
+                existing_recipe_material.tolerance = tolerance
             db.session.commit()
 
             return jsonify({
@@ -339,7 +336,8 @@ def create_or_update_recipe_material():
                 actual=actual,
                 margin=margin,
                 status=status,
-                bucket_id=bucket_id  # ✅ Save bucket_id
+                bucket_id=bucket_id,  # ✅ Save bucket_id
+                tolerance=tolerance
             )
             db.session.add(new_recipe_material)
             db.session.commit()
@@ -361,6 +359,7 @@ def create_or_update_recipe_material():
 
 
 @recipe_bp.route("/recipe_materials", methods=["GET"])
+@conditional(RecipeMaterial)
 def get_recipe_materials():
     materials = RecipeMaterial.query.all()
     result = [
@@ -370,7 +369,8 @@ def get_recipe_materials():
             "material_id": mat.material_id,
             "set_point": str(mat.set_point) if mat.set_point is not None else None,
             "actual": str(mat.actual) if mat.actual is not None else None,
-            "margin": str(mat.margin) if mat.margin is not None else None  # Include margin field
+            "margin": str(mat.margin) if mat.margin is not None else None,  # Include margin field
+            "tolerance": str(mat.tolerance) if mat.tolerance is not None else None
         }
         for mat in materials
     ]
@@ -385,6 +385,11 @@ def update_recipe_material(recipe_material_id):
     data = request.get_json()
     material.material_id = data.get("material_id", material.material_id)
     material.set_point = data.get("set_point", material.set_point)
+    if "tolerance" in data:
+        tolerance = data["tolerance"]
+        if tolerance is not None and (not isinstance(tolerance, (int, float)) or tolerance < 0):
+            return jsonify({"message": "tolerance must be a non-negative number"}), 400
+        material.tolerance = tolerance
     # material.actual = data.get("actual", material.actual)
 
     db.session.commit()
@@ -403,7 +408,8 @@ def get_recipe_materials_by_recipe_id(recipe_id):
             "material_id": mat.material_id,
             "set_point": str(mat.set_point) if mat.set_point is not None else None,
             "actual": str(mat.actual) if mat.actual is not None else None,
-            "margin": str(mat.margin) if mat.margin is not None else None
+            "margin": str(mat.margin) if mat.margin is not None else None,
+            "tolerance": str(mat.tolerance) if mat.tolerance is not None else None
         }
         for mat in materials
     ]
@@ -428,7 +434,23 @@ def delete_recipe_material(recipe_material_id):
 
 @recipe_bp.route("/recipe_materials/<int:recipe_id>/<int:material_id>/capture_weight", methods=["POST"])
 def capture_weight_for_recipe_material(recipe_id, material_id):
+    """Capture the stable net weight of ?scale_id= (see POST /api/scale/capture for ?timeout/?require_stable)"""
     try:
+        # Settle first, so no database connection is held while the scale does
+        try:
+            capture = weight_filters.wait_stable(request.args.get("scale_id", type=int),
+                                                 request.args.get("timeout", type=float))
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        actual = capture.weight
+
+        if actual is None:
+            return jsonify({
+                "error": "Failed to read weight from scale. Please check scale connection."
+            }), 500
+        if not capture.stable and request.args.get("require_stable", "true").lower() == "true":
+            return jsonify({"error": f"Scale weight did not settle within {capture.waited}s ({actual})."}), 409
+
         # Get the recipe material
         recipe_material = RecipeMaterial.query.filter_by(
             recipe_id=recipe_id, 
@@ -440,16 +462,6 @@ def capture_weight_for_recipe_material(recipe_id, material_id):
                 "error": "Recipe material not found"
             }), 404
             
-        # Get weight from scale
-        from models.scale import ScaleClient
-        scale_client = ScaleClient()
-        actual = scale_client.get_net_weight()
-        
-        if actual is None:
-            return jsonify({
-                "error": "Failed to read weight from scale. Please check scale connection."
-            }), 500
-            
         # Calculate margin
         set_point = float(recipe_material.set_point) if recipe_material.set_point else 0
         if set_point == 0:
@@ -467,16 +479,116 @@ def capture_weight_for_recipe_material(recipe_id, material_id):
             recipe_material.status = "created"
             
         db.session.commit()
+
+        from routes.scale_events import notify_material_update
+        notify_material_update(recipe_material.recipe_material_id, {
+            "actual": actual,
+            "margin": f"{margin}%",
+            "status": recipe_material.status
+        })
         
         return jsonify({
             "message": "Weight captured successfully!",
             "recipe_material_id": recipe_material.recipe_material_id,
             "actual": actual,
             "margin": f"{margin}%",
-            "status": recipe_material.status
+            "status": recipe_material.status,
+            "stable": capture.stable,
+            "waited_ms": round(capture.waited * 1000)
         }), 200
         
     except Exception as e:
         db.session.rollback()
         logging.error(f"Error capturing weight: {str(e)}")
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+
+def _decimal_str(value):
+    return str(value) if value is not None else None
+
+@recipe_bp.route("/active_dosing", methods=["GET"])
+def get_active_dosing():
+    """
+    Everything the dosing screen needs in one response: the active recipe
+    (?recipe_id=, else the first Released recipe by sequence), its materials
+    with their buckets, and the latest cached scale sample (?scale_id=).
+    With no Released recipe, recipe is null and materials is empty.
+    Pass ?include_scale=false when weights come from the socket instead.
+    Supports If-None-Match, so unchanged polls get an empty 304.
+    """
+    requested_id = recipe_id = request.args.get("recipe_id", type=int)
+    if recipe_id is None:
+        # Resolved inside the same statement rather than with a separate lookup
+        recipe_id = (
+            db.select(Recipe.recipe_id)
+            .where(Recipe.status == "Released")
+            .order_by(Recipe.sequence.is_(None), Recipe.sequence, Recipe.recipe_id)
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    rows = (
+        db.session.query(Recipe, RecipeMaterial, Material, StorageBucket)
+        .outerjoin(RecipeMaterial, RecipeMaterial.recipe_id == Recipe.recipe_id)
+        .outerjoin(Material, Material.material_id == RecipeMaterial.material_id)
+        .outerjoin(StorageBucket, StorageBucket.bucket_id == RecipeMaterial.bucket_id)
+        .filter(Recipe.recipe_id == recipe_id)
+        .order_by(RecipeMaterial.recipe_material_id)
+        .all()
+    )
+    if not rows and requested_id is not None:
+        return jsonify({"error": f"Recipe {requested_id} not found"}), 404
+
+    recipe = rows[0][0] if rows else None
+    materials = []
+    for _, recipe_material, material, bucket in rows:
+        if recipe_material is None:
+            continue
+        materials.append({
+            "recipe_material_id": recipe_material.recipe_material_id,
+            "material_id": recipe_material.material_id,
+            "title": material.title if material else None,
+            "barcode_id": material.barcode_id if material else None,
+            "unit_of_measure": material.unit_of_measure if material else None,
+            "set_point": _decimal_str(recipe_material.set_point),
+            "actual": _decimal_str(recipe_material.actual),
+            "margin": _decimal_str(material.margin) if material else None,  # Material.margin (%), not the last capture's deviation
+            "tolerance": _decimal_str(recipe_material.tolerance),
+            "status": recipe_material.status,
+            "bucket": {
+                "bucket_id": bucket.bucket_id,
+                "location_id": bucket.location_id,
+                "barcode": bucket.barcode
+            } if bucket else None
+        })
+
+    result = {
+        "recipe": {
+            "recipe_id": recipe.recipe_id,
+            "name": recipe.name,
+            "code": recipe.code,
+            "version": recipe.version,
+            "status": recipe.status,
+            "barcode_id": recipe.barcode_id,
+            "no_of_materials": recipe.no_of_materials
+        } if recipe else None,
+        "materials": materials,
+        "scale": None
+    }
+
+    if request.args.get("include_scale", "true").lower() == "true":
+        cached = acquisition.latest(request.args.get("scale_id", type=int)) if acquisition.running else None
+        if cached:
+            sample, age, stale = cached
+            result["scale"] = {
+                "net_weight": sample.values["net_weight"],
+                "gross_weight": sample.values["gross_weight"],
+                "alarms": sample.values.get("alarms"),
+                "timestamp": sample_metadata(sample, age, stale)["timestamp"]
+            }
+
+    body = json.dumps(result, sort_keys=True, default=str)
+    response = current_app.response_class(body, mimetype="application/json")
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
@@ -0,0 +1,207 @@
+# routes/scale_events.py
+import threading
+import time
+from flask import request
+from flask_socketio import Namespace, join_room, leave_room # type: ignore
+from extensions import socketio, acquisition
+from services.scale_acquisition import sample_metadata
+
+NAMESPACE = "/scale"
+
+
+def recipe_material_room(recipe_material_id):
+    return f"recipe_material:{recipe_material_id}"
+
+
+class _Subscriber:
+    def __init__(self, sid):
+        self.sid = sid
+        self.scales = {}  # scale_id -> set of recipe_material_ids (None = plain scale subscription)
+        self.min_interval = 0.1
+        self.deadband = 0.01
+        self.last_sent = {}  # scale_id -> (net_weight, alarms, sent_at)
+        self.in_flight = 0  # unacknowledged weight events of the last round
+        self.in_flight_since = None
+        self.dropped = 0
+
+
+class ScaleBroadcaster:
+    """Pushes the latest sample of each subscribed scale to every subscriber.
+
+    Each subscriber gets its own rate limit and deadband, so a value is only
+    sent when it changed and enough time has passed. Pushes go out in rounds:
+    one weight event for every scale that is due, then nothing more until
+    the client has acknowledged all of them. While a slow client catches up
+    newer samples replace the pending ones instead of queueing behind them,
+    and every subscribed scale gets its turn in each round.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._task = None
+        self.tick = 0.05
+        self.max_rate = 20.0
+        self.ack_timeout = 5.0
+        self.max_dropped = 200
+
+    def init_app(self, app):
+        self.tick = app.config.get("SOCKET_PUSH_TICK", self.tick)
+        self.max_rate = app.config.get("SOCKET_MAX_RATE", self.max_rate)
+        self.ack_timeout = app.config.get("SOCKET_ACK_TIMEOUT", self.ack_timeout)
+        self.max_dropped = app.config.get("SOCKET_MAX_DROPPED", self.max_dropped)
+        acquisition.add_listener(lambda sample: self._wakeup.set())
+
+    def start(self):
+        if self._task is None:
+            self._task = socketio.start_background_task(self._run)
+
+    def add(self, sid):
+        with self._lock:
+            self._subscribers[sid] = _Subscriber(sid)
+
+    def remove(self, sid):
+        with self._lock:
+            self._subscribers.pop(sid, None)
+
+    def get(self, sid):
+        return self._subscribers.get(sid)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "in_flight": sum(1 for s in self._subscribers.values() if s.in_flight_since),
+                "dropped": sum(s.dropped for s in self._subscribers.values()),
+            }
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.tick)
+            self._wakeup.clear()
+            with self._lock:
+                subscribers = list(self._subscribers.values())
+            now = time.monotonic()
+            for subscriber in subscribers:
+                try:
+                    self._push(subscriber, now)
+                except Exception as e:
+                    print(f"Socket push to {subscriber.sid} failed: {e}")
+
+    def _push(self, subscriber, now):
+        due = []
+        for scale_id, recipe_materials in list(subscriber.scales.items()):
+            cached = acquisition.latest(scale_id)
+            if not cached:
+                continue
+            sample, age, stale = cached
+            net = sample.values["net_weight"]
+            alarms = sample.values.get("alarms")
+
+            last = subscriber.last_sent.get(scale_id)
+            if last and abs(last[0] - net) < subscriber.deadband and last[1] == alarms:
+                continue
+            if last and now - last[2] < subscriber.min_interval:
+                continue
+            due.append((scale_id, net, alarms, {
+                "data": sample.values,
+                "recipe_material_ids": sorted(r for r in recipe_materials if r is not None),
+                **sample_metadata(sample, age, stale),
+            }))
+
+        if subscriber.in_flight_since is not None:
+            # Client hasn't acknowledged the previous round; drop this one
+            subscriber.dropped += bool(due)
+            if now - subscriber.in_flight_since > self.ack_timeout or subscriber.dropped > self.max_dropped:
+                print(f"Disconnecting slow socket subscriber {subscriber.sid}")
+                self.remove(subscriber.sid)
+                socketio.server.disconnect(subscriber.sid, namespace=NAMESPACE)
+            return
+        if not due:
+            return
+
+        subscriber.in_flight = len(due)
+        subscriber.in_flight_since = now
+        for scale_id, net, alarms, payload in due:
+            subscriber.last_sent[scale_id] = (net, alarms, now)
+            socketio.emit("weight", payload, to=subscriber.sid, namespace=NAMESPACE,
+                          callback=lambda *args, s=subscriber: self._acked(s))
+
+    def _acked(self, subscriber):
+        subscriber.in_flight = max(subscriber.in_flight - 1, 0)
+        if not subscriber.in_flight:
+            subscriber.in_flight_since = None
+            subscriber.dropped = 0
+
+
+broadcaster = ScaleBroadcaster()
+
+
+class ScaleNamespace(Namespace):
+    """Live scale weights.
+
+    Clients emit ``subscribe`` with ``{"scale_id": 1}`` and optionally
+    ``recipe_material_id``, ``max_rate`` (Hz) and ``deadband``, then receive
+    ``weight`` events. Acknowledge each ``weight`` event to receive the next.
+    ``material_update`` events are broadcast to recipe material rooms when a
+    weight is captured.
+    """
+
+    def on_connect(self, auth=None):
+        broadcaster.add(request.sid)
+        broadcaster.start()
+
+    def on_disconnect(self, reason=None):
+        broadcaster.remove(request.sid)
+
+    def on_subscribe(self, data):
+        subscriber = broadcaster.get(request.sid)
+        if subscriber is None:
+            return {"success": False, "message": "Not connected"}
+        data = data or {}
+
+        try:
+            scale_id = int(data.get("scale_id", acquisition.default_scale_id))
+        except (TypeError, ValueError):
+            return {"success": False, "message": f"Invalid scale_id {data.get('scale_id')!r}"}
+        if scale_id not in acquisition.channels:
+            return {"success": False, "message": f"Unknown scale {scale_id}"}
+        recipe_material_id = data.get("recipe_material_id")
+
+        if data.get("max_rate"):
+            subscriber.min_interval = 1.0 / min(float(data["max_rate"]), broadcaster.max_rate)
+        if data.get("deadband") is not None:
+            subscriber.deadband = float(data["deadband"])
+
+        subscriber.scales.setdefault(scale_id, set()).add(recipe_material_id)
+        subscriber.last_sent.pop(scale_id, None)
+        if recipe_material_id is not None:
+            join_room(recipe_material_room(recipe_material_id))
+        return {"success": True, "scale_id": scale_id}
+
+    def on_unsubscribe(self, data):
+        subscriber = broadcaster.get(request.sid)
+        data = data or {}
+        try:
+            scale_id = int(data.get("scale_id", acquisition.default_scale_id))
+        except (TypeError, ValueError):
+            return {"success": False, "message": f"Invalid scale_id {data.get('scale_id')!r}"}
+        recipe_material_id = data.get("recipe_material_id")
+
+        if recipe_material_id is not None:
+            leave_room(recipe_material_room(recipe_material_id))
+            if subscriber and scale_id in subscriber.scales:
+                subscriber.scales[scale_id].discard(recipe_material_id)
+                if not subscriber.scales[scale_id]:
+                    subscriber.scales.pop(scale_id)
+        else:
+            if subscriber:
+                subscriber.scales.pop(scale_id, None)
+        return {"success": True}
+
+
+def notify_material_update(recipe_material_id, payload):
+    """Broadcast a recipe material change (e.g. a captured weight) to its room"""
+    socketio.emit("material_update", {"recipe_material_id": recipe_material_id, **payload},
+                  to=recipe_material_room(recipe_material_id), namespace=NAMESPACE)
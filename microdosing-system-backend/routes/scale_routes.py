@@ -1,46 +1,209 @@
 # routes/scale_routes.py
 from flask import Blueprint, jsonify, request
-from models.scale import ScaleClient
+from marshmallow import ValidationError
+from models.scale import Scale, ScaleSchema, REGISTER_MAPS
 from models.recipe import RecipeMaterial
+from models.dosing import DosingProfile
 from app import db
+from extensions import modbus, acquisition, dosing, weight_filters, traces
+from services.dosing import DosingError
+from services.scale_acquisition import sample_metadata
+from routes.scale_events import broadcaster, notify_material_update
 
 scale_bp = Blueprint('scale', __name__)
-scale_client = ScaleClient()
+scale_schema = ScaleSchema()
+_traced_runs = {}  # run_id -> dispensing_id whose weight trace the run records
+
+
+def _dosing_changed(run):
+    """Push each state change of a real (not simulated) run to the recipe material's room"""
+    if run.simulated:
+        return
+    summary = run.to_dict()
+    if summary['state'] in ('done', 'failed', 'aborted'):
+        _stop_trace(run)
+    payload = {'status': {'done': 'created', 'failed': 'pending', 'aborted': 'pending'}.get(summary['state'], 'in progress'),
+               'dosing': summary}
+    if summary['final_weight'] is not None:
+        payload['actual'] = summary['final_weight']
+    notify_material_update(run.recipe_material_id, payload)
+
+dosing.add_listener(_dosing_changed)
+
+def _stop_trace(run):
+    # Called by both the listener and start_dosing; whichever pops the run stops its trace
+    dispensing_id = _traced_runs.pop(run.run_id, None)
+    if dispensing_id is not None:
+        traces.stop(dispensing_id)
+
+def _unknown_scale(e):
+    return jsonify({'success': False, 'message': str(e)}), 404
+
+def _scale_values(scale_id):
+    """Latest cached sample of a scale while acquisition runs, else one direct read"""
+    channel = acquisition.channel(scale_id)
+    if acquisition.running:
+        cached = acquisition.latest(channel.scale_id)
+        if cached:
+            sample, age, stale = cached
+            return sample.values, {**sample_metadata(sample, age, stale), 'filtered': weight_filters.state(channel.scale_id)}
+        return None, {'scale_id': channel.scale_id, 'breaker': channel.breaker.state}
+    return channel.client.get_scale_values(), {'scale_id': channel.scale_id}
 
 @scale_bp.route('/values', methods=['GET'])
-def get_scale_values():
-    """Get current scale values"""
-    values = scale_client.get_scale_values()
+@scale_bp.route('/scales/<int:scale_id>/values', methods=['GET'])
+def get_scale_values(scale_id=None):
+    """Get current scale values of /scales/<id> or ?scale_id= (default: the first scale)"""
+    try:
+        values, metadata = _scale_values(scale_id if scale_id is not None else request.args.get('scale_id', type=int))
+    except LookupError as e:
+        return _unknown_scale(e)
+
     if values:
         return jsonify({
             'success': True,
-            'data': values
+            'data': values,
+            **metadata
         })
     else:
         return jsonify({
             'success': False,
-            'message': 'Failed to read scale values'
+            'message': 'Failed to read scale values',
+            **metadata
         }), 500
 
 @scale_bp.route('/net-weight', methods=['GET'])
-def get_net_weight():
-    """Get current net weight from scale"""
-    net_weight = scale_client.get_net_weight()
-    if net_weight is not None:
+@scale_bp.route('/scales/<int:scale_id>/net-weight', methods=['GET'])
+def get_net_weight(scale_id=None):
+    """Get current net weight of /scales/<id> or ?scale_id= (default: the first scale)"""
+    try:
+        values, metadata = _scale_values(scale_id if scale_id is not None else request.args.get('scale_id', type=int))
+    except LookupError as e:
+        return _unknown_scale(e)
+
+    if values:
         return jsonify({
             'success': True,
-            'net_weight': net_weight
+            'net_weight': values['net_weight'],
+            **metadata
         })
     else:
         return jsonify({
             'success': False,
-            'message': 'Failed to read net weight from scale'
+            'message': 'Failed to read net weight from scale',
+            **metadata
         }), 500
 
+# ------------------------------------------------------------------ #
+# Scale registry
+# ------------------------------------------------------------------ #
+def _scale_dict(scale):
+    status = acquisition.channels.get(scale.scale_id)
+    return {**scale_schema.dump(scale), 'status': acquisition.channel_status(status) if status else None}
+
+def _save_scale(scale):
+    if scale.model is not None and scale.model not in REGISTER_MAPS:
+        return jsonify({'success': False, 'message': f'Unknown scale model {scale.model}; known: {sorted(REGISTER_MAPS)}'}), 400
+    db.session.add(scale)
+    db.session.commit()
+    acquisition.reload()
+    return None
+
+@scale_bp.route('/scales', methods=['GET'])
+def get_scales():
+    """Registered scales with their live polling status; ?station= to filter"""
+    query = Scale.query.order_by(Scale.scale_id)
+    if request.args.get('station'):
+        query = query.filter(Scale.station == request.args['station'])
+    return jsonify({'success': True, 'source': acquisition.source, 'scales': [_scale_dict(scale) for scale in query]})
+
+@scale_bp.route('/scales', methods=['POST'])
+def create_scale():
+    try:
+        scale = scale_schema.load(request.get_json() or {}, session=db.session)
+        error = _save_scale(scale)
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': e.messages}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+    if error:
+        return error
+    return jsonify({'success': True, 'scale': _scale_dict(scale)}), 201
+
+@scale_bp.route('/scales/<int:scale_id>', methods=['GET'])
+def get_scale(scale_id):
+    scale = db.session.get(Scale, scale_id)
+    if scale is None:
+        return jsonify({'success': False, 'message': f'Scale {scale_id} not found'}), 404
+    return jsonify({'success': True, 'scale': _scale_dict(scale)})
+
+@scale_bp.route('/scales/<int:scale_id>', methods=['PUT'])
+def update_scale(scale_id):
+    scale = db.session.get(Scale, scale_id)
+    if scale is None:
+        return jsonify({'success': False, 'message': f'Scale {scale_id} not found'}), 404
+    try:
+        scale = scale_schema.load(request.get_json() or {}, instance=scale, session=db.session, partial=True)
+        error = _save_scale(scale)
+    except ValidationError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': e.messages}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+    if error:
+        db.session.rollback()
+        return error
+    return jsonify({'success': True, 'scale': _scale_dict(scale)})
+
+@scale_bp.route('/scales/<int:scale_id>', methods=['DELETE'])
+def delete_scale(scale_id):
+    scale = db.session.get(Scale, scale_id)
+    if scale is None:
+        return jsonify({'success': False, 'message': f'Scale {scale_id} not found'}), 404
+    db.session.delete(scale)
+    db.session.commit()
+    acquisition.reload()
+    return jsonify({'success': True, 'message': f'Scale {scale_id} deleted'})
+
+@scale_bp.route('/stats', methods=['GET'])
+def get_connection_stats():
+    """Connection pool counters and read latency percentiles per device"""
+    return jsonify({
+        'success': True,
+        'pools': modbus.stats(),
+        'acquisition': acquisition.status(),
+        'filters': weight_filters.stats(),
+        'sockets': broadcaster.stats()
+    })
+
 @scale_bp.route('/capture/<int:recipe_material_id>', methods=['POST'])
 def capture_weight(recipe_material_id):
-    """Capture current net weight and update recipe material"""
+    """Capture the net weight of ?scale_id= (default: the first scale) into the recipe material.
+
+    Waits up to ?timeout= seconds (WEIGHT_CAPTURE_TIMEOUT) for the weight to
+    be stable and records its mean over the stability window. An unstable
+    weight is refused with 409 unless ?require_stable=false.
+    """
     try:
+        # Settle first, so no database connection is held while the scale does
+        capture = weight_filters.wait_stable(request.args.get('scale_id', type=int),
+                                             request.args.get('timeout', type=float))
+        require_stable = request.args.get('require_stable', 'true').lower() == 'true'
+        if capture.weight is None:
+            return jsonify({
+                'success': False,
+                'message': 'Failed to read weight from scale'
+            }), 500
+        if require_stable and not capture.stable:
+            return jsonify({
+                'success': False,
+                'message': f'Weight did not settle within {capture.waited}s',
+                'net_weight': capture.weight,
+                'std': capture.std
+            }), 409
+
         # Get the recipe material
         recipe_material = RecipeMaterial.query.get(recipe_material_id)
         if not recipe_material:
@@ -48,25 +211,25 @@ def capture_weight(recipe_material_id):
                 'success': False,
                 'message': f'Recipe material with ID {recipe_material_id} not found'
             }), 404
-            
-        # Get weight from scale
-        net_weight = scale_client.get_net_weight()
-        if net_weight is None:
-            return jsonify({
-                'success': False,
-                'message': 'Failed to read weight from scale'
-            }), 500
-            
+
         # Update the recipe material actual value
+        net_weight = capture.weight
         recipe_material.actual = net_weight
         db.session.commit()
+        notify_material_update(recipe_material_id, {'actual': net_weight, 'status': recipe_material.status})
         
         return jsonify({
             'success': True,
             'recipe_material_id': recipe_material_id,
-            'actual_weight': net_weight
+            'actual_weight': net_weight,
+            'scale_id': capture.scale_id,
+            'stable': capture.stable,
+            'std': capture.std,
+            'waited_ms': round(capture.waited * 1000)
         })
         
+    except LookupError as e:
+        return _unknown_scale(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -76,53 +239,36 @@ def capture_weight(recipe_material_id):
 
 @scale_bp.route('/start-dosing/<int:recipe_material_id>', methods=['POST'])
 def start_dosing(recipe_material_id):
-    """Start dosing process for recipe material"""
+    """Start closed-loop dosing of a recipe material on ?scale_id= (or the first scale).
+
+    Returns 202 with the run; follow it with GET /dosing/<run_id> or the
+    material_update socket events. ?simulate=true doses against the
+    simulated plant and leaves the recipe material untouched. dispensing_id
+    records the run's weight curve as that batch dispensing's trace.
+    """
+    data = request.get_json(silent=True) or {}
+    scale_id = data.get('scale_id', request.args.get('scale_id', type=int))
+    dispensing_id = data.get('dispensing_id', request.args.get('dispensing_id', type=int))
+    simulate = str(data.get('simulate', request.args.get('simulate', 'false'))).lower() == 'true'
+    traced = dispensing_id is not None and not simulate
     try:
-        # Get the recipe material
-        recipe_material = RecipeMaterial.query.get(recipe_material_id)
-        if not recipe_material:
-            return jsonify({
-                'success': False,
-                'message': f'Recipe material with ID {recipe_material_id} not found'
-            }), 404
-            
-        # Update status to in progress
-        recipe_material.status = "in progress"
-        db.session.commit()
-        
-        # In a real application, you might start a background process here
-        # For now, we'll just update with the current weight
-        net_weight = scale_client.get_net_weight()
-        if net_weight is None:
-            recipe_material.status = "pending"  # Revert status
-            db.session.commit()
-            return jsonify({
-                'success': False,
-                'message': 'Failed to read weight from scale'
-            }), 500
-            
-        # Update actual weight
-        recipe_material.actual = net_weight
-        
-        # Check if we're within tolerance of set_point
-        set_point = float(recipe_material.set_point) if recipe_material.set_point else 0
-        margin = float(recipe_material.margin) if recipe_material.margin else 0.1
-        
-        if abs(net_weight - set_point) <= margin:
-            recipe_material.status = "created"
-        else:
-            recipe_material.status = "pending"  # Or appropriate status
-            
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'recipe_material_id': recipe_material_id,
-            'actual_weight': net_weight,
-            'target_weight': set_point,
-            'status': recipe_material.status
-        })
-        
+        if traced:
+            # Recording starts first so the trace holds the run from its first sample
+            traces.start(dispensing_id, scale_id)
+        try:
+            run = dosing.start(recipe_material_id, scale_id, simulate=simulate)
+        except Exception:
+            if traced:
+                traces.stop(dispensing_id)
+            raise
+        if traced:
+            _traced_runs[run.run_id] = dispensing_id
+            if run.to_dict()['state'] in ('done', 'failed', 'aborted'):  # finished before it was registered
+                _stop_trace(run)
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except DosingError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -130,5 +276,34 @@ def start_dosing(recipe_material_id):
             'message': f'Error: {str(e)}'
         }), 500
 
+    return jsonify({'success': True, 'run': run.to_dict()}), 202
+
+@scale_bp.route('/dosing', methods=['GET'])
+def get_dosing_runs():
+    """Recent runs, newest first, and mean cycle time of the finished ones"""
+    runs = [run.to_dict() for run in reversed(list(dosing.runs.values()))]
+    return jsonify({'success': True, 'runs': runs, **dosing.stats()})
+
+@scale_bp.route('/dosing/<string:run_id>', methods=['GET'])
+def get_dosing_run(run_id):
+    run = dosing.get(run_id)
+    if run is None:
+        return jsonify({'success': False, 'message': f'Dosing run {run_id} not found'}), 404
+    return jsonify({'success': True, 'run': run.to_dict()})
+
+@scale_bp.route('/dosing/<string:run_id>/abort', methods=['POST'])
+def abort_dosing_run(run_id):
+    """Stop feeding now; the run ends as aborted on its next tick"""
+    run = dosing.abort(run_id)
+    if run is None:
+        return jsonify({'success': False, 'message': f'Dosing run {run_id} not found'}), 404
+    return jsonify({'success': True, 'run': run.to_dict()})
+
+@scale_bp.route('/dosing/profiles/<int:material_id>', methods=['GET'])
+def get_dosing_profiles(material_id):
+    """Learned in-flight time and fine rate of a material, per scale (scale 0 = simulator)"""
+    profiles = DosingProfile.query.filter_by(material_id=material_id).order_by(DosingProfile.scale_id).all()
+    return jsonify({'success': True, 'profiles': [profile.to_dict() for profile in profiles]})
+
 # Add to routes/scale_routes.py
 
@@ -0,0 +1,174 @@
+# routes/scan_routes.py
+from flask import Blueprint, jsonify
+from extensions import db, barcode_index, master_cache
+from models.material import Material, MaterialSchema
+from models.production import ProductionOrder
+from models.recipe import Recipe, RecipeMaterial, RecipeSchema
+from models.storage import StorageBucket, StorageBucketSchema
+from services.barcode_index import DuplicateBarcode
+
+scan_bp = Blueprint("scan", __name__)
+material_schema = MaterialSchema()
+bucket_schema = StorageBucketSchema()
+buckets_schema = StorageBucketSchema(many=True)
+recipe_schema = RecipeSchema()
+
+# Master data a hydrated scan is built from; production orders aren't cached
+SCAN_ENTITIES = ["StorageBucket", "Material", "Recipe", "RecipeMaterial"]
+
+
+def _decimal_str(value):
+    return str(value) if value is not None else None
+
+
+def _recipe_lines(*criteria):
+    """Recipe lines with their recipe, material and bucket, from one joined SELECT"""
+    rows = (
+        db.session.query(RecipeMaterial, Recipe, Material, StorageBucket)
+        .join(Recipe, Recipe.recipe_id == RecipeMaterial.recipe_id)
+        .join(Material, Material.material_id == RecipeMaterial.material_id)
+        .outerjoin(StorageBucket, StorageBucket.bucket_id == RecipeMaterial.bucket_id)
+        .filter(*criteria)
+        .order_by(Recipe.sequence.is_(None), Recipe.sequence, Recipe.recipe_id, RecipeMaterial.recipe_material_id)
+        .all()
+    )
+    return [
+        {
+            "recipe_material_id": line.recipe_material_id,
+            "recipe_id": recipe.recipe_id,
+            "recipe_name": recipe.name,
+            "recipe_code": recipe.code,
+            "recipe_status": recipe.status,
+            "material_id": material.material_id,
+            "material_title": material.title,
+            "material_barcode": material.barcode_id,
+            "unit_of_measure": material.unit_of_measure,
+            "bucket_id": bucket.bucket_id if bucket else None,
+            "bucket_barcode": bucket.barcode if bucket else None,
+            "set_point": _decimal_str(line.set_point),
+            "actual": _decimal_str(line.actual),
+            "margin": _decimal_str(line.margin),
+            "status": line.status,
+        }
+        for line, recipe, material, bucket in rows
+    ]
+
+
+def _active_lines_for(material_id):
+    return _recipe_lines(RecipeMaterial.material_id == material_id, Recipe.status == "Released")
+
+
+def _hydrate_bucket(bucket_id):
+    row = (
+        db.session.query(StorageBucket, Material)
+        .join(Material, Material.material_id == StorageBucket.material_id)
+        .filter(StorageBucket.bucket_id == bucket_id)
+        .first()
+    )
+    if row is None:
+        return None
+    bucket, material = row
+    return {
+        "code": bucket.barcode,
+        "bucket": bucket_schema.dump(bucket),
+        "material": material_schema.dump(material),
+        "recipe_lines": _active_lines_for(material.material_id),
+    }
+
+
+def _hydrate_material(material_id):
+    material = db.session.get(Material, material_id)
+    if material is None:
+        return None
+    return {
+        "code": material.barcode_id,
+        "material": material_schema.dump(material),
+        "buckets": buckets_schema.dump(StorageBucket.query.filter_by(material_id=material_id).all()),
+        "recipe_lines": _active_lines_for(material_id),
+    }
+
+
+def _hydrate_recipe(recipe_id):
+    recipe = db.session.get(Recipe, recipe_id)
+    if recipe is None:
+        return None
+    return {
+        "code": recipe.barcode_id,
+        "recipe": recipe_schema.dump(recipe),
+        "recipe_lines": _recipe_lines(RecipeMaterial.recipe_id == recipe_id),
+    }
+
+
+def _hydrate_production_order(order_id):
+    row = (
+        db.session.query(ProductionOrder, Recipe)
+        .join(Recipe, Recipe.recipe_id == ProductionOrder.recipe_id)
+        .filter(ProductionOrder.order_id == order_id)
+        .first()
+    )
+    if row is None:
+        return None
+    order, recipe = row
+    return {
+        "code": order.barcode_id,
+        "production_order": {
+            "order_id": order.order_id,
+            "order_number": order.order_number,
+            "recipe_id": order.recipe_id,
+            "batch_size": str(order.batch_size),
+            "scheduled_date": order.scheduled_date.strftime("%Y-%m-%d"),
+            "status": order.status,
+            "created_by": order.created_by,
+            "notes": order.notes,
+        },
+        "recipe": recipe_schema.dump(recipe),
+        "recipe_lines": _recipe_lines(RecipeMaterial.recipe_id == recipe.recipe_id),
+    }
+
+
+HYDRATORS = {
+    "bucket": _hydrate_bucket,
+    "material": _hydrate_material,
+    "recipe": _hydrate_recipe,
+    "production_order": _hydrate_production_order,
+}
+
+
+def _hydrate(scan_type, pk):
+    if scan_type == "production_order":
+        return _hydrate_production_order(pk)
+    return master_cache.get_or_load(f"scan:{scan_type}:{pk}", SCAN_ENTITIES, lambda: HYDRATORS[scan_type](pk))
+
+
+@scan_bp.route("/scan/<string:code>", methods=["GET"])
+def resolve_scan(code):
+    """
+    Resolve any scanned barcode (bucket, material, recipe or production order)
+    in one round trip: {"type", "code", <entity>, related records...}.
+    A bucket comes with its material and that material's lines in Released
+    recipes; a material with its buckets and those lines; a recipe or
+    production order with all of its lines.
+    409 if more than one record carries the code.
+    """
+    # A second pass covers an index entry that went stale under another process
+    for _ in range(2):
+        try:
+            entry = barcode_index.resolve(code)
+        except DuplicateBarcode as e:
+            return jsonify({
+                "error": str(e),
+                "matches": [{"type": scan_type, "id": pk} for scan_type, pk in e.entries],
+            }), 409
+        if entry is None:
+            break
+        scan_type, pk = entry
+        result = _hydrate(scan_type, pk)
+        if result is not None and result["code"] == code:
+            return jsonify({"type": scan_type, **result}), 200
+        barcode_index.discard(code)
+    return jsonify({"error": f"No bucket, material, recipe or production order has barcode {code}"}), 404
+
+
+@scan_bp.route("/scan_index/stats", methods=["GET"])
+def scan_index_stats():
+    return jsonify(barcode_index.stats()), 200
@@ -2,7 +2,8 @@
 from flask import Blueprint, request, jsonify
 from models.storage import StorageBucket, StorageBucketSchema
 from models.material import Material
-from extensions import db
+from extensions import db, master_cache
+from services.conditional import conditional
 import uuid  # Used for generating unique barcodes
 
 storage_bp = Blueprint("storage_bp", __name__)
@@ -11,9 +12,10 @@ storages_schema = StorageBucketSchema(many=True)
 
 # GET all storage buckets
 @storage_bp.route("/storage", methods=["GET"])
+@conditional(StorageBucket)
 def get_all_buckets():
-    buckets = StorageBucket.query.all()
-    return storages_schema.jsonify(buckets), 200
+    buckets = master_cache.get_or_load("storage:all", ["StorageBucket"], lambda: storages_schema.dump(StorageBucket.query.all()))
+    return jsonify(buckets), 200
 
 
 # GET bucket by barcode
@@ -1,11 +1,13 @@
 from flask import Blueprint, request, jsonify, current_app , make_response # type: ignore
 from models.user import db, User  # ✅ Avoid circular imports
+from extensions import authz
+from services.authz import token_claims
 from werkzeug.security import generate_password_hash, check_password_hash # type: ignore
 import jwt # type: ignore
 import datetime
 from sqlalchemy.exc import SQLAlchemyError # type: ignore
 from functools import wraps
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity , create_access_token, set_access_cookies , get_csrf_token , unset_jwt_cookies # type: ignore
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity , get_jwt, create_access_token, set_access_cookies , get_csrf_token , unset_jwt_cookies # type: ignore
 
 user_bp = Blueprint("user", __name__)
 
@@ -17,18 +19,30 @@ def protected():
 
 ### ✅ ROLE-BASED ACCESS DECORATOR ###
 def role_required(allowed_roles):
-    """Restrict access based on user roles stored in the database."""
+    """Restrict access based on the user's role, checked against the cached authorization state.
+
+    Tokens carry role/status/authz_version claims; a token whose authz_version
+    no longer matches the user's (role or status changed since login) is refused.
+    """
     def wrapper(fn):
         @wraps(fn)
         def decorated_function(*args, **kwargs):
             try:
                 user_id = get_jwt_identity()
-                user = User.query.get(user_id)
+                state = authz.state(user_id)
 
-                if not user:
+                if not state:
                     return jsonify({"error": "User not found"}), 404
 
-                if user.role not in allowed_roles:
+                # Tokens issued before the claims existed have no version; they fall back to the cached state
+                claims = get_jwt()
+                if "authz_version" in claims and claims["authz_version"] != state.version:
+                    return jsonify({"error": "Session is out of date, please log in again"}), 401
+
+                if state.status == "inactive":
+                    return jsonify({"error": "Account is inactive"}), 403
+
+                if state.role not in allowed_roles:
                     return jsonify({"error": "Unauthorized access"}), 403
 
                 return fn(*args, **kwargs)
@@ -116,11 +130,18 @@ def update_user(user_id):
     user = User.query.get_or_404(user_id)
     data = request.get_json()
 
+    role = data.get("role", user.role)
+    status = data.get("status", user.status)
+    if role != user.role or status != user.status:
+        # Tokens issued with the old role/status stop working
+        user.authz_version = User.authz_version + 1
+
     user.full_name = data.get("full_name", user.full_name)
-    user.role = data.get("role", user.role)
-    user.status = data.get("status", user.status)
+    user.role = role
+    user.status = status
 
     db.session.commit()
+    authz.invalidate(user_id)
     return jsonify({"message": "User updated successfully"}), 200
 
 ### 🚀 DELETE USER ###
@@ -138,8 +159,7 @@ def delete_user(user_id):
     # Debugging
     print(f"Debug: Current User ID -> {current_user_id}, Type -> {type(current_user_id)}")
 
-    # Fetch user from database
-    user = User.query.get(current_user_id)
+    user = authz.state(current_user_id)
 
     if not user or user.role != "admin":
         return jsonify({"message": "Unauthorized: Admins only"}), 403
@@ -151,6 +171,7 @@ def delete_user(user_id):
 
     db.session.delete(user_to_delete)
     db.session.commit()
+    authz.invalidate(user_id)
 
     return jsonify({"message": "User deleted successfully"}), 200
 
@@ -168,7 +189,7 @@ def login_user():
         return jsonify({"message": "Invalid credentials"}), 401
 
     # ✅ Store only user_id as identity (string format)
-    access_token = create_access_token(identity=str(user.user_id))
+    access_token = create_access_token(identity=str(user.user_id), additional_claims=token_claims(user))
 
     # ✅ Create Response and Set Cookie
     response = make_response(jsonify({
@@ -1,8 +1,13 @@
 # routes/weight_routes.py
 
 from flask import Blueprint, request, jsonify
-from extensions import db
-from models.weight import WeightEntry, WeightEntrySchema
+from extensions import db, weight_buffer, weight_rollups
+from models.weight import WeightEntry, WeightEntrySchema, WeightRollup
+from services.weight_buffer import insert_weight_rows
+from services.downsampling import lttb_stream
+from sqlalchemy import func, literal, or_, and_
+from datetime import datetime, timedelta, timezone
+import json
 
 weight_bp = Blueprint("weight", __name__)
 
@@ -34,8 +39,282 @@ def create_weight_entry():
         db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
-# GET: Fetch all weight entries
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+MAX_POINTS = 10000
+
+def _encode_cursor(entry):
+    return f"{entry.timestamp.isoformat()}_{entry.id}"
+
+def _decode_cursor(cursor):
+    timestamp, entry_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(timestamp), int(entry_id)
+
+def _epoch(column):
+    """Seconds since the epoch as a float SQL expression for the active dialect"""
+    dialect = db.engine.dialect.name
+    if dialect == "mysql":
+        return func.unix_timestamp(column)
+    if dialect == "sqlite":
+        return (func.julianday(column) - 2440587.5) * 86400.0
+    return func.extract("epoch", column)
+
+def _filtered_query(query):
+    """Apply ?from=, ?to= and ?scale_id= to a WeightEntry query"""
+    if request.args.get("from"):
+        query = query.filter(WeightEntry.timestamp >= _parse_timestamp(request.args["from"]))
+    if request.args.get("to"):
+        query = query.filter(WeightEntry.timestamp < _parse_timestamp(request.args["to"]))
+    scale_id = request.args.get("scale_id", type=int)
+    if scale_id is not None:
+        query = query.filter(WeightEntry.scale_id == scale_id)
+    return query
+
+def _downsampled(points, method):
+    """Bucket the [from, to) window into `points` buckets and aggregate in SQL"""
+    base = _filtered_query(db.session.query(WeightEntry))
+    start = _parse_timestamp(request.args["from"]) if request.args.get("from") else \
+        base.with_entities(func.min(WeightEntry.timestamp)).scalar()
+    end = _parse_timestamp(request.args["to"]) if request.args.get("to") else \
+        base.with_entities(func.max(WeightEntry.timestamp)).scalar()
+    if start is None or end is None:
+        return {"method": method, "points": []}
+
+    # LTTB always keeps the first and last sample on top of one per bucket
+    buckets = points - 2 if method == "lttb" and points > 2 else points
+    width = max((end - start).total_seconds() / buckets, 0.001)
+    offset = _epoch(WeightEntry.timestamp) - _epoch(literal(start, db.DateTime))
+    bucket = func.floor(offset / width).label("bucket")
+
+    aggregates = (
+        base.with_entities(
+            bucket,
+            func.count(WeightEntry.id),
+            func.min(WeightEntry.current_weight),
+            func.max(WeightEntry.current_weight),
+            func.avg(WeightEntry.current_weight),
+            func.avg(offset),
+        )
+        .group_by(bucket)
+        .order_by(bucket)
+        .all()
+    )
+
+    if method != "lttb":
+        return {
+            "method": method,
+            "bucket_seconds": width,
+            "points": [
+                {
+                    "timestamp": (start + timedelta(seconds=int(b) * width)).isoformat(),
+                    "count": count,
+                    "min": minimum,
+                    "max": maximum,
+                    "avg": float(average),
+                }
+                for b, count, minimum, maximum, average, _ in aggregates
+            ],
+        }
+
+    averages = {int(b): (float(avg_t), float(avg_v)) for b, _, _, _, avg_v, avg_t in aggregates}
+    rows = (
+        base.with_entities(offset, WeightEntry.current_weight)
+        .order_by(WeightEntry.timestamp, WeightEntry.id)
+        .yield_per(10000)
+    )
+    selected = lttb_stream(
+        ((float(t), v) for t, v in rows),
+        lambda t: int(t // width),
+        averages,
+    )
+    return {
+        "method": "lttb",
+        "points": [
+            {"timestamp": (start + timedelta(seconds=t)).isoformat(), "value": v}
+            for t, v in selected
+        ],
+    }
+
+# GET: Fetch weight entries (newest first), a page at a time
 @weight_bp.route("/weights", methods=["GET"])
 def get_weight_entries():
-    entries = WeightEntry.query.order_by(WeightEntry.timestamp.desc()).all()
-    return weights_schema.jsonify(entries), 200
+    """
+    ?from=&to=       ISO timestamps (UTC) bounding the window
+    ?scale_id=       only samples from one indicator
+    ?limit=&cursor=  keyset pagination on (timestamp, id); pass back next_cursor (limit 1..MAX_PAGE_SIZE)
+    ?points=&method= downsample current_weight to ~points buckets
+                     (method=minmax: count/min/max/avg per bucket, method=lttb)
+    """
+    try:
+        points = request.args.get("points", type=int)
+        if points is not None:
+            if points < 2:
+                return jsonify({"error": "points must be at least 2"}), 400
+            method = request.args.get("method", "minmax")
+            if method not in ("minmax", "lttb"):
+                return jsonify({"error": "method must be 'minmax' or 'lttb'"}), 400
+            return jsonify(_downsampled(min(points, MAX_POINTS), method)), 200
+
+        limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+        query = _filtered_query(WeightEntry.query)
+        cursor = request.args.get("cursor")
+        if cursor:
+            timestamp, entry_id = _decode_cursor(cursor)
+            query = query.filter(or_(
+                WeightEntry.timestamp < timestamp,
+                and_(WeightEntry.timestamp == timestamp, WeightEntry.id < entry_id)
+            ))
+
+        entries = query.order_by(WeightEntry.timestamp.desc(), WeightEntry.id.desc()).limit(limit + 1).all()
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+        return jsonify({
+            "entries": weights_schema.dump(entries),
+            "next_cursor": _encode_cursor(entries[-1]) if has_more else None,
+            "limit": limit
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+REQUIRED_SAMPLE_FIELDS = [
+    "current_weight", "tare_weight", "gross_weight",
+    "unit", "status", "filter_level", "digital_output_status"
+]
+
+def _parse_timestamp(value):
+    if value is None:
+        return datetime.utcnow()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _sample_row(data):
+    """Validate one sample and turn it into an insert row"""
+    if not isinstance(data, dict):
+        raise ValueError("sample must be an object")
+    missing = [field for field in REQUIRED_SAMPLE_FIELDS if data.get(field) is None]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    return {
+        "timestamp": _parse_timestamp(data.get("timestamp")),
+        "current_weight": float(data["current_weight"]),
+        "tare_weight": float(data["tare_weight"]),
+        "gross_weight": float(data["gross_weight"]),
+        "unit": int(data["unit"]),
+        "status": int(data["status"]),
+        "filter_level": int(data["filter_level"]),
+        "digital_output_status": str(data["digital_output_status"]),
+        "scale_id": int(data["scale_id"]) if data.get("scale_id") is not None else None,
+    }
+
+def _iter_samples():
+    """Yield samples from an NDJSON stream or a JSON array / {"samples": [...]} body"""
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        for line in request.stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+        return
+
+    data = request.get_json()
+    if isinstance(data, dict):
+        data = data.get("samples")
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of samples")
+    yield from data
+
+# POST: Ingest many weight samples in one transaction
+@weight_bp.route("/weights/bulk", methods=["POST"])
+def create_weight_entries_bulk():
+    buffered = request.args.get("buffered", "false").lower() == "true"
+    rows = []
+
+    try:
+        for sample in _iter_samples():
+            rows.append(_sample_row(sample))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid sample #{len(rows) + 1}: {e}", "accepted": 0}), 400
+
+    if not rows:
+        return jsonify({"error": "No samples provided"}), 400
+
+    if buffered:
+        weight_buffer.add(rows)
+        return jsonify({"accepted": len(rows), "buffered": True}), 202
+
+    try:
+        insert_weight_rows(db.session, rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"accepted": len(rows), "buffered": False}), 201
+
+# GET: Buffered ingestion counters
+@weight_bp.route("/weights/buffer", methods=["GET"])
+def get_weight_buffer_stats():
+    return jsonify(weight_buffer.stats()), 200
+
+def _auto_resolution(start, end):
+    span = (end or datetime.utcnow()) - (start or datetime.utcnow() - timedelta(days=30))
+    if span <= timedelta(hours=6):
+        return "minute"
+    if span <= timedelta(days=14):
+        return "hour"
+    return "day"
+
+# GET: Aggregated weight history (count/min/max/mean/stddev/stable ratio per bucket)
+@weight_bp.route("/weights/rollups", methods=["GET"])
+def get_weight_rollups():
+    try:
+        start = _parse_timestamp(request.args["from"]) if request.args.get("from") else None
+        end = _parse_timestamp(request.args["to"]) if request.args.get("to") else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+    resolution = request.args.get("resolution") or _auto_resolution(start, end)
+    if resolution not in ("minute", "hour", "day"):
+        return jsonify({"error": "resolution must be 'minute', 'hour' or 'day'"}), 400
+
+    query = WeightRollup.query.filter(WeightRollup.resolution == resolution)
+    if start:
+        query = query.filter(WeightRollup.bucket_start >= start)
+    if end:
+        query = query.filter(WeightRollup.bucket_start < end)
+    scale_id = request.args.get("scale_id", type=int)
+    if scale_id is not None:
+        query = query.filter(WeightRollup.scale_id == scale_id)
+
+    rollups = query.order_by(WeightRollup.bucket_start, WeightRollup.scale_id).limit(MAX_POINTS).all()
+    return jsonify({
+        "resolution": resolution,
+        "rollups": [
+            {
+                "scale_id": r.scale_id,
+                "bucket_start": r.bucket_start.isoformat(),
+                "count": r.count,
+                "min": r.min_weight,
+                "max": r.max_weight,
+                "mean": r.mean,
+                "stddev": r.stddev,
+                "stable_ratio": r.stable_ratio
+            }
+            for r in rollups
+        ]
+    }), 200
+
+# POST: Run rollup + retention now instead of waiting for the background cycle
+@weight_bp.route("/weights/rollups/run", methods=["POST"])
+def run_weight_rollups():
+    try:
+        return jsonify(weight_rollups.run_once()), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,66 @@
+# services/authz.py
+import threading
+import time
+from collections import namedtuple
+
+# What role_required needs to know about a user; version is User.authz_version
+AuthzState = namedtuple("AuthzState", ["user_id", "role", "status", "version"])
+
+
+def token_claims(user):
+    """Extra JWT claims issued at login; checked against AuthzCache on every protected request"""
+    return {"role": user.role, "status": user.status, "authz_version": user.authz_version}
+
+
+class AuthzCache:
+    """Per-process cache of each user's role, status and authz_version.
+
+    Entries live for AUTHZ_CACHE_TTL seconds. update_user/delete_user bump
+    the user's authz_version and invalidate the entry here, so in this
+    process a revoked token is refused on the very next request; other
+    processes notice within one TTL.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 30.0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get("AUTHZ_CACHE_TTL", self.ttl)
+        app.extensions["authz"] = self
+
+    def state(self, user_id):
+        """AuthzState for user_id, or None if the user doesn't exist"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and now - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[0]
+
+        from extensions import db
+        from models.user import User
+
+        self.misses += 1
+        row = db.session.execute(
+            db.select(User.role, User.status, User.authz_version).where(User.user_id == user_id)
+        ).first()
+        state = AuthzState(user_id, row.role, row.status, row.authz_version) if row else None
+        with self._lock:
+            self._entries[user_id] = (state, now)
+        return state
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(int(user_id), None)
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
@@ -0,0 +1,120 @@
+# services/barcode_export.py
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image as ExcelImage
+from openpyxl.utils import get_column_letter
+from services.barcodes import BarcodeSpec, BarcodeStore
+from services.barcode_worker import render_spec
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_IMAGE_SIZE = (200, 60)  # rendered pixels
+EXPORT_CELL_SIZE = (150, 50)  # displayed size in the sheet
+
+
+def _export_spec(value):
+    return BarcodeSpec(value, width=EXPORT_IMAGE_SIZE[0], height=EXPORT_IMAGE_SIZE[1])
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class BarcodeExporter:
+    """Builds "<entity> with barcodes" workbooks without blocking on one render at a time.
+
+    Rows are consumed in chunks: the distinct barcodes of a chunk that are not
+    in the barcode store yet are rendered in a process pool and added to it
+    (so /api/barcodes serves them too), then the chunk is appended to a
+    write-only worksheet, so only one chunk of rows is materialised at a time
+    and no temp files are written.
+    """
+
+    def __init__(self, app=None):
+        self.workers = 2
+        self.chunk_size = 500
+        self.store = BarcodeStore()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get("BARCODE_EXPORT_WORKERS", self.workers)
+        self.chunk_size = app.config.get("BARCODE_EXPORT_CHUNK_SIZE", self.chunk_size)
+        self.store = app.extensions.get("barcodes", self.store)
+        app.extensions["barcode_exporter"] = self
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None and self.workers > 1:
+                # spawn, not fork: a forked copy of this multi-threaded worker could inherit a lock
+                # held by another thread (logging, the DB pool, pymodbus) and its open sockets
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def render_many(self, values):
+        """{value: PNG bytes, or None if it couldn't be rendered} for the given barcode values"""
+        images = {}
+        missing = []
+        for value in dict.fromkeys(values):
+            spec = _export_spec(value)
+            png = self.store.get(spec)
+            if png is None:
+                missing.append(spec)
+            else:
+                images[value] = png
+
+        pool = self._pool() if len(missing) > 1 else None
+        if pool is not None:
+            rendered = pool.map(render_spec, missing, chunksize=max(1, len(missing) // (self.workers * 4)))
+        else:
+            rendered = map(render_spec, missing)
+        for spec, png, error in rendered:
+            if error:
+                print(f"Failed to generate barcode for {spec.value}: {error}")
+            else:
+                self.store.put(spec, png)
+            images[spec.value] = png
+        return images
+
+    def write_workbook(self, title, headers, rows, barcode_column, progress=None, out=None):
+        """Stream rows into a one-sheet workbook saved to out (a path or file, default a new BytesIO).
+
+        headers ends with the image column's heading; each row holds the other
+        columns, with the barcode value at index barcode_column. progress, if
+        given, is called with the number of rows written after every chunk.
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title)
+        ws.append(headers)
+        image_column = get_column_letter(len(headers))
+
+        row_number = 2
+        for chunk in _chunks(rows, self.chunk_size):
+            images = self.render_many(row[barcode_column] for row in chunk)
+            for row in chunk:
+                ws.append(list(row))
+                png = images.get(row[barcode_column])
+                if png:
+                    img = ExcelImage(io.BytesIO(png))
+                    img.width, img.height = EXPORT_CELL_SIZE
+                    ws.add_image(img, f"{image_column}{row_number}")
+                row_number += 1
+            if progress:
+                progress(row_number - 2)
+
+        if out is None:
+            out = io.BytesIO()
+        wb.save(out)
+        if hasattr(out, "seek"):
+            out.seek(0)
+        return out
@@ -0,0 +1,257 @@
+# services/barcode_index.py
+import threading
+import time
+from sqlalchemy import event, inspect, literal, select, union_all
+
+# Scan type -> (model class name, primary key column, barcode column)
+SOURCES = {
+    "bucket": ("StorageBucket", "bucket_id", "barcode"),
+    "material": ("Material", "material_id", "barcode_id"),
+    "recipe": ("Recipe", "recipe_id", "barcode_id"),
+    "production_order": ("ProductionOrder", "order_id", "barcode_id"),
+}
+
+
+class DuplicateBarcode(Exception):
+    """More than one row carries the scanned code; entries lists their (scan type, primary key)"""
+
+    def __init__(self, code, entries):
+        super().__init__(f"Barcode {code} is assigned to more than one record")
+        self.code = code
+        self.entries = entries
+
+
+class BarcodeIndex:
+    """In-memory map of every barcode in the plant to (scan type, primary key).
+
+    Built in a background thread from the four barcode columns (two columns
+    per table, no rows hydrated). Commits in this process patch it through
+    session events; changes made by other processes are picked up by a full
+    rebuild every BARCODE_INDEX_REFRESH_INTERVAL seconds. Scans never wait
+    for a rebuild: they read the previous index, and a miss falls through to
+    one indexed UNION lookup. Callers that find the entry no longer matches
+    the row call discard() and resolve again.
+
+    A code carried by more than one row is never mapped; resolve() raises
+    DuplicateBarcode for it instead of picking one.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.refresh_interval = 60.0
+        self._codes = {}  # barcode -> (scan type, primary key)
+        self._duplicates = {}  # barcode -> [(scan type, primary key), ...]
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._rebuild_thread = None
+        self._patches = None  # commits made while a rebuild runs, replayed onto its result
+        self._stale = False  # a bulk statement committed while a rebuild runs
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.rebuild_errors = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from extensions import db
+
+        self.app = app
+        self.refresh_interval = app.config.get("BARCODE_INDEX_REFRESH_INTERVAL", self.refresh_interval)
+        app.extensions["barcode_index"] = self
+
+        event.listen(db.session, "after_flush", self._after_flush)
+        event.listen(db.session, "do_orm_execute", self._do_orm_execute)
+        event.listen(db.session, "after_commit", self._after_commit)
+        event.listen(db.session, "after_rollback", self._after_rollback)
+
+    @staticmethod
+    def _models():
+        from extensions import db
+
+        classes = {mapper.class_.__name__: mapper.class_ for mapper in db.Model.registry.mappers}
+        return {scan_type: (classes[name], pk, column) for scan_type, (name, pk, column) in SOURCES.items()}
+
+    def _union(self):
+        return union_all(*[
+            select(literal(scan_type).label("scan_type"),
+                   getattr(model, pk).label("pk"),
+                   getattr(model, column).label("code"))
+            for scan_type, (model, pk, column) in self._models().items()
+        ]).subquery()
+
+    # ------------------------------------------------------------------ #
+    # Reads
+    # ------------------------------------------------------------------ #
+    def rebuild(self):
+        """Reload every code; runs in the caller's app context"""
+        from extensions import db
+
+        with self._lock:
+            self._patches = []
+            self._stale = False
+        try:
+            union = self._union()
+            rows = db.session.execute(select(union).where(union.c.code.isnot(None), union.c.code != "")).all()
+        except Exception:
+            with self._lock:
+                self._patches = None
+            raise
+        codes, duplicates = {}, {}
+        for row in rows:
+            entry = (row.scan_type, row.pk)
+            if row.code in duplicates:
+                duplicates[row.code].append(entry)
+            elif row.code in codes:
+                duplicates[row.code] = [codes.pop(row.code), entry]
+            else:
+                codes[row.code] = entry
+        with self._lock:
+            self._codes, self._duplicates = codes, duplicates
+            # Commits that landed while the SELECT ran may not be in its result
+            self._apply(self._patches)
+            self._patches = None
+            self._built_at = None if self._stale else time.monotonic()
+            self.rebuilds += 1
+
+    def _rebuild_in_background(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        except Exception as e:
+            self.rebuild_errors += 1
+            print(f"Barcode index rebuild failed: {e}")
+
+    def _refresh(self):
+        """Start a background rebuild if the index was never built or is due"""
+        if self._built_at is not None and not (
+            self.refresh_interval and time.monotonic() - self._built_at >= self.refresh_interval
+        ):
+            return
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+            self._rebuild_thread = threading.Thread(target=self._rebuild_in_background,
+                                                    name="barcode-index-rebuild", daemon=True)
+            self._rebuild_thread.start()
+
+    def resolve(self, code):
+        """(scan type, primary key) for a scanned code, or None; DuplicateBarcode if several rows carry it"""
+        self._refresh()
+
+        entries = self._duplicates.get(code)
+        if entries is not None:
+            raise DuplicateBarcode(code, entries)
+        entry = self._codes.get(code)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        # Not built yet, or created by another process since the last rebuild
+        from extensions import db
+
+        self.misses += 1
+        union = self._union()
+        rows = db.session.execute(select(union.c.scan_type, union.c.pk).where(union.c.code == code)).all()
+        if not rows:
+            return None
+        entries = [(row.scan_type, row.pk) for row in rows]
+        with self._lock:
+            if len(entries) > 1:
+                self._duplicates[code] = entries
+            else:
+                self._codes[code] = entries[0]
+        if len(entries) > 1:
+            raise DuplicateBarcode(code, entries)
+        return entries[0]
+
+    def discard(self, code):
+        with self._lock:
+            self._codes.pop(code, None)
+            self._duplicates.pop(code, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "codes": len(self._codes),
+            "duplicates": len(self._duplicates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "rebuilds": self.rebuilds,
+            "rebuild_errors": self.rebuild_errors,
+            "rebuilding": self._rebuild_thread is not None and self._rebuild_thread.is_alive(),
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None,
+        }
+
+    # ------------------------------------------------------------------ #
+    # Session events
+    # ------------------------------------------------------------------ #
+    def _after_flush(self, session, flush_context):
+        tracked = {name: (scan_type, pk, column) for scan_type, (name, pk, column) in SOURCES.items()}
+        pending = session.info.setdefault("barcode_index_pending", [])
+        for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+            source = tracked.get(type(instance).__name__)
+            if source is None:
+                continue
+            scan_type, pk, column = source
+            history = inspect(instance).attrs[column].history
+            removed = list(history.deleted)
+            added = list(history.added)
+            if instance in session.deleted:
+                removed += list(history.unchanged)
+                added = []
+            for code in removed:
+                if code:
+                    pending.append((code, None))
+            for code in added:
+                if code:
+                    pending.append((code, (scan_type, getattr(instance, pk))))
+
+    def _do_orm_execute(self, orm_execute_state):
+        state = orm_execute_state
+        if not (state.is_update or state.is_delete) or not state.bind_mapper:
+            return
+        columns = {name: column for name, _, column in SOURCES.values()}
+        column = columns.get(state.bind_mapper.class_.__name__)
+        if column is None:
+            return
+        values = getattr(state.statement, "_values", None)
+        if state.is_update and values and column not in {getattr(key, "key", key) for key in values}:
+            return  # e.g. the ledger's current_quantity increments
+        # Bulk statement that may move codes: we can't tell which, so rebuild after commit
+        state.session.info["barcode_index_stale"] = True
+
+    def _apply(self, pending):
+        """Patch the maps with a commit's (code, entry or None) changes; caller holds the lock"""
+        # Removals first, so a code handed from one row to another in the same commit survives
+        for code, entry in pending:
+            if entry is None:
+                self._codes.pop(code, None)
+                self._duplicates.pop(code, None)
+        for code, entry in pending:
+            if entry is None:
+                continue
+            if code in self._duplicates or self._codes.get(code, entry) != entry:
+                # Another row may still carry it; let the UNION lookup decide
+                self._codes.pop(code, None)
+                self._duplicates.pop(code, None)
+            else:
+                self._codes[code] = entry
+
+    def _after_commit(self, session):
+        pending = session.info.pop("barcode_index_pending", None)
+        if session.info.pop("barcode_index_stale", False):
+            with self._lock:
+                self._built_at = None
+                self._stale = True
+            return
+        if pending:
+            with self._lock:
+                if self._patches is not None:
+                    self._patches.extend(pending)
+                self._apply(pending)
+
+    def _after_rollback(self, session):
+        session.info.pop("barcode_index_pending", None)
+        session.info.pop("barcode_index_stale", None)
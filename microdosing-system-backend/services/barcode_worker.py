@@ -0,0 +1,16 @@
+# services/barcode_worker.py
+"""Code run inside the barcode export processes.
+
+The pool uses the spawn start method, so a worker starts from a fresh
+interpreter and imports only this module and services.barcodes (barcode,
+Pillow), never the app, its threads, locks or database connections.
+"""
+from services.barcodes import render
+
+
+def render_spec(spec):
+    # Errors come back as values so one bad code can't fail the batch
+    try:
+        return spec, render(spec), None
+    except Exception as e:
+        return spec, None, str(e)
@@ -0,0 +1,204 @@
+# services/barcodes.py
+"""Barcode rendering shared by the Excel exports, labels and the UI."""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+import barcode
+import PIL
+from barcode.writer import ImageWriter, SVGWriter
+from PIL import Image as PILImage
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+SYMBOLOGIES = set(barcode.PROVIDED_BARCODES)
+
+# Everything that changes the rendered bytes. width/height resize PNGs (pixels);
+# module_width/module_height are in mm as python-barcode takes them; text=False drops the caption.
+BarcodeSpec = namedtuple(
+    "BarcodeSpec",
+    ["value", "symbology", "fmt", "width", "height", "module_width", "module_height", "text"],
+    defaults=["code128", "png", None, None, None, None, True],
+)
+
+# Part of every cache key, so upgrading the renderers can't serve stale images under old ETags
+_RENDERER_VERSION = f"python-barcode {barcode.version}; Pillow {PIL.__version__}"
+
+
+def spec_digest(spec):
+    """Stable content address of the image spec renders to; used as ETag and disk file name"""
+    return hashlib.sha256(f"{_RENDERER_VERSION}|{tuple(spec)!r}".encode("utf-8")).hexdigest()
+
+
+def render(spec):
+    """Render spec to PNG or SVG bytes, entirely in memory"""
+    if spec.symbology not in SYMBOLOGIES:
+        raise ValueError(f"Unsupported symbology {spec.symbology}")
+    if spec.fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {spec.fmt}")
+
+    options = {"write_text": bool(spec.text)}
+    if spec.module_width:
+        options["module_width"] = spec.module_width
+    if spec.module_height:
+        options["module_height"] = spec.module_height
+
+    writer = ImageWriter() if spec.fmt == "png" else SVGWriter()
+    raw = io.BytesIO()
+    barcode.get_barcode_class(spec.symbology)(spec.value, writer=writer).write(raw, options)
+    if spec.fmt != "png" or not (spec.width or spec.height):
+        return raw.getvalue()
+
+    raw.seek(0)
+    image = PILImage.open(raw)
+    image = image.resize((spec.width or image.width, spec.height or image.height))
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def render_png(value, size=None):
+    """Code128 PNG for value; size=(w, h) resizes the result"""
+    width, height = size or (None, None)
+    return render(BarcodeSpec(value, width=width, height=height))
+
+
+class BarcodeCache:
+    """LRU of rendered images bounded by total bytes, safe to share between threads"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        return {"items": len(self._items), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+class BarcodeStore:
+    """Rendered barcodes by content address: memory LRU in front of a size-bounded disk cache.
+
+    Disk entries are files named by spec_digest(); their mtime is bumped on
+    every hit, and once the directory grows past BARCODE_DISK_CACHE_MAX_BYTES
+    the least recently used files are removed. Several processes can share
+    the directory since every write is an atomic rename.
+    """
+
+    def __init__(self, app=None):
+        self.memory = BarcodeCache()
+        self.directory = None
+        self.disk_max_bytes = 256 * 1024 * 1024
+        self.disk_hits = 0
+        self._disk_size = 0
+        self._disk_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.memory = BarcodeCache(app.config.get("BARCODE_CACHE_MAX_BYTES", self.memory.max_bytes))
+        self.directory = app.config.get("BARCODE_CACHE_DIR") or os.path.join(app.instance_path, "barcodes")
+        self.disk_max_bytes = app.config.get("BARCODE_DISK_CACHE_MAX_BYTES", self.disk_max_bytes)
+        if self.directory and self.disk_max_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+        app.extensions["barcodes"] = self
+
+    def _path(self, digest, fmt):
+        return os.path.join(self.directory, f"{digest}.{fmt}")
+
+    def _disk_enabled(self):
+        return bool(self.directory and self.disk_max_bytes)
+
+    def get(self, spec, digest=None):
+        digest = digest or spec_digest(spec)
+        data = self.memory.get(digest)
+        if data is not None or not self._disk_enabled():
+            return data
+        path = self._path(digest, spec.fmt)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        self.disk_hits += 1
+        self.memory.put(digest, data)
+        return data
+
+    def put(self, spec, data, digest=None):
+        digest = digest or spec_digest(spec)
+        self.memory.put(digest, data)
+        if not self._disk_enabled():
+            return
+        path = self._path(digest, spec.fmt)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(partial, "wb") as f:
+                f.write(data)
+            os.replace(partial, path)
+        except OSError as e:
+            print(f"Failed to cache barcode image {digest}: {e}")
+            return
+        with self._disk_lock:
+            self._disk_size += len(data)
+            if self._disk_size > self.disk_max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Down to 90% so a full cache doesn't rescan the directory on every put
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.endswith(".part")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        size = sum(entry.stat().st_size for entry in entries)
+        target = self.disk_max_bytes * 0.9
+        for entry in entries:
+            if size <= target:
+                break
+            try:
+                size -= entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                pass
+        self._disk_size = size
+
+    def get_or_render(self, spec):
+        """(bytes, digest) for spec, rendering and caching it on a miss"""
+        digest = spec_digest(spec)
+        data = self.get(spec, digest)
+        if data is None:
+            data = render(spec)
+            self.put(spec, data, digest)
+        return data, digest
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": {"bytes": self._disk_size, "max_bytes": self.disk_max_bytes, "hits": self.disk_hits},
+        }
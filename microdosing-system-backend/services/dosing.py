@@ -0,0 +1,662 @@
+# services/dosing.py
+"""Closed-loop dosing of one recipe material: tare -> coarse -> fine -> settle -> verify.
+
+DosingController is the state machine and does no I/O: it is fed readings
+and says which feed output should be on. DosingEngine runs one controller
+per scale on a background thread, reading weights from a source, driving an
+Actuator, and learning each material's in-flight time from finished runs.
+
+Compensation ("preact") is the weight in the air, worked out live from the
+feed outputs of the last in-flight time: it still lands after a feed stops,
+so coarse stops that much before the fine band and fine stops that much
+before the set point.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque, namedtuple
+from datetime import datetime, timezone
+
+FINISHED = ("done", "failed", "aborted")
+
+Reading = namedtuple("Reading", ["weight", "motion", "timestamp"])
+
+DosingParameters = namedtuple("DosingParameters", [
+    "set_point",
+    "tolerance",
+    "fine_band",  # switch coarse -> fine this far below the set point
+    "inflight_time",  # seconds from feeder to scale (learned)
+    "rate_window",  # seconds of readings the live feed rate is measured over
+    "stable_band",  # max spread of readings that still counts as settled
+    "settle_time",  # seconds the weight must stay within stable_band (and motion-free)
+    "max_settle_time",  # verify anyway after this long in settle
+    "timeout",  # whole run
+    "max_topups",
+    "min_jog",  # shortest fine pulse when topping up, seconds
+])
+
+
+class DosingError(ValueError):
+    """A dosing run could not be started"""
+
+
+class DosingController:
+    """State machine for one dosing; step() it with each reading, then apply .feed"""
+
+    def __init__(self, params, now, fine_rate=None):
+        self.params = params
+        self.state = "tare"
+        self.started_at = now
+        self.state_since = now
+        self.history = [["tare", now, None]]  # [state, entered, left]
+        self.message = None
+        self.tare_weight = None
+        self.net = None
+        self.rate = None  # live feed rate seen by the scale, weight per second
+        self.cutoff_weight = None  # net when fine feed first stopped
+        self.final_weight = None
+        self.inflight = None  # what landed after the first cutoff
+        self.observed_inflight_time = None  # coarse cutoff until the landing rate halved; folded into the profile
+        self.fine_rate = fine_rate  # measured during fine feed or a top-up; seeded from the profile
+        self.measured_fine_rate = None
+        self.topups = 0
+        self._coarse_cutoff = None  # (time, rate)
+        self._feeds = []  # [mode, started, stopped] of every feed output so far
+        self._jog = None  # (started, seconds, net before)
+        self._jog_until = None
+        self._last_timestamp = None
+        self._rates = deque()
+        self._window = deque()
+
+    @property
+    def feed(self):
+        return {"coarse": "coarse", "fine": "fine", "jog": "fine"}.get(self.state, "off")
+
+    @property
+    def finished(self):
+        return self.state in FINISHED
+
+    def _release_rate(self, mode):
+        if mode == "coarse":
+            # Steady coarse flow is what the scale sees; frozen at the cutoff, when the view starts to lag
+            if self._coarse_cutoff:
+                return self._coarse_cutoff[1] or 0.0
+            return self.rate or 0.0
+        return self.fine_rate or 0.0
+
+    def preact(self, now):
+        """Weight released within the last inflight_time, i.e. still in the air"""
+        since = now - self.params.inflight_time
+        in_air = 0.0
+        for mode, started, stopped in self._feeds:
+            seconds = (stopped if stopped is not None else now) - max(started, since)
+            if seconds > 0:
+                in_air += seconds * self._release_rate(mode)
+        return in_air
+
+    def _enter(self, state, now, message=None):
+        feed = self.feed
+        self.history[-1][2] = now
+        self.history.append([state, now, None])
+        self.state = state
+        self.state_since = now
+        self._window.clear()
+        if self.feed != feed:
+            if self._feeds and self._feeds[-1][2] is None:
+                self._feeds[-1][2] = now
+            if self.feed != "off":
+                self._feeds.append([self.feed, now, None])
+        if message:
+            self.message = message
+        if state in FINISHED:
+            self.history[-1][2] = now
+
+    def _settled(self, reading, value, now):
+        """True once value has stayed within stable_band, without motion, for settle_time"""
+        window = self._window
+        values = [v for _, v in window] + [value]
+        if reading.motion or max(values) - min(values) > self.params.stable_band:
+            window.clear()
+        window.append((now, value))
+        # Keep the newest sample that is at least settle_time old as the start of the window
+        while len(window) > 1 and now - window[1][0] >= self.params.settle_time:
+            window.popleft()
+        return now - window[0][0] >= self.params.settle_time
+
+    def _update_rate(self, net, now):
+        rates = self._rates
+        rates.append((now, net))
+        while len(rates) > 2 and now - rates[1][0] >= self.params.rate_window:
+            rates.popleft()
+        started, started_net = rates[0]
+        self.rate = max(net - started_net, 0.0) / (now - started) if now > started else None
+
+    def _watch_inflight(self, now):
+        """Time from the coarse cutoff until the scale sees the landing rate halve.
+
+        That is how long coarse material takes to fall; fine feed is far
+        slower, so the drop shows whether or not fine feed is still on.
+        The rate is a window average, so the drop happened half a window earlier.
+        """
+        if self.observed_inflight_time is not None or not self._coarse_cutoff:
+            return
+        cutoff_at, cutoff_rate = self._coarse_cutoff
+        if cutoff_rate and self.rate is not None and self.rate < cutoff_rate / 2:
+            self.observed_inflight_time = max(now - cutoff_at - self.params.rate_window / 2, 0.0)
+
+    def step(self, reading, now):
+        if self.finished:
+            return
+        p = self.params
+        if now - self.started_at > p.timeout:
+            self.fail(f"Timed out after {p.timeout:g}s in {self.state}", now)
+            return
+        if reading.timestamp == self._last_timestamp:
+            return  # same sample as last tick
+        self._last_timestamp = reading.timestamp
+
+        if self.state == "tare":
+            if self._settled(reading, reading.weight, now):
+                self.tare_weight = reading.weight
+                self.net = 0.0
+                self._enter("coarse", now)
+            return
+
+        net = self.net = reading.weight - self.tare_weight
+        self._update_rate(net, now)
+        self._watch_inflight(now)
+        if self.state == "coarse":
+            if net + self.preact(now) >= p.set_point - p.fine_band:
+                self._coarse_cutoff = (now, self.rate)
+                self._enter("fine", now)
+        elif self.state == "fine":
+            # Until inflight_time has passed the scale still sees coarse material landing
+            if self.rate and now - self.state_since >= p.inflight_time + p.rate_window:
+                self.fine_rate = self.measured_fine_rate = self.rate
+            if net + self.preact(now) >= p.set_point:
+                self.cutoff_weight = net
+                self._enter("settle", now)
+        elif self.state == "jog":
+            if now >= self._jog_until or net + self.preact(now) >= p.set_point:
+                self._enter("settle", now)
+        elif self.state == "settle":
+            settled = self._settled(reading, net, now)
+            if settled or now - self.state_since > p.max_settle_time:
+                self.final_weight = net
+                self._enter("verify", now, None if settled else "Verified without a stable reading")
+        elif self.state == "verify":
+            self._verify(now)
+
+    def _verify(self, now):
+        p = self.params
+        if self.inflight is None and self.cutoff_weight is not None:
+            self.inflight = self.final_weight - self.cutoff_weight
+        if self._jog is not None:
+            # All of a pulse has landed by now: that is the cleanest fine rate we get
+            started, seconds, before = self._jog
+            if self.final_weight > before:
+                self.fine_rate = self.measured_fine_rate = (self.final_weight - before) / seconds
+            self._jog = None
+        error = self.final_weight - p.set_point
+        if abs(error) <= p.tolerance:
+            self._enter("done", now)
+        elif error > 0:
+            self.fail(f"Overdosed by {error:.3f}", now)
+        elif self.topups >= p.max_topups:
+            self.fail(f"Short by {-error:.3f} after {self.topups} top-ups", now)
+        else:
+            # Everything released during a pulse lands eventually, so size it by the fine rate alone
+            self.topups += 1
+            pulse = max(-error / self.fine_rate if self.fine_rate else p.min_jog, p.min_jog)
+            self._jog = (now, pulse, self.final_weight)
+            self._jog_until = now + pulse
+            self._rates.clear()
+            self.rate = None
+            self._enter("jog", now)
+
+    def fail(self, message, now):
+        if not self.finished:
+            self._enter("failed", now, message)
+
+    def abort(self, now, message="Aborted"):
+        if not self.finished:
+            self._enter("aborted", now, message)
+
+
+# ---------------------------------------------------------------------- #
+# Outputs
+# ---------------------------------------------------------------------- #
+class Actuator:
+    """Where a run's outputs go. set_feed() is called on every change of feed mode
+    and always with "off" when the run ends, whatever the reason."""
+
+    def tare(self):
+        pass
+
+    def set_feed(self, mode):
+        raise NotImplementedError
+
+
+class ManualActuator(Actuator):
+    """No outputs: the operator feeds by hand following the state pushed to the dosing screen"""
+
+    def set_feed(self, mode):
+        pass
+
+
+class ModbusCoilActuator(Actuator):
+    """Feeder valves on Modbus coils; coarse opens both coils, fine only fine_coil"""
+
+    def __init__(self, coarse_coil, fine_coil, tare_coil=None, host=None, port=None, slave=None):
+        self.coarse_coil = coarse_coil
+        self.fine_coil = fine_coil
+        self.tare_coil = tare_coil
+        self.host = host
+        self.port = port
+        self.slave = slave
+
+    def _write(self, address, value):
+        from extensions import modbus
+
+        modbus.pool(self.host, self.port, self.slave).execute(
+            lambda client, slave: client.write_coil(address, value, slave=slave)
+        )
+
+    def tare(self):
+        if self.tare_coil is not None:
+            self._write(self.tare_coil, True)
+            self._write(self.tare_coil, False)
+
+    def set_feed(self, mode):
+        # Coarse coil first, so stepping down from coarse to fine closes it before anything else changes
+        self._write(self.coarse_coil, mode == "coarse")
+        self._write(self.fine_coil, mode in ("coarse", "fine"))
+
+
+def build_actuator(config):
+    """Actuator from a DOSING_ACTUATORS entry ({"type": "modbus", "coarse_coil": 0, ...})"""
+    config = dict(config or {})
+    kind = config.pop("type", "manual")
+    if kind == "manual":
+        return ManualActuator()
+    if kind == "modbus":
+        return ModbusCoilActuator(**config)
+    raise DosingError(f"Unknown actuator type {kind}")
+
+
+# ---------------------------------------------------------------------- #
+# Weight sources
+# ---------------------------------------------------------------------- #
+class AcquisitionSource:
+    """Latest sample of a scale from the acquisition thread"""
+
+    def __init__(self, scale_id):
+        self.scale_id = scale_id
+
+    def read(self):
+        from extensions import acquisition
+
+        cached = acquisition.latest(self.scale_id)
+        if cached is None:
+            return None
+        sample = cached[0]
+        motion = bool((sample.values.get("alarms") or {}).get("motion"))
+        return Reading(sample.values["net_weight"], motion, sample.timestamp)
+
+
+class SimulatedPlant(Actuator):
+    """A feeder dropping material onto a scale, for running the engine without hardware.
+
+    Material leaves the feeder at coarse_rate or fine_rate (units/s) and lands
+    inflight_delay seconds later, which is what the engine has to learn. The
+    scale reads motion for motion_time after anything lands and adds
+    gaussian noise to every reading. It is both the weight source and the
+    actuator of a run.
+    """
+
+    def __init__(self, coarse_rate=2.0, fine_rate=0.2, inflight_delay=0.25, noise=0.001,
+                 motion_time=0.15, start_weight=0.0, seed=None, clock=time.monotonic):
+        self.coarse_rate = coarse_rate
+        self.fine_rate = fine_rate
+        self.inflight_delay = inflight_delay
+        self.noise = noise
+        self.motion_time = motion_time
+        self.weight = start_weight
+        self.mode = "off"
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._falling = deque()  # (lands_at, amount)
+        self._last = clock()
+        self._last_landed = None
+        self._lock = threading.Lock()
+
+    def _advance(self, now):
+        rate = {"coarse": self.coarse_rate, "fine": self.fine_rate}.get(self.mode, 0.0)
+        if rate and now > self._last:
+            self._falling.append((self._last + self.inflight_delay, rate * (now - self._last)))
+        self._last = now
+        while self._falling and self._falling[0][0] <= now:
+            landed_at, amount = self._falling.popleft()
+            self.weight += amount
+            self._last_landed = landed_at
+
+    def set_feed(self, mode):
+        with self._lock:
+            self._advance(self.clock())
+            self.mode = mode
+
+    def read(self):
+        with self._lock:
+            now = self.clock()
+            self._advance(now)
+            motion = self._last_landed is not None and now - self._last_landed < self.motion_time
+            weight = self.weight + self._random.gauss(0.0, self.noise)
+        return Reading(round(weight, 4), motion, time.time())
+
+
+# ---------------------------------------------------------------------- #
+# Engine
+# ---------------------------------------------------------------------- #
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class DosingRun:
+    def __init__(self, recipe_material_id, material_id, scale_id, simulated, controller, source, actuator):
+        self.run_id = uuid.uuid4().hex
+        self.recipe_material_id = recipe_material_id
+        self.material_id = material_id
+        self.scale_id = scale_id
+        self.simulated = simulated
+        self.controller = controller
+        self.source = source
+        self.actuator = actuator
+        self.started_at = time.time()
+        self.abort_requested = None
+        self.thread = None
+
+    @property
+    def profile_scale_id(self):
+        # Simulated runs learn into their own profile so they can't skew a real scale's preact
+        return 0 if self.simulated else self.scale_id
+
+    def to_dict(self):
+        c = self.controller
+        p = c.params
+        offset = self.started_at - c.started_at  # controller times are monotonic
+        return {
+            "run_id": self.run_id,
+            "recipe_material_id": self.recipe_material_id,
+            "material_id": self.material_id,
+            "scale_id": self.scale_id,
+            "simulated": self.simulated,
+            "state": c.state,
+            "feed": c.feed,
+            "message": c.message,
+            "set_point": p.set_point,
+            "tolerance": p.tolerance,
+            "inflight_time": round(p.inflight_time, 4),
+            "net_weight": round(c.net, 4) if c.net is not None else None,
+            "rate": round(c.rate, 4) if c.rate is not None else None,
+            "cutoff_weight": round(c.cutoff_weight, 4) if c.cutoff_weight is not None else None,
+            "final_weight": round(c.final_weight, 4) if c.final_weight is not None else None,
+            "inflight": round(c.inflight, 4) if c.inflight is not None else None,
+            "topups": c.topups,
+            "started_at": _iso(self.started_at),
+            "cycle_seconds": round((c.history[-1][2] or time.monotonic()) - c.started_at, 3),
+            "phases": [
+                {
+                    "state": state,
+                    "started_at": _iso(entered + offset),
+                    "seconds": round(left - entered, 3) if left is not None else None,
+                }
+                for state, entered, left in c.history
+            ],
+        }
+
+
+class DosingEngine:
+    """Runs dosing controllers on background threads, at most one per scale.
+
+    Each tick reads the scale, steps the controller and writes the feed
+    output when it changes. A finished run writes actual/status back to
+    its RecipeMaterial and folds the observed in-flight into the
+    material's DosingProfile, so the next run cuts off at the right
+    weight and spends less time in settle and top-ups.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tick = 0.02
+        self.stale_after = 1.0
+        self.fine_fraction = 0.1
+        self.default_tolerance = 0.1
+        self.default_inflight_time = 0.2
+        self.max_inflight_time = 5.0
+        self.learning_gain = 0.3
+        self.rate_window = 0.2
+        self.stable_band = 0.01
+        self.settle_time = 0.5
+        self.max_settle_time = 10.0
+        self.timeout = 300.0
+        self.max_topups = 3
+        self.min_jog = 0.1
+        self.actuators = {}
+        self.simulator = {}
+        self.history_size = 100
+        self.runs = OrderedDict()  # run_id -> DosingRun, newest last
+        self._active = {}  # scale_id -> DosingRun
+        self._listeners = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.tick = app.config.get("DOSING_TICK", self.tick)
+        self.stale_after = app.config.get("SCALE_STALE_AFTER", self.stale_after)
+        self.fine_fraction = app.config.get("DOSING_FINE_FRACTION", self.fine_fraction)
+        self.default_tolerance = app.config.get("DOSING_DEFAULT_TOLERANCE", self.default_tolerance)
+        self.default_inflight_time = app.config.get("DOSING_DEFAULT_INFLIGHT_TIME", self.default_inflight_time)
+        self.learning_gain = app.config.get("DOSING_LEARNING_GAIN", self.learning_gain)
+        self.rate_window = app.config.get("DOSING_RATE_WINDOW", self.rate_window)
+        self.stable_band = app.config.get("DOSING_STABLE_BAND", self.stable_band)
+        self.settle_time = app.config.get("DOSING_SETTLE_TIME", self.settle_time)
+        self.max_settle_time = app.config.get("DOSING_MAX_SETTLE_TIME", self.max_settle_time)
+        self.timeout = app.config.get("DOSING_TIMEOUT", self.timeout)
+        self.max_topups = app.config.get("DOSING_MAX_TOPUPS", self.max_topups)
+        self.min_jog = app.config.get("DOSING_MIN_JOG", self.min_jog)
+        actuators = app.config.get("DOSING_ACTUATORS") or {}
+        if isinstance(actuators, str):
+            actuators = json.loads(actuators)
+        self.actuators = {int(scale_id): config for scale_id, config in actuators.items()}
+        simulator = app.config.get("DOSING_SIMULATOR") or {}
+        self.simulator = json.loads(simulator) if isinstance(simulator, str) else simulator
+        app.extensions["dosing"] = self
+
+    def add_listener(self, callback):
+        """callback(run) runs on the run's thread whenever its state changes"""
+        self._listeners.append(callback)
+
+    def _notify(self, run):
+        for callback in self._listeners:
+            try:
+                callback(run)
+            except Exception as e:
+                print(f"Dosing listener failed: {e}")
+
+    # ------------------------------------------------------------------ #
+    # Runs
+    # ------------------------------------------------------------------ #
+    def parameters(self, recipe_material, profile):
+        """Tolerance is the line's RecipeMaterial.tolerance, else DOSING_DEFAULT_TOLERANCE
+
+        Neither margin column is an allowance: RecipeMaterial.margin is the
+        last capture's deviation and Material.margin the stock headroom.
+        """
+        set_point = float(recipe_material.set_point or 0)
+        if set_point <= 0:
+            raise DosingError("Recipe material has no set point")
+        tolerance = recipe_material.tolerance
+        return DosingParameters(
+            set_point=set_point,
+            tolerance=float(tolerance) if tolerance is not None else self.default_tolerance,
+            fine_band=set_point * self.fine_fraction,
+            inflight_time=profile.inflight_time if profile is not None else self.default_inflight_time,
+            rate_window=self.rate_window,
+            stable_band=self.stable_band,
+            settle_time=self.settle_time,
+            max_settle_time=self.max_settle_time,
+            timeout=self.timeout,
+            max_topups=self.max_topups,
+            min_jog=self.min_jog,
+        )
+
+    def start(self, recipe_material_id, scale_id=None, simulate=False):
+        """Start dosing a recipe material; raises DosingError if it can't"""
+        from extensions import db, acquisition
+        from models.recipe import RecipeMaterial
+        from models.dosing import DosingProfile
+
+        recipe_material = db.session.get(RecipeMaterial, recipe_material_id)
+        if recipe_material is None:
+            raise LookupError(f"Recipe material with ID {recipe_material_id} not found")
+        scale_id = scale_id if scale_id is not None else acquisition.default_scale_id
+
+        if simulate:
+            plant = SimulatedPlant(**self.simulator)
+            source, actuator = plant, plant
+        else:
+            if scale_id not in acquisition.channels:
+                raise DosingError(f"Unknown scale {scale_id}")
+            if not acquisition.running:
+                raise DosingError("Scale acquisition is not running")
+            source, actuator = AcquisitionSource(scale_id), build_actuator(self.actuators.get(scale_id))
+
+        profile_scale_id = 0 if simulate else scale_id
+        profile = db.session.get(DosingProfile, (recipe_material.material_id, profile_scale_id))
+        params = self.parameters(recipe_material, profile)
+        controller = DosingController(params, time.monotonic(), profile.fine_rate if profile is not None else None)
+        run = DosingRun(recipe_material_id, recipe_material.material_id, scale_id, simulate,
+                        controller, source, actuator)
+
+        with self._lock:
+            if not simulate:
+                busy = self._active.get(scale_id)
+                if busy is not None:
+                    raise DosingError(f"Scale {scale_id} is busy with run {busy.run_id}")
+                self._active[scale_id] = run
+            self.runs[run.run_id] = run
+            while len(self.runs) > self.history_size:
+                oldest = next(iter(self.runs.values()))
+                if not oldest.controller.finished:
+                    break
+                self.runs.popitem(last=False)
+
+        if not simulate:
+            recipe_material.status = "in progress"
+            db.session.commit()
+        run.thread = threading.Thread(target=self._run, args=(run,), name=f"dosing-{run.run_id[:8]}", daemon=True)
+        run.thread.start()
+        return run
+
+    def get(self, run_id):
+        return self.runs.get(run_id)
+
+    def abort(self, run_id):
+        run = self.runs.get(run_id)
+        if run is not None and not run.controller.finished:
+            run.abort_requested = "Aborted by operator"
+        return run
+
+    def stats(self):
+        with self._lock:
+            runs = list(self.runs.values())
+        finished = [r for r in runs if r.controller.finished]
+        cycles = [r.controller.history[-1][2] - r.controller.started_at for r in finished
+                  if r.controller.state == "done"]
+        return {
+            "active": [r.run_id for r in runs if not r.controller.finished],
+            "finished": len(finished),
+            "done": len(cycles),
+            "mean_cycle_seconds": round(sum(cycles) / len(cycles), 3) if cycles else None,
+        }
+
+    def _run(self, run):
+        controller = run.controller
+        feed = None
+        state = controller.state
+        try:
+            run.actuator.tare()
+            while not controller.finished:
+                now = time.monotonic()
+                if run.abort_requested:
+                    controller.abort(now, run.abort_requested)
+                else:
+                    reading = run.source.read()
+                    if reading is None or time.time() - reading.timestamp > self.stale_after:
+                        controller.fail("No fresh reading from the scale", now)
+                    else:
+                        controller.step(reading, now)
+                if controller.feed != feed:
+                    feed = controller.feed
+                    run.actuator.set_feed(feed)
+                if controller.state != state:
+                    state = controller.state
+                    self._notify(run)
+                if not controller.finished:
+                    time.sleep(self.tick)
+        except Exception as e:
+            controller.fail(f"Dosing error: {e}", time.monotonic())
+        finally:
+            try:
+                run.actuator.set_feed("off")
+            except Exception as e:
+                print(f"Could not switch feed off after run {run.run_id}: {e}")
+            with self._lock:
+                if self._active.get(run.scale_id) is run:
+                    self._active.pop(run.scale_id)
+            try:
+                with self.app.app_context():
+                    self._record(run)
+            except Exception as e:
+                print(f"Could not record dosing run {run.run_id}: {e}")
+            if controller.state != state:
+                self._notify(run)
+
+    def _record(self, run):
+        from extensions import db
+        from models.recipe import RecipeMaterial
+        from models.dosing import DosingProfile
+
+        controller = run.controller
+        if not run.simulated:
+            recipe_material = db.session.get(RecipeMaterial, run.recipe_material_id)
+            if recipe_material is not None:
+                if controller.final_weight is not None:
+                    recipe_material.actual = round(controller.final_weight, 2)
+                recipe_material.status = "created" if controller.state == "done" else "pending"
+
+        if controller.observed_inflight_time is not None or controller.measured_fine_rate:
+            key = (run.material_id, run.profile_scale_id)
+            profile = db.session.get(DosingProfile, key)
+            if profile is None:
+                profile = DosingProfile(material_id=key[0], scale_id=key[1],
+                                        inflight_time=controller.params.inflight_time, samples=0)
+                db.session.add(profile)
+            # Exponential average, starting as a plain mean so the first runs converge quickly
+            gain = max(self.learning_gain, 1.0 / (profile.samples + 1))
+            if controller.observed_inflight_time is not None:
+                observed = min(controller.observed_inflight_time, self.max_inflight_time)
+                profile.inflight_time += gain * (observed - profile.inflight_time)
+            if controller.measured_fine_rate:
+                if profile.fine_rate is None:
+                    profile.fine_rate = controller.measured_fine_rate
+                else:
+                    profile.fine_rate += gain * (controller.measured_fine_rate - profile.fine_rate)
+            if controller.inflight is not None:
+                profile.preact = controller.inflight
+            profile.samples += 1
+        db.session.commit()
@@ -0,0 +1,89 @@
+# services/downsampling.py
+"""Reduce long (time, value) series to a plottable number of points."""
+
+
+def _area(a, b, c):
+    return abs((a[0] - c[0]) * (b[1] - a[1]) - (a[0] - b[0]) * (c[1] - a[1])) / 2.0
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets over an in-memory list of (t, v) points"""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = points[0]
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg = (
+            sum(p[0] for p in next_bucket) / len(next_bucket),
+            sum(p[1] for p in next_bucket) / len(next_bucket),
+        )
+
+        best = max(points[start:end], key=lambda p: _area(a, p, avg))
+        sampled.append(best)
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def minmax(points, buckets):
+    """count/min/max/avg of (t, v) points per equal-width time bucket, like GET /weights?method=minmax"""
+    if buckets < 1:
+        raise ValueError("buckets must be at least 1")
+    if not points:
+        return []
+    start, end = points[0][0], points[-1][0]
+    width = max((end - start) / buckets, 0.001)
+    grouped = {}
+    for t, v in points:
+        grouped.setdefault(min(int((t - start) // width), buckets - 1), []).append(v)
+    return [
+        {"t": start + b * width, "count": len(values), "min": min(values), "max": max(values),
+         "avg": sum(values) / len(values)}
+        for b, values in sorted(grouped.items())
+    ]
+
+
+def lttb_stream(rows, bucket_of, bucket_averages):
+    """LTTB over a time-ordered row iterator without holding the rows in memory.
+
+    bucket_of(t) maps a point to its bucket number and bucket_averages maps
+    bucket number -> (avg_t, avg_v), typically from one GROUP BY query. The
+    first and last points are always kept.
+    """
+    ordered = sorted(bucket_averages)
+    next_bucket = {b: ordered[i + 1] for i, b in enumerate(ordered[:-1])}
+
+    sampled = []
+    current = None
+    best = best_area = None
+    last = None
+    for point in rows:
+        last = point
+        if not sampled:
+            sampled.append(point)
+            continue
+        bucket = bucket_of(point[0])
+        if bucket != current:
+            if best is not None:
+                sampled.append(best)
+            current = bucket
+            best = best_area = None
+        target = bucket_averages.get(next_bucket.get(bucket), point)
+        area = _area(sampled[-1], point, target)
+        if best_area is None or area > best_area:
+            best, best_area = point, area
+
+    if best is not None and best is not last:
+        sampled.append(best)
+    if last is not None and last is not sampled[-1]:
+        sampled.append(last)
+    return sampled
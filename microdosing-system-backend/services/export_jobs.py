@@ -0,0 +1,217 @@
+# services/export_jobs.py
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+
+# statement() returns a select of the sheet's columns (minus the image column),
+# with the barcode value at barcode_column
+ExportSpec = namedtuple("ExportSpec", ["title", "headers", "barcode_column", "statement", "download_name"])
+
+
+def run_export(spec, out=None, progress=None):
+    """Write spec's workbook to out (path or file, default a new BytesIO) and return out"""
+    from extensions import db, barcode_exporter
+
+    rows = db.session.execute(spec.statement().execution_options(yield_per=barcode_exporter.chunk_size))
+    return barcode_exporter.write_workbook(
+        spec.title, spec.headers, rows, spec.barcode_column, progress=progress, out=out
+    )
+
+
+class ExportJobQueue:
+    """Runs exports on a few local worker threads, tracked in the export_job table.
+
+    Workers claim queued jobs with a conditional UPDATE, so several processes
+    can share the table without a broker. Finished files are kept in
+    EXPORT_RESULT_DIR for EXPORT_RESULT_TTL seconds, then deleted along with
+    their job row.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.specs = {}
+        self.enabled = False
+        self.workers = 2
+        self.result_dir = None
+        self.result_ttl = 3600
+        self.poll_interval = 2.0
+        self.cleanup_interval = 300.0
+        self.stale_after = 600.0
+        self._threads = []
+        self._wakeup = threading.Condition()
+        self._listeners = []
+        self._last_cleanup = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("EXPORT_JOBS_ENABLED", True)
+        self.workers = app.config.get("EXPORT_JOB_WORKERS", self.workers)
+        self.result_dir = app.config.get("EXPORT_RESULT_DIR") or os.path.join(app.instance_path, "exports")
+        self.result_ttl = app.config.get("EXPORT_RESULT_TTL", self.result_ttl)
+        self.poll_interval = app.config.get("EXPORT_JOB_POLL_INTERVAL", self.poll_interval)
+        self.cleanup_interval = app.config.get("EXPORT_CLEANUP_INTERVAL", self.cleanup_interval)
+        self.stale_after = app.config.get("EXPORT_JOB_STALE_AFTER", self.stale_after)
+        os.makedirs(self.result_dir, exist_ok=True)
+        app.extensions["export_jobs"] = self
+        if self.enabled:
+            self.start()
+
+    def register(self, kind, spec):
+        self.specs[kind] = spec
+
+    def add_listener(self, callback):
+        """callback(job_dict) on every progress update and when a job finishes"""
+        self._listeners.append(callback)
+
+    def start(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for i in range(len(self._threads), self.workers):
+            thread = threading.Thread(target=self._run, name=f"export-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # ------------------------------------------------------------------ #
+    # Submitting
+    # ------------------------------------------------------------------ #
+    def submit(self, kind):
+        from extensions import db
+        from models.export_job import ExportJob
+
+        if kind not in self.specs:
+            raise ValueError(f"Unknown export {kind}")
+        job = ExportJob(kind=kind, file_name=self.specs[kind].download_name)
+        db.session.add(job)
+        db.session.commit()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    def result_file(self, job):
+        if job.status != "done" or not job.result_path or not os.path.exists(job.result_path):
+            return None
+        return job.result_path
+
+    def stats(self):
+        from extensions import db
+        from models.export_job import ExportJob
+
+        counts = dict(db.session.query(ExportJob.status, func.count()).group_by(ExportJob.status).all())
+        return {"workers": sum(t.is_alive() for t in self._threads), "jobs": counts}
+
+    # ------------------------------------------------------------------ #
+    # Workers
+    # ------------------------------------------------------------------ #
+    def _run(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    if time.monotonic() - self._last_cleanup >= self.cleanup_interval:
+                        self._last_cleanup = time.monotonic()
+                        self.cleanup()
+                    job_id = self._claim()
+                    if job_id:
+                        self._execute(job_id)
+                        continue
+                except Exception as e:
+                    from extensions import db
+                    db.session.rollback()
+                    print(f"Export worker error: {e}")
+            with self._wakeup:
+                self._wakeup.wait(self.poll_interval)
+
+    def _claim(self):
+        from extensions import db
+        from models.export_job import ExportJob
+
+        candidates = db.session.execute(
+            select(ExportJob.job_id).where(ExportJob.status == "queued").order_by(ExportJob.created_at).limit(5)
+        ).scalars().all()
+        for job_id in candidates:
+            # Only one worker (in any process) gets rowcount 1 for a given job
+            claimed = db.session.execute(
+                update(ExportJob)
+                .where(ExportJob.job_id == job_id, ExportJob.status == "queued")
+                .values(status="running", started_at=datetime.utcnow(), updated_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id
+        db.session.commit()
+        return None
+
+    def _set(self, job_id, **values):
+        """Update the job and tell listeners, outside the session: it may be streaming the export"""
+        from extensions import db
+        from models.export_job import ExportJob
+
+        values["updated_at"] = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(update(ExportJob).where(ExportJob.job_id == job_id).values(**values))
+            row = conn.execute(select(ExportJob.__table__).where(ExportJob.job_id == job_id)).first()
+        if row is None or not self._listeners:
+            return
+        payload = ExportJob(**row._mapping).to_dict()
+        for callback in self._listeners:
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"Export job listener failed: {e}")
+
+    def _execute(self, job_id):
+        from extensions import db
+        from models.export_job import ExportJob
+
+        job = db.session.get(ExportJob, job_id)
+        spec = self.specs.get(job.kind)
+        path = os.path.join(self.result_dir, f"{job_id}.xlsx")
+        try:
+            if spec is None:
+                raise ValueError(f"Unknown export {job.kind}")
+            total = db.session.execute(select(func.count()).select_from(spec.statement().subquery())).scalar()
+            self._set(job_id, total=total)
+
+            partial = path + ".part"
+            run_export(spec, out=partial, progress=lambda processed: self._set(job_id, processed=processed))
+            os.replace(partial, path)
+            db.session.rollback()  # end the export's read transaction
+            now = datetime.utcnow()
+            self._set(job_id, status="done", processed=total, result_path=path, size_bytes=os.path.getsize(path),
+                      finished_at=now, expires_at=now + timedelta(seconds=self.result_ttl))
+        except Exception as e:
+            db.session.rollback()
+            print(f"Export job {job_id} failed: {e}")
+            now = datetime.utcnow()
+            self._set(job_id, status="failed", error=str(e), finished_at=now,
+                      expires_at=now + timedelta(seconds=self.result_ttl))
+            for leftover in (path, path + ".part"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    # ------------------------------------------------------------------ #
+    # Result store cleanup
+    # ------------------------------------------------------------------ #
+    def cleanup(self):
+        """Drop expired results and fail jobs whose worker stopped heartbeating"""
+        from extensions import db
+        from models.export_job import ExportJob
+
+        now = datetime.utcnow()
+        db.session.execute(
+            update(ExportJob)
+            .where(ExportJob.status == "running",
+                   ExportJob.updated_at < now - timedelta(seconds=self.stale_after))
+            .values(status="failed", error="Export was interrupted", finished_at=now,
+                    expires_at=now + timedelta(seconds=self.result_ttl))
+        )
+        expired = db.session.query(ExportJob).filter(ExportJob.expires_at < now).all()
+        for job in expired:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+            db.session.delete(job)
+        db.session.commit()
+        return len(expired)
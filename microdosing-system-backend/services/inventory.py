@@ -0,0 +1,132 @@
+# services/inventory.py
+"""Material stock ledger: every change to Material.current_quantity goes through a MaterialTransaction."""
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import case, func, insert, select, update
+
+Posting = namedtuple("Posting", ["material_id", "transaction_type", "quantity", "description"], defaults=[None])
+
+TRANSACTION_TYPES = ("addition", "removal")
+
+
+class InventoryError(ValueError):
+    """A posting was rejected; nothing from its batch was applied"""
+
+
+class InsufficientStock(InventoryError):
+    pass
+
+
+def parse_posting(data):
+    """Posting from a request dict ({"material_id", "transaction_type", "quantity", "description"})"""
+    try:
+        material_id = int(data["material_id"])
+        quantity = Decimal(str(data["quantity"]))
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        raise InventoryError("material_id and a numeric quantity are required")
+    if data.get("transaction_type") not in TRANSACTION_TYPES:
+        raise InventoryError(f"transaction_type must be one of {', '.join(TRANSACTION_TYPES)}")
+    if not quantity.is_finite() or quantity <= 0:
+        raise InventoryError("quantity must be positive")
+    return Posting(material_id, data["transaction_type"], quantity, data.get("description"))
+
+
+def signed(posting):
+    return posting.quantity if posting.transaction_type == "addition" else -posting.quantity
+
+
+def post_transactions(session, postings, allow_negative=True):
+    """Write ledger rows and move each material's balance by their net quantity.
+
+    Runs in the caller's transaction. Balances change with
+    ``current_quantity = current_quantity + :delta`` so concurrent postings
+    only take row locks on the materials they touch and never overwrite
+    each other; materials are updated in id order so two batches can't
+    deadlock. Raises InventoryError (caller rolls back) for an unknown
+    material or, with allow_negative=False, a balance that would go below zero.
+    Returns the new transaction ids in posting order.
+    """
+    from models.material import Material, MaterialTransaction
+
+    postings = list(postings)
+    if not postings:
+        return []
+
+    deltas = {}
+    for posting in postings:
+        deltas[posting.material_id] = deltas.get(posting.material_id, Decimal(0)) + signed(posting)
+
+    for material_id in sorted(deltas):
+        statement = (
+            update(Material)
+            .where(Material.material_id == material_id)
+            .values(current_quantity=Material.current_quantity + deltas[material_id])
+        )
+        if not allow_negative and deltas[material_id] < 0:
+            statement = statement.where(Material.current_quantity + deltas[material_id] >= 0)
+        if session.execute(statement.execution_options(synchronize_session=False)).rowcount != 1:
+            exists = session.execute(select(Material.material_id).where(Material.material_id == material_id)).first()
+            if not exists:
+                raise InventoryError(f"Material {material_id} not found")
+            raise InsufficientStock(f"Insufficient stock for material {material_id}")
+
+    ids = []
+    for posting in postings:
+        result = session.execute(insert(MaterialTransaction).values(
+            material_id=posting.material_id,
+            transaction_type=posting.transaction_type,
+            quantity=posting.quantity,
+            description=posting.description,
+        ))
+        ids.append(result.inserted_primary_key[0])
+    return ids
+
+
+def _ledger_sum():
+    from models.material import MaterialTransaction
+
+    return func.coalesce(func.sum(case(
+        (MaterialTransaction.transaction_type == "addition", MaterialTransaction.quantity),
+        else_=-MaterialTransaction.quantity,
+    )), 0)
+
+
+def ledger_balances():
+    """select of (material_id, current_quantity, ledger_quantity) for every material, in one aggregate"""
+    from models.material import Material, MaterialTransaction
+
+    return (
+        select(Material.material_id, Material.current_quantity, _ledger_sum().label("ledger_quantity"))
+        .outerjoin(MaterialTransaction, MaterialTransaction.material_id == Material.material_id)
+        .group_by(Material.material_id, Material.current_quantity)
+    )
+
+
+def reconcile(session, apply=False):
+    """Materials whose balance differs from the sum of their ledger; apply=True resets them to the ledger"""
+    from models.material import Material, MaterialTransaction
+
+    drift = [
+        {
+            "material_id": row.material_id,
+            "current_quantity": str(row.current_quantity),
+            "ledger_quantity": str(row.ledger_quantity),
+            "difference": str(Decimal(str(row.current_quantity)) - Decimal(str(row.ledger_quantity))),
+        }
+        for row in session.execute(ledger_balances())
+        if Decimal(str(row.current_quantity)) != Decimal(str(row.ledger_quantity))
+    ]
+    if apply and drift:
+        # Recompute inside the UPDATE rather than writing the values read above, which may already be stale
+        ledger = (
+            select(_ledger_sum())
+            .where(MaterialTransaction.material_id == Material.material_id)
+            .scalar_subquery()
+        )
+        session.execute(
+            update(Material)
+            .where(Material.material_id.in_([d["material_id"] for d in drift]))
+            .values(current_quantity=ledger)
+            .execution_options(synchronize_session=False)
+        )
+    return drift
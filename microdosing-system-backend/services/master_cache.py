@@ -0,0 +1,182 @@
+# services/master_cache.py
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, func, insert, null, select, update
+
+# Changing the key entity also invalidates these (ON DELETE CASCADE happens behind the ORM's back)
+CASCADES = {"Recipe": {"RecipeMaterial"}}
+
+_MISSING = object()
+
+
+def table_validators(session, models):
+    """{class name: (change counter, row count, max(updated_at))} for the models, in one query.
+
+    The counter (master_data_version) moves with every ORM write, even two in
+    the same second; count and max(updated_at) still catch raw SQL writes.
+    """
+    from models.master_data import MasterDataVersion
+
+    columns = []
+    for model in models:
+        table = model.__table__
+        columns.append(
+            select(MasterDataVersion.version).where(MasterDataVersion.name == model.__name__).scalar_subquery()
+        )
+        columns.append(select(func.count()).select_from(table).scalar_subquery())
+        columns.append(select(func.max(table.c.updated_at)).scalar_subquery() if "updated_at" in table.c else null())
+    values = session.execute(select(*columns)).one()
+    return {model.__name__: tuple(values[i * 3:i * 3 + 3]) for i, model in enumerate(models)}
+
+
+class MasterDataCache:
+    """Read-through cache of serialized master data (recipes, materials, buckets).
+
+    Every entity type has a version number that is part of each cache key,
+    so bumping it orphans all entries built from that type; orphans age
+    out of the LRU. Versions are bumped:
+
+    * after a commit in this process that inserted, updated or deleted
+      rows of the type (ORM flushes and bulk UPDATE/DELETE statements);
+    * when a periodic check (table_validators) shows a change made by
+      another process.
+
+    Those writes also bump the type's row in master_data_version inside
+    their own transaction, so other processes see every committed change,
+    including several within one second of updated_at.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_entries = 512
+        self.revalidate_interval = 5.0
+        self.entities = {}  # class name -> model
+        self.versions = {}
+        self._validators = {}  # class name -> (checked_at, table_validators() entry)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from extensions import db
+
+        self.enabled = app.config.get("MASTER_CACHE_ENABLED", self.enabled)
+        self.max_entries = app.config.get("MASTER_CACHE_MAX_ENTRIES", self.max_entries)
+        self.revalidate_interval = app.config.get("MASTER_CACHE_REVALIDATE_INTERVAL", self.revalidate_interval)
+        app.extensions["master_cache"] = self
+
+        event.listen(db.session, "after_flush", self._after_flush)
+        event.listen(db.session, "do_orm_execute", self._do_orm_execute)
+        event.listen(db.session, "after_commit", self._after_commit)
+        event.listen(db.session, "after_rollback", self._after_rollback)
+
+    def register(self, *models):
+        for model in models:
+            self.entities[model.__name__] = model
+            self.versions.setdefault(model.__name__, 0)
+
+    # ------------------------------------------------------------------ #
+    # Reads
+    # ------------------------------------------------------------------ #
+    def get_or_load(self, key, entities, loader):
+        """Cached loader() result for key, built from rows of the named entity types"""
+        if not self.enabled:
+            return loader()
+        for name in entities:
+            self._revalidate(name)
+        full_key = (key, tuple(self.versions[name] for name in entities))
+        with self._lock:
+            value = self._entries.get(full_key, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = loader()
+        with self._lock:
+            self._entries[full_key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _revalidate(self, name):
+        if not self.revalidate_interval:
+            return
+        now = time.monotonic()
+        checked = self._validators.get(name)
+        if checked and now - checked[0] < self.revalidate_interval:
+            return
+
+        from extensions import db
+
+        validator = table_validators(db.session, [self.entities[name]])[name]
+        if checked and checked[1] != validator:
+            self.bump({name})
+        self._validators[name] = (now, validator)
+
+    def bump(self, names):
+        with self._lock:
+            for name in names:
+                for affected in {name} | CASCADES.get(name, set()):
+                    if affected in self.versions:
+                        self.versions[affected] += 1
+                        self.invalidations += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "invalidations": self.invalidations,
+            "versions": dict(self.versions),
+        }
+
+    # ------------------------------------------------------------------ #
+    # Session events
+    # ------------------------------------------------------------------ #
+    def _touch(self, session, name):
+        if name not in self.entities:
+            return
+        touched = session.info.setdefault("master_cache_touched", set())
+        if name in touched:
+            return
+        touched.add(name)
+        # Once per type and transaction; committed or rolled back together with the write
+        from models.master_data import MasterDataVersion
+
+        connection = session.connection()
+        for affected in {name} | CASCADES.get(name, set()):
+            bumped = connection.execute(
+                update(MasterDataVersion.__table__)
+                .where(MasterDataVersion.name == affected)
+                .values(version=MasterDataVersion.version + 1)
+            )
+            if not bumped.rowcount:
+                connection.execute(insert(MasterDataVersion.__table__).values(name=affected, version=1))
+
+    def _after_flush(self, session, flush_context):
+        names = {type(instance).__name__ for instance in list(session.new) + list(session.dirty) + list(session.deleted)}
+        for name in names:
+            self._touch(session, name)
+
+    def _do_orm_execute(self, orm_execute_state):
+        state = orm_execute_state
+        if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper:
+            self._touch(state.session, state.bind_mapper.class_.__name__)
+
+    def _after_commit(self, session):
+        touched = session.info.pop("master_cache_touched", None)
+        if touched:
+            self.bump(touched)
+
+    def _after_rollback(self, session):
+        session.info.pop("master_cache_touched", None)
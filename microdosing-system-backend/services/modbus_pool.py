@@ -0,0 +1,264 @@
+# services/modbus_pool.py
+import select
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from pymodbus.client import ModbusTcpClient
+
+
+class ModbusUnavailable(Exception):
+    """Raised when no connection to a device can be established."""
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class _PooledConnection:
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+
+
+class ModbusConnectionPool:
+    """Long-lived connections to one (host, port, slave) device."""
+
+    def __init__(self, host, port, slave, size=2, timeout=1.0,
+                 backoff_initial=0.5, backoff_max=30.0, idle_check=5.0, latency_window=1000):
+        self.host = host
+        self.port = port
+        self.slave = slave
+        self.size = size
+        self.timeout = timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.idle_check = idle_check
+
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._backoff = 0.0
+        self._next_attempt = 0.0
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self.connects = 0
+        self.reuses = 0
+        self.errors = 0
+        self.discarded = 0
+
+    # ------------------------------------------------------------------ #
+    # Connection lifecycle
+    # ------------------------------------------------------------------ #
+    def _connect(self):
+        # Backoff state is shared by every thread opening a connection; connect() itself runs unlocked
+        with self._cond:
+            now = time.monotonic()
+            if now < self._next_attempt:
+                raise ModbusUnavailable(
+                    f"{self.host}:{self.port} backing off for {self._next_attempt - now:.1f}s"
+                )
+
+        client = ModbusTcpClient(self.host, port=self.port, timeout=self.timeout, retries=0)
+        if not client.connect():
+            client.close()
+            with self._cond:
+                self._backoff = min(self.backoff_max, (self._backoff * 2) or self.backoff_initial)
+                self._next_attempt = time.monotonic() + self._backoff
+            with self._stats_lock:
+                self.errors += 1
+            raise ModbusUnavailable(f"Could not connect to {self.host}:{self.port}")
+
+        with self._cond:
+            self._backoff = 0.0
+            self._next_attempt = 0.0
+        with self._stats_lock:
+            self.connects += 1
+        return _PooledConnection(client)
+
+    def _is_half_open(self, conn):
+        """A socket the peer has closed polls readable and returns no data."""
+        sock = conn.client.socket
+        if sock is None:
+            return True
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            if not readable:
+                return False
+            # Either EOF or unsolicited bytes; neither is safe to reuse
+            return True
+        except (OSError, ValueError):
+            return True
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    idle_for = time.monotonic() - conn.last_used
+                    if idle_for >= self.idle_check and self._is_half_open(conn):
+                        self._close(conn)
+                        continue
+                    with self._stats_lock:
+                        self.reuses += 1
+                    return conn
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                if not self._cond.wait(timeout=self.timeout):
+                    raise ModbusUnavailable(f"Pool for {self.host}:{self.port} exhausted")
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn):
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _close(self, conn):
+        """Drop a connection; caller must hold self._cond."""
+        try:
+            conn.client.close()
+        except Exception:
+            pass
+        self._open -= 1
+        with self._stats_lock:
+            self.discarded += 1
+        self._cond.notify()
+
+    def _discard(self, conn):
+        with self._cond:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn.client
+        except Exception:
+            self._discard(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def execute(self, fn):
+        """Run fn(client, slave) on a pooled connection.
+
+        A failed call is retried once on a fresh connection, which covers the
+        common case of a socket the indicator silently dropped.
+        """
+        for attempt in range(2):
+            started = time.perf_counter()
+            try:
+                with self.connection() as client:
+                    result = fn(client, self.slave)
+                    if hasattr(result, "isError") and result.isError():
+                        raise IOError(f"Modbus error response: {result}")
+                self.record_latency(time.perf_counter() - started)
+                return result
+            except ModbusUnavailable:
+                raise
+            except Exception:
+                with self._stats_lock:
+                    self.errors += 1
+                if attempt == 1:
+                    raise
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop())
+
+    # ------------------------------------------------------------------ #
+    # Stats
+    # ------------------------------------------------------------------ #
+    def record_latency(self, seconds):
+        with self._stats_lock:
+            self._latencies.append(seconds * 1000.0)
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            data = {
+                "host": self.host,
+                "port": self.port,
+                "slave": self.slave,
+                "connects": self.connects,
+                "reuses": self.reuses,
+                "errors": self.errors,
+                "discarded": self.discarded,
+            }
+        with self._cond:
+            data["open"] = self._open
+            data["idle"] = len(self._idle)
+            data["backoff_seconds"] = self._backoff
+        data["latency_ms"] = {
+            "samples": len(latencies),
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p99": _percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        }
+        return data
+
+
+class ModbusConnectionManager:
+    """Process-wide registry of connection pools keyed by (host, port, slave)."""
+
+    def __init__(self, app=None):
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.default_host = "localhost"
+        self.default_port = 502
+        self.default_slave = 1
+        self.default_model = "default"
+        self.pool_options = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_host = app.config.get("SCALE_HOST", self.default_host)
+        self.default_port = app.config.get("SCALE_PORT", self.default_port)
+        self.default_slave = app.config.get("SCALE_SLAVE", self.default_slave)
+        self.default_model = app.config.get("SCALE_MODEL", self.default_model)
+        self.pool_options = {
+            "size": app.config.get("MODBUS_POOL_SIZE", 2),
+            "timeout": app.config.get("MODBUS_TIMEOUT", 1.0),
+            "backoff_max": app.config.get("MODBUS_BACKOFF_MAX", 30.0),
+            "idle_check": app.config.get("MODBUS_IDLE_CHECK", 5.0),
+        }
+        app.extensions["modbus"] = self
+
+    def pool(self, host=None, port=None, slave=None):
+        key = (
+            host or self.default_host,
+            int(port or self.default_port),
+            int(slave if slave is not None else self.default_slave),
+        )
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = ModbusConnectionPool(*key, **self.pool_options)
+                    self._pools[key] = pool
+        return pool
+
+    def stats(self):
+        return [pool.stats() for pool in list(self._pools.values())]
+
+    def close_all(self):
+        for pool in list(self._pools.values()):
+            pool.close_all()
@@ -0,0 +1,155 @@
+# services/mrp.py
+"""Material requirements of production orders: batch_size x recipe set points, against stock."""
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select
+
+# Material.unit_of_measure -> kilograms per unit
+UNITS = {"Kilogram (kg)": 1.0, "Gram (g)": 1e-3, "Milligram (mg)": 1e-6}
+_ALIASES = {"kg": "Kilogram (kg)", "g": "Gram (g)", "mg": "Milligram (mg)"}
+
+
+def unit_factor(unit):
+    """Kilograms per unit of "kg"/"g"/"mg" or a Material.unit_of_measure value; ValueError otherwise"""
+    factor = UNITS.get(_ALIASES.get(unit, unit))
+    if factor is None:
+        raise ValueError(f"Unknown unit {unit!r}")
+    return factor
+
+
+def _first_per_group(groups, mask):
+    """{group: index of its first True in mask}; groups is sorted"""
+    hits = np.flatnonzero(mask)
+    found, first = np.unique(groups[hits], return_index=True)
+    return dict(zip(found.tolist(), hits[first].tolist()))
+
+
+def plan(session, statuses=("planned",), date_from=None, date_to=None, material_ids=None,
+         set_point_unit="kg"):
+    """Explode production orders into material demand and project stock per scheduled date.
+
+    Demand of an order line is batch_size x set_point, with set points in
+    set_point_unit (the scales' unit), converted to each material's own
+    unit_of_measure. Three queries (orders, their recipe lines, the
+    materials); the explosion and the per-material, per-date sums run in
+    NumPy. Materials come back in material_id order; projected stock on a
+    date is current_quantity minus everything required up to that date.
+    """
+    from models.production import ProductionOrder
+    from models.recipe import RecipeMaterial
+    from models.material import Material
+
+    set_point_factor = unit_factor(set_point_unit)
+    orders_query = select(ProductionOrder.recipe_id, ProductionOrder.batch_size, ProductionOrder.scheduled_date)
+    if statuses:
+        orders_query = orders_query.where(ProductionOrder.status.in_(statuses))
+    if date_from is not None:
+        orders_query = orders_query.where(ProductionOrder.scheduled_date >= date_from)
+    if date_to is not None:
+        orders_query = orders_query.where(ProductionOrder.scheduled_date <= date_to)
+
+    lines_query = (
+        select(RecipeMaterial.recipe_id, RecipeMaterial.material_id, RecipeMaterial.set_point)
+        .where(
+            RecipeMaterial.recipe_id.in_(orders_query.with_only_columns(ProductionOrder.recipe_id).distinct()),
+            RecipeMaterial.set_point.isnot(None),
+        )
+        .order_by(RecipeMaterial.recipe_id, RecipeMaterial.recipe_material_id)
+    )
+    if material_ids:
+        lines_query = lines_query.where(RecipeMaterial.material_id.in_(material_ids))
+
+    orders = session.execute(orders_query).all()
+    lines = session.execute(lines_query).all() if orders else []
+    result = {"orders": len(orders), "order_lines": 0, "set_point_unit": set_point_unit, "materials": []}
+    if not lines:
+        return result
+
+    materials = session.execute(
+        select(Material.material_id, Material.title, Material.unit_of_measure,
+               Material.current_quantity, Material.minimum_quantity)
+        .where(Material.material_id.in_(lines_query.with_only_columns(RecipeMaterial.material_id).distinct()))
+        .order_by(Material.material_id)
+    ).all()
+
+    n = len(orders)
+    order_recipe = np.fromiter((o.recipe_id for o in orders), np.int64, n)
+    batch_size = np.fromiter((o.batch_size for o in orders), np.float64, n)
+    order_day = np.fromiter((o.scheduled_date.toordinal() for o in orders), np.int64, n)
+
+    line_recipe = np.fromiter((l.recipe_id for l in lines), np.int64, len(lines))
+    line_material = np.fromiter((l.material_id for l in lines), np.int64, len(lines))
+    line_set_point = np.fromiter((l.set_point for l in lines), np.float64, len(lines))
+
+    m = len(materials)
+    material_id = np.fromiter((row.material_id for row in materials), np.int64, m)
+    # Set point units -> the material's unit; an unknown unit is taken as the set point unit
+    to_material_unit = np.fromiter(
+        (set_point_factor / UNITS.get(row.unit_of_measure, set_point_factor) for row in materials), np.float64, m)
+    current = np.fromiter((row.current_quantity for row in materials), np.float64, m)
+    minimum = np.fromiter((row.minimum_quantity for row in materials), np.float64, m)
+
+    # Explode: each order repeated once per line of its recipe (lines are sorted by recipe)
+    recipes, first_line, lines_per_recipe = np.unique(line_recipe, return_index=True, return_counts=True)
+    slot = np.minimum(np.searchsorted(recipes, order_recipe), len(recipes) - 1)
+    has_lines = recipes[slot] == order_recipe
+    counts = np.where(has_lines, lines_per_recipe[slot], 0)
+    order_of = np.repeat(np.arange(n), counts)
+    within = np.arange(order_of.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    line_of = np.repeat(first_line[slot], counts) + within
+
+    material_of = np.searchsorted(material_id, line_material[line_of])
+    demand = batch_size[order_of] * line_set_point[line_of] * to_material_unit[material_of]
+    day_of = order_day[order_of]
+
+    # Sum per (material, day); keys sort by material, then day
+    first_day = int(day_of.min())
+    span = int(day_of.max()) - first_day + 1
+    keys, group_of = np.unique(material_of * span + (day_of - first_day), return_inverse=True)
+    per_day = np.bincount(group_of.ravel(), weights=demand)
+    group_material = keys // span
+    group_day = keys % span + first_day
+
+    # Running total within each material
+    starts = np.flatnonzero(np.r_[True, group_material[1:] != group_material[:-1]])
+    running = np.cumsum(per_day)
+    running -= np.repeat(running[starts] - per_day[starts], np.diff(np.r_[starts, keys.size]))
+    projected = current[group_material] - running
+    short_on = _first_per_group(group_material, projected < 0)
+    below_minimum_on = _first_per_group(group_material, projected < minimum[group_material])
+
+    required = np.bincount(material_of, weights=demand, minlength=m)
+    line_count = np.bincount(material_of, minlength=m)
+    required_kg = required * np.fromiter((UNITS.get(row.unit_of_measure, set_point_factor) for row in materials),
+                                         np.float64, m)
+    bounds = dict(zip(group_material[starts].tolist(), zip(starts.tolist(), np.r_[starts[1:], keys.size].tolist())))
+
+    result["order_lines"] = int(order_of.size)
+    for i, row in enumerate(materials):
+        if i not in bounds:
+            continue
+        start, end = bounds[i]
+        final = float(current[i] - required[i])
+        result["materials"].append({
+            "material_id": row.material_id,
+            "title": row.title,
+            "unit_of_measure": row.unit_of_measure,
+            "current_quantity": float(current[i]),
+            "minimum_quantity": float(minimum[i]),
+            "order_lines": int(line_count[i]),
+            "required": round(float(required[i]), 4),
+            "required_kg": round(float(required_kg[i]), 6),
+            "projected": round(final, 4),
+            "shortfall": round(max(-final, 0.0), 4),  # missing to cover demand
+            "below_minimum": round(max(float(minimum[i]) - final, 0.0), 4),  # missing to also keep minimum_quantity
+            "short_on": date.fromordinal(int(group_day[short_on[i]])).isoformat() if i in short_on else None,
+            "below_minimum_on": (date.fromordinal(int(group_day[below_minimum_on[i]])).isoformat()
+                                 if i in below_minimum_on else None),
+            "by_date": [
+                {"date": date.fromordinal(int(day)).isoformat(), "required": round(float(q), 4),
+                 "projected": round(float(p), 4)}
+                for day, q, p in zip(group_day[start:end], per_day[start:end], projected[start:end])
+            ],
+        })
+    return result
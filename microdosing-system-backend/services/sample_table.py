@@ -0,0 +1,225 @@
+# services/sample_table.py
+import fcntl
+import math
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+MAGIC = b"SCLTBL01"
+HEADER_SIZE = 64
+RECORD_SIZE = 64
+# magic, slots, record size, leader pid, leader heartbeat (epoch seconds), reload requests
+_HEADER = struct.Struct("<8sIIIdQ")
+_HEARTBEAT_OFFSET = struct.calcsize("<8sIII")
+_RELOAD_OFFSET = _HEARTBEAT_OFFSET + 8
+_SEQ = struct.Struct("<I")
+# After the 4-byte sequence: scale id, timestamp, gross, tare, net, alarm bits, breaker state, reads, failures
+_PAYLOAD = struct.Struct("<iddddBBxxII")
+
+ALARMS = ("overrange", "underrange", "motion", "negative")
+BREAKER_STATES = ("closed", "open", "half-open")
+
+TableRecord = namedtuple("TableRecord", ["seq", "scale_id", "timestamp", "values", "breaker", "reads", "failures"])
+
+
+def _number(value):
+    return float("nan") if value is None else float(value)
+
+
+def _value(number):
+    return None if math.isnan(number) else number
+
+
+class SampleTable:
+    """Latest sample of every scale in a memory-mapped file shared by all worker processes.
+
+    Fixed layout: a 64-byte header, then one 64-byte record per slot. Only the
+    process holding the flock on <path>.lock writes (the acquisition leader);
+    every other process reads records straight out of the mapping.
+
+    Each record is guarded by a seqlock: the writer makes the sequence odd,
+    writes the payload, then makes it even again. A reader retries until it
+    sees the same even sequence before and after copying the payload, so it
+    never returns a half-written sample and never blocks the writer.
+    """
+
+    def __init__(self, path, slots=256):
+        self.path = path
+        self.slots = slots
+        self.size = HEADER_SIZE + slots * RECORD_SIZE
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < self.size:
+            os.ftruncate(self._fd, self.size)
+        self._map = mmap.mmap(self._fd, self.size)
+        self._lock_fd = None
+        self._slot_of = {}  # scale_id -> slot; the writer's assignment, or the reader's cache
+        self.retries = 0  # reads that raced a write
+
+    def _header_matches(self):
+        """The file was laid out by a leader with this table's slot count and record size"""
+        magic, slots, record_size, _, _, _ = _HEADER.unpack_from(self._map, 0)
+        return magic == MAGIC and slots == self.slots and record_size == RECORD_SIZE
+
+    @property
+    def is_leader(self):
+        return self._lock_fd is not None
+
+    # ------------------------------------------------------------------ #
+    # Election
+    # ------------------------------------------------------------------ #
+    def try_lead(self):
+        """Take the writer lock if no live process holds it; the OS drops it when the holder dies"""
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        if self._header_matches():
+            reloads = self.reload_requests()
+        else:
+            # New file, or left by a table of another layout: start from empty slots
+            self._map[HEADER_SIZE:self.size] = bytes(self.size - HEADER_SIZE)
+            reloads = 0
+        _HEADER.pack_into(self._map, 0, MAGIC, self.slots, RECORD_SIZE, os.getpid(), time.time(), reloads)
+        self._slot_of = {}
+        for slot in range(self.slots):
+            scale_id = self._read_slot(slot)
+            if scale_id:
+                self._slot_of[scale_id] = slot
+        return True
+
+    def release(self):
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def leader(self):
+        """(pid, heartbeat age in seconds) of the current writer, or None before the first one
+        (or if the writer uses a different SCALE_TABLE_SLOTS)"""
+        if not self._header_matches():
+            return None
+        _, _, _, pid, heartbeat, _ = _HEADER.unpack_from(self._map, 0)
+        return pid, time.time() - heartbeat
+
+    def heartbeat(self):
+        struct.pack_into("<d", self._map, _HEARTBEAT_OFFSET, time.time())
+
+    def request_reload(self):
+        """Ask the leader to re-read the scale registry (any process may call this)"""
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 8, _RELOAD_OFFSET)
+        try:
+            struct.pack_into("<Q", self._map, _RELOAD_OFFSET, self.reload_requests() + 1)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 8, _RELOAD_OFFSET)
+
+    def reload_requests(self):
+        return struct.unpack_from("<Q", self._map, _RELOAD_OFFSET)[0]
+
+    # ------------------------------------------------------------------ #
+    # Writer (leader only)
+    # ------------------------------------------------------------------ #
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * RECORD_SIZE
+
+    def _write(self, slot, payload):
+        offset = self._offset(slot)
+        writing = ((_SEQ.unpack_from(self._map, offset)[0] + 1) & 0xFFFFFFFF) | 1
+        _SEQ.pack_into(self._map, offset, writing)
+        _PAYLOAD.pack_into(self._map, offset + 4, *payload)
+        _SEQ.pack_into(self._map, offset, (writing + 1) & 0xFFFFFFFF)
+
+    def assign(self, scale_ids):
+        """Give each scale a slot, keeping existing ones, and free the slots of removed scales"""
+        wanted = set(scale_ids)
+        for scale_id, slot in list(self._slot_of.items()):
+            if scale_id not in wanted:
+                self._write(slot, (0, 0.0, math.nan, math.nan, math.nan, 0, 0, 0, 0))
+                del self._slot_of[scale_id]
+        used = set(self._slot_of.values())
+        free = (slot for slot in range(self.slots) if slot not in used)
+        for scale_id in scale_ids:
+            if scale_id not in self._slot_of:
+                slot = next(free, None)
+                if slot is None:
+                    raise ValueError(f"Sample table {self.path} is full ({self.slots} slots)")
+                self._write(slot, (scale_id, 0.0, math.nan, math.nan, math.nan, 0, 0, 0, 0))
+                self._slot_of[scale_id] = slot
+
+    def write(self, scale_id, timestamp, values, breaker="closed", reads=0, failures=0):
+        slot = self._slot_of.get(scale_id)
+        if slot is None:
+            return
+        values = values or {}
+        alarms = values.get("alarms") or {}
+        bits = sum(1 << i for i, name in enumerate(ALARMS) if alarms.get(name))
+        self._write(slot, (
+            scale_id, timestamp or 0.0,
+            _number(values.get("gross_weight")), _number(values.get("tare_weight")), _number(values.get("net_weight")),
+            bits, BREAKER_STATES.index(breaker), reads, failures,
+        ))
+
+    # ------------------------------------------------------------------ #
+    # Readers
+    # ------------------------------------------------------------------ #
+    def _read_slot(self, slot):
+        return struct.unpack_from("<i", self._map, self._offset(slot) + 4)[0]
+
+    def _read(self, slot, attempts=100):
+        offset = self._offset(slot)
+        for attempt in range(attempts):
+            before = _SEQ.unpack_from(self._map, offset)[0]
+            if not before & 1:
+                payload = _PAYLOAD.unpack_from(self._map, offset + 4)
+                if _SEQ.unpack_from(self._map, offset)[0] == before:
+                    return before, payload
+            self.retries += 1
+            if attempt > 10:
+                time.sleep(0)  # the writer was descheduled mid-record; let it finish
+        return None
+
+    def read(self, scale_id):
+        """TableRecord of a scale, or None if it has no slot or no sample yet"""
+        if not self._header_matches():
+            return None
+        for _ in range(2):
+            slot = self._slot_of.get(scale_id)
+            if slot is None:
+                slot = self._find(scale_id)
+                if slot is None:
+                    return None
+            result = self._read(slot)
+            if result is None:
+                return None
+            seq, (slot_scale, timestamp, gross, tare, net, bits, breaker, reads, failures) = result
+            if slot_scale != scale_id:
+                self._slot_of.pop(scale_id, None)  # the leader reassigned slots; look again
+                continue
+            if not timestamp:
+                return None
+            values = {
+                "gross_weight": _value(gross),
+                "tare_weight": _value(tare),
+                "net_weight": _value(net),
+                "alarms": {name: bool(bits & (1 << i)) for i, name in enumerate(ALARMS)},
+            }
+            return TableRecord(seq, scale_id, timestamp, values, BREAKER_STATES[breaker], reads, failures)
+        return None
+
+    def _find(self, scale_id):
+        for slot in range(self.slots):
+            if self._read_slot(slot) == scale_id:
+                self._slot_of[scale_id] = slot
+                return slot
+        return None
+
+    def close(self):
+        self.release()
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,610 @@
+# services/scale_acquisition.py
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from pymodbus.client import AsyncModbusTcpClient
+
+
+ScaleSample = namedtuple("ScaleSample", ["scale_id", "timestamp", "values"])
+
+
+def default_table_path(database_uri):
+    """Sample table file for a database: deployments on one host only share it if they share the database"""
+    digest = hashlib.sha256((database_uri or "").encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"microdosing-scale-table-{digest}")
+
+
+class SampleRing:
+    """Fixed-size ring of samples for a single writer and any number of readers.
+
+    The writer fills the slot first and only then advances the counter, so a
+    reader that sees a counter value always sees a complete sample. Slot and
+    integer assignment are atomic under the GIL, so no lock is needed.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._count = 0
+
+    def push(self, sample):
+        self._slots[self._count % self.capacity] = sample
+        self._count += 1
+
+    def latest(self):
+        count = self._count
+        if count == 0:
+            return None
+        return self._slots[(count - 1) % self.capacity]
+
+    def recent(self, n):
+        count = self._count
+        n = min(n, count, self.capacity)
+        return [self._slots[i % self.capacity] for i in range(count - n, count)]
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+
+class CircuitBreaker:
+    """Stops polling a device that keeps failing, so a dead indicator costs nothing.
+
+    Closed, every poll goes through. After `threshold` consecutive failures it
+    opens for `reset_after` seconds; then one probe is let through
+    (half-open), which closes it on success or re-opens it for twice as long,
+    up to `reset_max`.
+    """
+
+    def __init__(self, threshold=3, reset_after=5.0, reset_max=60.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.reset_max = reset_max
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.trips = 0
+        self._open_for = reset_after
+        self._retry_at = 0.0
+
+    def allow(self, now):
+        if self.state == "open":
+            if now < self._retry_at:
+                return False
+            self.state = "half-open"
+        return True
+
+    def success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._open_for = self.reset_after
+
+    def failure(self, now):
+        self.consecutive_failures += 1
+        if self.state == "half-open":
+            self._open_for = min(self._open_for * 2, self.reset_max)
+            self._open(now)
+        elif self.state == "closed" and self.consecutive_failures >= self.threshold:
+            self._open(now)
+
+    def _open(self, now):
+        self.state = "open"
+        self.trips += 1
+        self._retry_at = now + self._open_for
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "retry_in": round(max(self._retry_at - time.monotonic(), 0.0), 1) if self.state == "open" else None,
+        }
+
+
+class _DeviceError(Exception):
+    """The indicator answered with a Modbus exception; the connection itself is fine"""
+
+
+class _Channel:
+    def __init__(self, scale, capacity, breaker):
+        self.scale_id = int(scale["id"])
+        self.ring = SampleRing(capacity)
+        self.breaker = breaker
+        self.modbus = None  # AsyncModbusTcpClient, owned by the acquisition loop
+        self.reset = False
+        self.reads = 0
+        self.failures = 0
+        self.skipped = 0  # polls not sent because the breaker was open
+        self.last_error = None
+        self.last_error_message = None
+        self.latency_ms = None
+        self.configure(scale)
+
+    def configure(self, scale):
+        from models.scale import ScaleClient
+
+        endpoint = (scale.get("host"), scale.get("port"), scale.get("slave"))
+        if getattr(self, "endpoint", endpoint) != endpoint:
+            self.reset = True  # reconnect on the next poll
+        self.endpoint = endpoint
+        self.name = scale.get("name")
+        self.station = scale.get("station")
+        self.model = scale.get("model")
+        self.interval = scale["poll_interval"]
+        self.timeout = scale["timeout"]
+        # Blocking client for on-demand reads from request threads
+        self.client = ScaleClient(*endpoint, self.model)
+
+
+class ScaleAcquisition:
+    """Polls every registered scale concurrently from one asyncio event loop.
+
+    Scales come from the scale table (models.scale.Scale), or from the SCALES
+    config while the table is empty. Each scale has its own poll task, poll
+    rate, read timeout and circuit breaker, so a slow or dead indicator only
+    delays its own samples. Changes to the registry are applied by reload()
+    in this process and by a periodic re-read (SCALE_REGISTRY_REFRESH) in
+    the others.
+
+    With SCALE_TABLE_PATH set, worker processes share one SampleTable: the
+    worker that wins its lock is the leader and the only one talking to the
+    scales; it publishes every sample there. The others follow: latest()
+    reads the table directly and a follower thread mirrors new samples into
+    the local ring and listeners. A follower takes over when the leader
+    exits.
+    """
+
+    def __init__(self, app=None):
+        self.channels = {}
+        self.interval = 0.2
+        self.timeout = 1.0
+        self.stale_after = 1.0
+        self.capacity = 256
+        self.registry_refresh = 60.0
+        self.breaker_options = {}
+        self.source = None  # "registry" or "config"
+        self.enabled = False
+        self.table_path = None
+        self.table_slots = 256
+        self.follow_interval = 0.02
+        self.election_interval = 2.0
+        self.table = None
+        self.role = None  # "leader" or "follower" when sharing a sample table
+        self._app = None
+        self._thread = None
+        self._follower = None
+        self._halt = threading.Event()
+        self._loop = None
+        self._stopping = None
+        self._tasks = {}  # scale_id -> (channel, poll task), loop thread only
+        self._lock = threading.Lock()
+        self._listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from models.scale import load_register_maps
+
+        self._app = app
+        self.interval = app.config.get("SCALE_POLL_INTERVAL", self.interval)
+        self.timeout = app.config.get("MODBUS_TIMEOUT", self.timeout)
+        self.stale_after = app.config.get("SCALE_STALE_AFTER", self.stale_after)
+        self.capacity = app.config.get("SCALE_RING_SIZE", self.capacity)
+        self.registry_refresh = app.config.get("SCALE_REGISTRY_REFRESH", self.registry_refresh)
+        self.breaker_options = {
+            "threshold": app.config.get("SCALE_BREAKER_THRESHOLD", 3),
+            "reset_after": app.config.get("SCALE_BREAKER_RESET", 5.0),
+            "reset_max": app.config.get("SCALE_BREAKER_RESET_MAX", 60.0),
+        }
+        self.enabled = app.config.get("SCALE_ACQUISITION_ENABLED", False)
+        table_path = app.config.get("SCALE_TABLE_PATH")
+        if table_path is None:
+            table_path = default_table_path(app.config.get("SQLALCHEMY_DATABASE_URI"))
+        self.table_path = table_path or None
+        self.table_slots = app.config.get("SCALE_TABLE_SLOTS", self.table_slots)
+        self.follow_interval = app.config.get("SCALE_TABLE_FOLLOW_INTERVAL", self.follow_interval)
+        self.election_interval = app.config.get("SCALE_TABLE_ELECTION_INTERVAL", self.election_interval)
+
+        load_register_maps(app.config.get("SCALE_REGISTER_MAPS"))
+        self.configure(self._load_scales())
+
+        app.extensions["scale_acquisition"] = self
+        if self.enabled:
+            self.start()
+
+    # ------------------------------------------------------------------ #
+    # Registry
+    # ------------------------------------------------------------------ #
+    def _load_scales(self):
+        """Enabled scales from the registry, falling back to SCALES; needs an app context"""
+        from extensions import db
+        from models.scale import Scale
+
+        try:
+            scales = [scale.to_config() for scale in Scale.query.filter_by(enabled=True).order_by(Scale.scale_id)]
+        except Exception as e:
+            db.session.rollback()
+            print(f"Scale registry unavailable, using SCALES: {e}")
+            scales = []
+        if scales:
+            self.source = "registry"
+            return scales
+
+        self.source = "config"
+        scales = self._app.config.get("SCALES") or [{"id": 1}]
+        if isinstance(scales, str):
+            scales = json.loads(scales)
+        return scales
+
+    def configure(self, scales):
+        """Replace the set of polled scales, keeping the buffered samples of those that stay"""
+        with self._lock:
+            channels = {}
+            for scale in scales:
+                scale = dict(scale)
+                scale["poll_interval"] = scale.get("poll_interval") or self.interval
+                scale["timeout"] = scale.get("timeout") or self.timeout
+                channel = self.channels.get(int(scale["id"]))
+                if channel is None:
+                    channel = _Channel(scale, self.capacity, CircuitBreaker(**self.breaker_options))
+                else:
+                    channel.configure(scale)
+                channels[channel.scale_id] = channel
+            self.channels = dict(sorted(channels.items()))
+            if self.table is not None and self.table.is_leader:
+                self.table.assign(list(self.channels))
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._sync_tasks)
+            except RuntimeError:
+                pass  # loop is shutting down
+
+    def reload(self):
+        """Re-read the registry now, e.g. after it was edited; needs an app context"""
+        self.configure(self._load_scales())
+        if self.table is not None and not self.table.is_leader:
+            self.table.request_reload()
+
+    # ------------------------------------------------------------------ #
+    # Lifecycle
+    # ------------------------------------------------------------------ #
+    @property
+    def running(self):
+        return any(thread is not None and thread.is_alive() for thread in (self._thread, self._follower))
+
+    @property
+    def default_scale_id(self):
+        return next(iter(self.channels), None)
+
+    def add_listener(self, callback):
+        """callback(sample) runs on the acquisition loop after each good read; keep it short."""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self.running:
+            return
+        self._halt.clear()
+        if self.table_path and not self._lead():
+            self._follower = threading.Thread(target=self._follow, name="scale-table-follower", daemon=True)
+            self._follower.start()
+            return
+        self._start_polling()
+
+    def _lead(self):
+        """Try to become the process that polls the scales and writes the sample table"""
+        from services.sample_table import SampleTable
+
+        if self.table is None:
+            self.table = SampleTable(self.table_path, self.table_slots)
+        if not self.table.try_lead():
+            self.role = "follower"
+            return False
+        self.role = "leader"
+        with self._lock:
+            self.table.assign(list(self.channels))
+        return True
+
+    def _start_polling(self):
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="scale-acquisition", daemon=True)
+        self._thread.start()
+        ready.wait(2.0)
+
+    def stop(self, timeout=2.0):
+        self._halt.set()
+        if self._follower is not None:
+            self._follower.join(timeout)
+            self._follower = None
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._stopping.set)
+            except RuntimeError:
+                pass  # loop already closed
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        if self.table is not None:
+            self.table.release()  # let another worker take over
+
+    def _run(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._main(ready))
+        finally:
+            self._loop = None
+            loop.close()
+
+    async def _main(self, ready):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._sync_tasks()
+        background = []
+        if self.registry_refresh:
+            background.append(asyncio.ensure_future(self._refresh_registry()))
+        if self.table is not None and self.table.is_leader:
+            background.append(asyncio.ensure_future(self._lead_table()))
+        ready.set()
+
+        await self._stopping.wait()
+
+        tasks = [task for _, task in self._tasks.values()] + background
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = {}
+
+    def _sync_tasks(self):
+        """Start a poll task per new scale and cancel those of removed ones (loop thread only)"""
+        channels = self.channels
+        for scale_id, (channel, task) in list(self._tasks.items()):
+            if channels.get(scale_id) is not channel:
+                task.cancel()
+                del self._tasks[scale_id]
+        for scale_id, channel in channels.items():
+            if scale_id not in self._tasks:
+                self._tasks[scale_id] = (channel, asyncio.ensure_future(self._poll_forever(channel)))
+
+    async def _refresh_registry(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.registry_refresh)
+            try:
+                # Blocking DB read; keep it off the loop so polling doesn't pause
+                scales = await loop.run_in_executor(None, self._load_in_context)
+                self.configure(scales)
+            except Exception as e:
+                print(f"Scale registry refresh failed: {e}")
+
+    async def _lead_table(self):
+        """Keep the leader heartbeat fresh and apply registry reloads requested by followers"""
+        loop = asyncio.get_running_loop()
+        reloads = self.table.reload_requests()
+        while True:
+            self.table.heartbeat()
+            if self.table.reload_requests() != reloads:
+                reloads = self.table.reload_requests()
+                try:
+                    self.configure(await loop.run_in_executor(None, self._load_in_context))
+                except Exception as e:
+                    print(f"Scale registry reload failed: {e}")
+            await asyncio.sleep(0.5)
+
+    def _follow(self):
+        """Mirror the leader's samples into the local rings and listeners; take over if it goes"""
+        pushed = {}  # scale_id -> timestamp of the last mirrored sample
+        next_election = time.monotonic() + self.election_interval
+        while not self._halt.is_set():
+            for channel in list(self.channels.values()):
+                record = self.table.read(channel.scale_id)
+                if record is None:
+                    continue
+                channel.reads = record.reads
+                channel.failures = record.failures
+                channel.breaker.state = record.breaker
+                if pushed.get(channel.scale_id) != record.timestamp:
+                    pushed[channel.scale_id] = record.timestamp
+                    self._publish(channel, ScaleSample(channel.scale_id, record.timestamp, record.values))
+
+            if time.monotonic() >= next_election:
+                next_election = time.monotonic() + self.election_interval
+                if self._lead():
+                    print(f"Scale acquisition: process {os.getpid()} took over polling")
+                    self._start_polling()
+                    return
+            self._halt.wait(self.follow_interval)
+
+    def _load_in_context(self):
+        with self._app.app_context():
+            return self._load_scales()
+
+    # ------------------------------------------------------------------ #
+    # Polling
+    # ------------------------------------------------------------------ #
+    async def _poll_forever(self, channel):
+        next_tick = time.monotonic()
+        try:
+            while True:
+                await self.poll(channel)
+                # Fixed-rate schedule; if a poll overran, skip the missed ticks
+                next_tick += channel.interval
+                now = time.monotonic()
+                if next_tick < now:
+                    next_tick = now
+                await asyncio.sleep(next_tick - now)
+        finally:
+            self._disconnect(channel)
+
+    async def poll(self, channel):
+        if not channel.breaker.allow(time.monotonic()):
+            channel.skipped += 1
+            return None
+
+        started = time.perf_counter()
+        try:
+            values = await asyncio.wait_for(self._read(channel), channel.timeout)
+        except Exception as e:
+            channel.reads += 1
+            channel.failures += 1
+            channel.last_error = time.time()
+            channel.last_error_message = str(e) or type(e).__name__
+            channel.breaker.failure(time.monotonic())
+            self._share(channel, channel.ring.latest())
+            if not isinstance(e, _DeviceError):
+                # Timed out or dropped: a late reply would be matched to the next request
+                self._disconnect(channel)
+            return None
+
+        channel.reads += 1
+        channel.latency_ms = round((time.perf_counter() - started) * 1000.0, 2)
+        channel.breaker.success()
+        sample = ScaleSample(channel.scale_id, time.time(), values)
+        self._share(channel, sample)
+        self._publish(channel, sample)
+        return sample
+
+    def _share(self, channel, sample):
+        if self.table is not None and self.table.is_leader:
+            self.table.write(channel.scale_id, sample.timestamp if sample else None, sample.values if sample else None,
+                             channel.breaker.state, channel.reads, channel.failures)
+
+    def _publish(self, channel, sample):
+        channel.ring.push(sample)
+        for callback in self._listeners:
+            try:
+                callback(sample)
+            except Exception as e:
+                print(f"Scale sample listener failed: {e}")
+
+    async def _read(self, channel):
+        from extensions import modbus
+        from models.scale import REGISTER_MAPS
+
+        if channel.reset:
+            self._disconnect(channel)
+            channel.reset = False
+        client = channel.modbus
+        if client is None or not client.connected:
+            self._disconnect(channel)
+            host, port, slave = channel.endpoint
+            client = AsyncModbusTcpClient(
+                host or modbus.default_host, port=int(port or modbus.default_port),
+                timeout=channel.timeout, retries=0, reconnect_delay=0,
+            )
+            channel.modbus = client
+            if not await client.connect():
+                raise ConnectionError(f"Could not connect to {client.comm_params.host}:{client.comm_params.port}")
+
+        slave = channel.endpoint[2]
+        slave = int(slave if slave is not None else modbus.default_slave)
+        register_map = REGISTER_MAPS[channel.model or modbus.default_model]
+        blocks = []
+        for address, count in register_map.plan():
+            response = await client.read_holding_registers(address, count, slave=slave)
+            if response.isError():
+                raise _DeviceError(f"Modbus error response: {response}")
+            blocks.append((address, response.registers))
+        return register_map.decode(blocks)
+
+    @staticmethod
+    def _disconnect(channel):
+        if channel.modbus is not None:
+            try:
+                channel.modbus.close()
+            except Exception:
+                pass
+            channel.modbus = None
+
+    # ------------------------------------------------------------------ #
+    # Reads
+    # ------------------------------------------------------------------ #
+    def channel(self, scale_id=None):
+        """Channel of a registered scale (default: the first); LookupError for unknown ids"""
+        scale_id = scale_id if scale_id is not None else self.default_scale_id
+        channel = self.channels.get(scale_id)
+        if channel is None:
+            raise LookupError(f"Scale {scale_id} is not registered")
+        return channel
+
+    def latest(self, scale_id=None):
+        """Return (sample, age_seconds, stale) or None if nothing was read yet."""
+        channel = self.channels.get(scale_id if scale_id is not None else self.default_scale_id)
+        if channel is None:
+            return None
+        if self.role == "follower":
+            # Straight from the shared table, so every worker serves the same sample
+            record = self.table.read(channel.scale_id)
+            sample = ScaleSample(channel.scale_id, record.timestamp, record.values) if record else None
+        else:
+            sample = channel.ring.latest()
+        if sample is None:
+            return None
+        age = time.time() - sample.timestamp
+        # A slowly polled scale is only stale once it has missed a couple of polls
+        return sample, age, age > max(self.stale_after, 2 * channel.interval)
+
+    def read(self, scale_id=None):
+        """Current values of a scale: the latest fresh sample while polling, else one
+        blocking read. None when the scale can't be read (or its breaker is open)."""
+        channel = self.channel(scale_id)
+        if self.running:
+            cached = self.latest(channel.scale_id)
+            if cached and not cached[2]:
+                return cached[0].values
+            if channel.breaker.state == "open":
+                return None
+        return channel.client.get_scale_values()
+
+    def net_weight(self, scale_id=None):
+        values = self.read(scale_id)
+        return values["net_weight"] if values else None
+
+    def status(self):
+        leader = self.table.leader() if self.table is not None else None
+        return {
+            "running": self.running,
+            "role": self.role,
+            "pid": os.getpid(),
+            "leader_pid": leader[0] if leader else None,
+            "leader_heartbeat_age": round(leader[1], 2) if leader else None,
+            "source": self.source,
+            "interval": self.interval,
+            "scales": [self.channel_status(channel) for channel in list(self.channels.values())],
+        }
+
+    def channel_status(self, channel):
+        host, port, slave = channel.endpoint
+        return {
+            "scale_id": channel.scale_id,
+            "name": channel.name,
+            "station": channel.station,
+            "host": host,
+            "port": port,
+            "slave": slave,
+            "interval": channel.interval,
+            "timeout": channel.timeout,
+            "reads": channel.reads,
+            "failures": channel.failures,
+            "skipped": channel.skipped,
+            "buffered": len(channel.ring),
+            "latency_ms": channel.latency_ms,
+            "last_error": channel.last_error,
+            "last_error_message": channel.last_error_message,
+            "breaker": channel.breaker.to_dict(),
+        }
+
+
+def sample_metadata(sample, age, stale):
+    return {
+        "scale_id": sample.scale_id,
+        "timestamp": datetime.fromtimestamp(sample.timestamp, tz=timezone.utc).isoformat(),
+        "age_ms": round(age * 1000, 1),
+        "stale": stale,
+    }
@@ -0,0 +1,259 @@
+# services/scale_simulator.py
+"""Simulated Modbus TCP weighing indicators, for working on the scale path without hardware.
+
+    python -m services.scale_simulator --count 4 --port 5020
+
+starts four indicators on ports 5020-5023 and prints the SCALES and
+DOSING_ACTUATORS values that point the backend at them. hil_harness.py
+uses the same classes in-process.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+from pymodbus.constants import Endian
+from pymodbus.datastore import ModbusServerContext
+from pymodbus.datastore.context import ModbusBaseSlaveContext
+from pymodbus.payload import BinaryPayloadBuilder
+from pymodbus.server import ModbusTcpServer
+
+from services.dosing import SimulatedPlant
+
+_ENDIAN = {"big": Endian.BIG, "little": Endian.LITTLE}
+COIL_COUNT = 16
+
+
+class _IndicatorContext(ModbusBaseSlaveContext):
+    """Answers reads from the indicator's live state instead of a stored data block"""
+
+    def __init__(self, indicator):
+        self.indicator = indicator
+
+    def reset(self):
+        pass
+
+    def validate(self, fc_as_hex, address, count=1):
+        # Every request passes through here first; False is answered with an IllegalAddress exception
+        if not self.indicator.admit():
+            return False
+        limit = COIL_COUNT if self.decode(fc_as_hex) == "c" else self.indicator.register_count
+        return 0 <= address and address + count <= limit
+
+    def getValues(self, fc_as_hex, address, count=1):
+        return self.indicator.serve(self.decode(fc_as_hex), address, count)
+
+    def setValues(self, fc_as_hex, address, values):
+        self.indicator.write(self.decode(fc_as_hex), address, values)
+
+
+class SimulatedIndicator:
+    """One indicator on its own port, thread and event loop, like a real device
+    that handles one request at a time.
+
+    The weight comes from a SimulatedPlant (feed rates, in-flight delay,
+    noise, motion) driven by the coarse/fine coils, the same coils
+    services.dosing.ModbusCoilActuator writes; a rising edge on tare_coil
+    tares. fill_rate adds a steady pour up to fill_to, as if an operator
+    were dosing by hand. Registers follow the scale model's RegisterMap;
+    where the default map overlaps (net's low word at 3 is also
+    "overrange"), the weights win.
+
+    Failure injection, per request: latency +- jitter seconds before
+    answering, error_rate of Modbus exception responses, stall_rate of
+    requests held for stall_time (longer than the client timeout), and
+    offline to stall everything.
+    """
+
+    def __init__(self, host="127.0.0.1", port=5020, slave=1, model="default", capacity=60.0,
+                 latency=0.002, jitter=0.001, error_rate=0.0, stall_rate=0.0, stall_time=2.0,
+                 coarse_coil=0, fine_coil=1, tare_coil=2, fill_rate=0.0, fill_to=None, seed=None, **plant):
+        from models.scale import REGISTER_MAPS
+
+        self.host = host
+        self.port = port
+        self.slave = slave
+        self.register_map = REGISTER_MAPS[model]
+        self.register_count = max(f.address + (2 if f.kind == "float32" else 1) for f in self.register_map.fields)
+        self.capacity = capacity
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_time = stall_time
+        self.offline = False
+        self.coarse_coil = coarse_coil
+        self.fine_coil = fine_coil
+        self.tare_coil = tare_coil
+        self.fill_rate = fill_rate
+        self.fill_to = fill_to
+        self.plant = SimulatedPlant(seed=seed, **plant)
+        self.tare = 0.0
+        self.coils = [False] * COIL_COUNT
+        self._random = random.Random(seed)
+        self._started = time.monotonic()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self.requests = 0
+        self.errors = 0
+        self.stalls = 0
+
+    # ------------------------------------------------------------------ #
+    # Process
+    # ------------------------------------------------------------------ #
+    def values(self):
+        """What the indicator shows right now, shaped like ScaleClient.get_scale_values()"""
+        reading = self.plant.read()
+        gross = reading.weight
+        if self.fill_rate:
+            poured = self.fill_rate * (time.monotonic() - self._started)
+            gross += min(poured, self.fill_to) if self.fill_to is not None else poured
+            reading = reading._replace(motion=reading.motion or self.fill_to is None or poured < self.fill_to)
+        net = gross - self.tare
+        return {
+            "gross_weight": round(gross, 4),
+            "tare_weight": round(self.tare, 4),
+            "net_weight": round(net, 4),
+            "alarms": {
+                "overrange": gross > self.capacity,
+                "underrange": gross < -0.02 * self.capacity,
+                "motion": reading.motion,
+                "negative": net < 0,
+            },
+        }
+
+    def registers(self):
+        values = self.values()
+        registers = [0] * self.register_count
+        fields = sorted(self.register_map.fields, key=lambda f: f.kind == "float32")  # weights last
+        for field in fields:
+            value = values[field.group][field.name] if field.group else values[field.name]
+            if field.kind == "float32":
+                builder = BinaryPayloadBuilder(byteorder=_ENDIAN[self.register_map.byteorder],
+                                               wordorder=_ENDIAN[self.register_map.wordorder])
+                builder.add_32bit_float(value)
+                registers[field.address:field.address + 2] = builder.to_registers()
+            else:
+                registers[field.address] = int(bool(value))
+        return registers
+
+    # ------------------------------------------------------------------ #
+    # Modbus callbacks (on the indicator's own thread)
+    # ------------------------------------------------------------------ #
+    def admit(self):
+        """Apply injected latency and stalls; False to answer with an exception response"""
+        self.requests += 1
+        if self.offline or self._random.random() < self.stall_rate:
+            self.stalls += 1
+            time.sleep(self.stall_time)
+        elif self.latency or self.jitter:
+            time.sleep(max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0))
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return False
+        return True
+
+    def serve(self, kind, address, count):
+        if kind == "c":
+            return self.coils[address:address + count]
+        return self.registers()[address:address + count]
+
+    def write(self, kind, address, values):
+        if kind != "c":
+            raise IOError("Only coils are writable")
+        for offset, value in enumerate(values):
+            coil = address + offset
+            if coil == self.tare_coil and value and not self.coils[coil]:
+                self.tare = self.values()["gross_weight"]
+            self.coils[coil] = bool(value)
+        if self.coils[self.coarse_coil]:
+            self.plant.set_feed("coarse")
+        elif self.coils[self.fine_coil]:
+            self.plant.set_feed("fine")
+        else:
+            self.plant.set_feed("off")
+
+    # ------------------------------------------------------------------ #
+    # Server
+    # ------------------------------------------------------------------ #
+    def start(self, timeout=5.0):
+        self._thread = threading.Thread(target=self._run, name=f"scale-sim-{self.port}", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError(f"Simulated indicator on port {self.port} did not start")
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        context = ModbusServerContext(slaves={self.slave: _IndicatorContext(self)}, single=False)
+        self._server = ModbusTcpServer(context, address=(self.host, self.port))
+        await self._server.transport_listen()
+        self._ready.set()
+        await self._server.serving
+
+    def stop(self):
+        if self._loop is not None and self._server is not None:
+            asyncio.run_coroutine_threadsafe(self._server.shutdown(), self._loop).result(5)
+            self._thread.join(5)
+
+    def scale_config(self, scale_id):
+        """Entries for SCALES and DOSING_ACTUATORS that point at this indicator"""
+        scale = {"id": scale_id, "host": self.host, "port": self.port, "slave": self.slave}
+        actuator = {"type": "modbus", "host": self.host, "port": self.port, "slave": self.slave,
+                    "coarse_coil": self.coarse_coil, "fine_coil": self.fine_coil, "tare_coil": self.tare_coil}
+        return scale, actuator
+
+    def stats(self):
+        return {"port": self.port, "requests": self.requests, "errors": self.errors, "stalls": self.stalls}
+
+
+def start_indicators(count, port=5020, **options):
+    """count indicators on consecutive ports; seed (if given) is offset per indicator"""
+    seed = options.pop("seed", None)
+    return [
+        SimulatedIndicator(port=port + i, seed=None if seed is None else seed + i, **options).start()
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run simulated Modbus TCP weighing indicators")
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5020, help="first port")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.001)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--noise", type=float, default=0.001)
+    parser.add_argument("--fill-rate", type=float, default=0.0, help="steady pour, weight per second")
+    parser.add_argument("--fill-to", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    indicators = start_indicators(
+        args.count, port=args.port, host=args.host, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, stall_rate=args.stall_rate, noise=args.noise,
+        fill_rate=args.fill_rate, fill_to=args.fill_to, seed=args.seed,
+    )
+    configs = [indicator.scale_config(i + 1) for i, indicator in enumerate(indicators)]
+    print(f"SCALES='{json.dumps([scale for scale, _ in configs])}'")
+    print(f"DOSING_ACTUATORS='{json.dumps({scale['id']: actuator for scale, actuator in configs})}'")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for indicator in indicators:
+            indicator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# services/weight_buffer.py
+import atexit
+import threading
+import time
+from sqlalchemy import insert
+
+
+def insert_weight_rows(session, rows, chunk_size=1000):
+    """executemany INSERT of WeightEntry dicts; the caller owns the transaction"""
+    from models.weight import WeightEntry
+
+    for start in range(0, len(rows), chunk_size):
+        session.execute(insert(WeightEntry), rows[start:start + chunk_size])
+
+
+class WeightBuffer:
+    """Collects weight samples in memory and writes them in batches.
+
+    A batch is flushed when it reaches WEIGHT_BUFFER_MAX_ROWS rows or its
+    oldest row is WEIGHT_BUFFER_MAX_AGE seconds old, whichever comes first.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_rows = 500
+        self.max_age = 1.0
+        self.max_pending = 50000
+        self._rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.dropped = 0
+        self.failures = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_rows = app.config.get("WEIGHT_BUFFER_MAX_ROWS", self.max_rows)
+        self.max_age = app.config.get("WEIGHT_BUFFER_MAX_AGE", self.max_age)
+        self.max_pending = app.config.get("WEIGHT_BUFFER_MAX_PENDING", self.max_pending)
+        app.extensions["weight_buffer"] = self
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="weight-buffer", daemon=True)
+            self._thread.start()
+
+    def add(self, rows):
+        with self._lock:
+            overflow = len(self._rows) + len(rows) - self.max_pending
+            if overflow > 0:
+                # Shed the oldest samples rather than grow without bound while MySQL is down
+                del self._rows[:overflow]
+                self.dropped += overflow
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            full = len(self._rows) >= self.max_rows
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def pending(self):
+        return len(self._rows)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.max_age)
+            self._wakeup.clear()
+            with self._lock:
+                due = self._rows and (
+                    len(self._rows) >= self.max_rows or time.monotonic() - self._oldest >= self.max_age
+                )
+            if due:
+                self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                self._oldest = None
+            if not rows or self.app is None:
+                return 0
+
+            from extensions import db
+
+            with self.app.app_context():
+                try:
+                    insert_weight_rows(db.session, rows)
+                    db.session.commit()
+                    self.flushed += len(rows)
+                    return len(rows)
+                except Exception as e:
+                    db.session.rollback()
+                    self.failures += 1
+                    print(f"Failed to flush {len(rows)} weight samples: {e}")
+                    # Put them back for the next attempt, oldest first
+                    with self._lock:
+                        self._rows = rows + self._rows
+                        overflow = len(self._rows) - self.max_pending
+                        if overflow > 0:
+                            del self._rows[:overflow]
+                            self.dropped += overflow
+                        self._oldest = time.monotonic()
+                    return 0
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
@@ -0,0 +1,299 @@
+# services/weight_filter.py
+import bisect
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
+# weight: the value to record (window mean when stable, else the filtered weight)
+Capture = namedtuple("Capture", ["scale_id", "weight", "stable", "std", "waited", "timestamp"])
+
+
+class MovingAverage:
+    def __init__(self, window=5):
+        self.window = window
+        self._values = deque()
+        self._sum = 0.0
+
+    def update(self, value):
+        self._values.append(value)
+        self._sum += value
+        if len(self._values) > self.window:
+            self._sum -= self._values.popleft()
+        return self._sum / len(self._values)
+
+    def reset(self):
+        self._values.clear()
+        self._sum = 0.0
+
+
+class MedianFilter:
+    """Rejects single-sample spikes (a knock on the pan, a bad read) without lag on steps"""
+
+    def __init__(self, window=5):
+        self.window = window
+        self._values = deque()
+        self._sorted = []
+
+    def update(self, value):
+        self._values.append(value)
+        bisect.insort(self._sorted, value)
+        if len(self._values) > self.window:
+            del self._sorted[bisect.bisect_left(self._sorted, self._values.popleft())]
+        return self._sorted[len(self._sorted) // 2]
+
+    def reset(self):
+        self._values.clear()
+        self._sorted = []
+
+
+class ExponentialFilter:
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self._value = None
+
+    def update(self, value):
+        self._value = value if self._value is None else self._value + self.alpha * (value - self._value)
+        return self._value
+
+    def reset(self):
+        self._value = None
+
+
+def build_smoother(kind, window=5, alpha=0.3):
+    """"ema", "moving_average" or "none" (WEIGHT_FILTER)"""
+    if kind == "ema":
+        return ExponentialFilter(alpha)
+    if kind == "moving_average":
+        return MovingAverage(window)
+    if kind in (None, "", "none"):
+        return None
+    raise ValueError(f"Unknown weight filter {kind!r}")
+
+
+class StabilityDetector:
+    """Stable once the last `window` seconds had no motion bit and a standard
+    deviation of at most `max_std`.
+
+    Mean and variance come from running sums over the window, taken relative
+    to a reference weight so that small variations on a large load don't
+    cancel out; the reference moves whenever the weight has.
+    """
+
+    def __init__(self, window=0.5, max_std=0.005, min_samples=3):
+        self.window = window
+        self.max_std = max_std
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        self._samples = deque()  # (timestamp, value)
+        self._ref = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._since = None  # start of the current motion-free run
+        self.stable = False
+        self.stable_since = None
+
+    def _rebase(self, ref):
+        self._ref = ref
+        self._sum = sum(v - ref for _, v in self._samples)
+        self._sumsq = sum((v - ref) ** 2 for _, v in self._samples)
+
+    @property
+    def mean(self):
+        n = len(self._samples)
+        return self._ref + self._sum / n if n else None
+
+    @property
+    def std(self):
+        n = len(self._samples)
+        if n < 2:
+            return None
+        return math.sqrt(max(self._sumsq / n - (self._sum / n) ** 2, 0.0))
+
+    def update(self, timestamp, value, motion=False):
+        if motion:
+            self.reset()
+            return False
+        if self._since is None:
+            self._since = timestamp
+        if self._ref is None:
+            self._ref = value
+
+        self._samples.append((timestamp, value))
+        self._sum += value - self._ref
+        self._sumsq += (value - self._ref) ** 2
+        while self._samples and self._samples[0][0] < timestamp - self.window:
+            _, old = self._samples.popleft()
+            self._sum -= old - self._ref
+            self._sumsq -= (old - self._ref) ** 2
+        if abs(self._sum / len(self._samples)) > 100 * self.max_std:
+            self._rebase(value)
+
+        std = self.std
+        stable = (
+            timestamp - self._since >= self.window
+            and len(self._samples) >= self.min_samples
+            and std is not None and std <= self.max_std
+        )
+        if stable and not self.stable:
+            self.stable_since = timestamp
+        elif not stable:
+            self.stable_since = None
+        self.stable = stable
+        return stable
+
+
+class WeightSignal:
+    """Filtering stage for one scale: median (spikes), optional smoother, stability detector"""
+
+    def __init__(self, median_window=5, smoother=None, stable_window=0.5, stable_std=0.005, min_samples=3):
+        self.median = MedianFilter(median_window) if median_window > 1 else None
+        self.smoother = smoother
+        self.detector = StabilityDetector(stable_window, stable_std, min_samples)
+        self.raw = None
+        self.value = None
+        self.timestamp = None
+
+    def update(self, timestamp, weight, motion=False):
+        self.raw = weight
+        despiked = self.median.update(weight) if self.median else weight
+        self.value = self.smoother.update(despiked) if self.smoother else despiked
+        self.timestamp = timestamp
+        # Variance of the de-spiked signal: smoothing would hide the settling we're looking for
+        self.detector.update(timestamp, despiked, motion)
+        return self.value
+
+    def capture(self, scale_id, waited):
+        stable = self.detector.stable
+        weight = self.detector.mean if stable else self.value
+        std = self.detector.std
+        return Capture(scale_id, round(weight, 4) if weight is not None else None, stable,
+                       round(std, 5) if std is not None else None, round(waited, 3), self.timestamp)
+
+    def to_dict(self):
+        std = self.detector.std
+        return {
+            "raw": self.raw,
+            "filtered": round(self.value, 4) if self.value is not None else None,
+            "stable": self.detector.stable,
+            "std": round(std, 5) if std is not None else None,
+            "stable_for": round(self.timestamp - self.detector.stable_since, 3) if self.detector.stable else None,
+        }
+
+
+class WeightFilters:
+    """Filters every acquired net weight per scale and lets requests wait for a stable one."""
+
+    def __init__(self, app=None):
+        self.kind = "ema"
+        self.window = 5
+        self.alpha = 0.3
+        self.median_window = 5
+        self.stable_window = 0.5
+        self.stable_std = 0.005
+        self.min_samples = 3
+        self.capture_timeout = 5.0
+        self.max_capture_timeout = 30.0
+        self.signals = {}
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self.captures = 0
+        self.unstable_captures = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from extensions import acquisition
+
+        self.kind = app.config.get("WEIGHT_FILTER", self.kind)
+        self.window = app.config.get("WEIGHT_FILTER_WINDOW", self.window)
+        self.alpha = app.config.get("WEIGHT_FILTER_ALPHA", self.alpha)
+        self.median_window = app.config.get("WEIGHT_MEDIAN_WINDOW", self.median_window)
+        self.stable_window = app.config.get("WEIGHT_STABLE_WINDOW", self.stable_window)
+        self.stable_std = app.config.get("WEIGHT_STABLE_STD", self.stable_std)
+        self.capture_timeout = app.config.get("WEIGHT_CAPTURE_TIMEOUT", self.capture_timeout)
+        build_smoother(self.kind)  # fail at startup on a bad WEIGHT_FILTER
+        app.extensions["weight_filters"] = self
+        acquisition.add_listener(self._on_sample)
+
+    def new_signal(self):
+        return WeightSignal(self.median_window, build_smoother(self.kind, self.window, self.alpha),
+                            self.stable_window, self.stable_std, self.min_samples)
+
+    def _on_sample(self, sample):
+        motion = bool((sample.values.get("alarms") or {}).get("motion"))
+        with self._cond:
+            signal = self.signals.get(sample.scale_id)
+            if signal is None:
+                signal = self.signals[sample.scale_id] = self.new_signal()
+            signal.update(sample.timestamp, sample.values["net_weight"], motion)
+            if self._waiting:
+                self._cond.notify_all()
+
+    def state(self, scale_id):
+        signal = self.signals.get(scale_id)
+        return signal.to_dict() if signal is not None else None
+
+    def wait_stable(self, scale_id=None, timeout=None):
+        """Block until the scale's weight is stable or timeout seconds pass.
+
+        Returns a Capture (stable=False on timeout; weight None if the scale
+        couldn't be read at all). Uses the acquisition feed while it runs,
+        otherwise reads the scale directly at the poll interval. LookupError
+        for an unknown scale id.
+        """
+        from extensions import acquisition
+
+        channel = acquisition.channel(scale_id)
+        timeout = self.capture_timeout if timeout is None else min(max(timeout, 0.0), self.max_capture_timeout)
+        started = time.monotonic()
+        deadline = started + timeout
+        if acquisition.running:
+            capture = self._wait_for_feed(acquisition, channel.scale_id, started, deadline)
+        else:
+            capture = self._wait_polling(channel, started, deadline)
+        self.captures += 1
+        self.unstable_captures += not capture.stable
+        return capture
+
+    def _wait_for_feed(self, acquisition, scale_id, started, deadline):
+        with self._cond:
+            while True:
+                signal = self.signals.get(scale_id)
+                cached = acquisition.latest(scale_id)
+                fresh = cached is not None and not cached[2]
+                remaining = deadline - time.monotonic()
+                if signal is not None and fresh and (signal.detector.stable or remaining <= 0):
+                    return signal.capture(scale_id, time.monotonic() - started)
+                if remaining <= 0:
+                    return Capture(scale_id, None, False, None, round(time.monotonic() - started, 3), None)
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _wait_polling(self, channel, started, deadline):
+        signal = self.new_signal()
+        while True:
+            values = channel.client.get_scale_values()
+            if values is not None:
+                signal.update(time.time(), values["net_weight"], bool((values.get("alarms") or {}).get("motion")))
+            now = time.monotonic()
+            if signal.detector.stable or now >= deadline:
+                if signal.value is None:
+                    return Capture(channel.scale_id, None, False, None, round(now - started, 3), None)
+                return signal.capture(channel.scale_id, now - started)
+            time.sleep(min(channel.interval, max(deadline - now, 0.0)))
+
+    def stats(self):
+        return {
+            "filter": self.kind,
+            "stable_window": self.stable_window,
+            "stable_std": self.stable_std,
+            "captures": self.captures,
+            "unstable_captures": self.unstable_captures,
+            "scales": {scale_id: signal.to_dict() for scale_id, signal in list(self.signals.items())},
+        }
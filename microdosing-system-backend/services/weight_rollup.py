@@ -0,0 +1,221 @@
+# services/weight_rollup.py
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, tuple_
+
+RESOLUTIONS = ("minute", "hour", "day")
+STATE_NAME = "weight_rollup"
+
+
+def bucket_start(timestamp, resolution):
+    if resolution == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class WeightRollupService:
+    """Folds new weight_entry rows into minute/hour/day rollups and prunes old raw rows.
+
+    Ids are handed out when a row is inserted but become visible when its
+    transaction commits, so a bulk insert can commit a lower id after a
+    higher one was already rolled up. The watermark therefore only moves up
+    to a settled id: the largest id this process saw at least settle_seconds
+    ago. Every transaction holding a smaller id was already in flight then
+    and has committed since, as long as none runs longer than settle_seconds.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.interval = 60.0
+        self.batch_size = 5000
+        self.prune_batch_size = 1000
+        self.raw_retention_days = 30
+        self.minute_retention_days = 365
+        self.settle_seconds = 120.0
+        self._horizons = deque()  # (monotonic time, max weight_entry id seen then)
+        self._settled_id = 0
+        self._thread = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("WEIGHT_ROLLUP_ENABLED", self.enabled)
+        self.interval = app.config.get("WEIGHT_ROLLUP_INTERVAL", self.interval)
+        self.batch_size = app.config.get("WEIGHT_ROLLUP_BATCH_SIZE", self.batch_size)
+        self.prune_batch_size = app.config.get("WEIGHT_PRUNE_BATCH_SIZE", self.prune_batch_size)
+        self.raw_retention_days = app.config.get("WEIGHT_RAW_RETENTION_DAYS", self.raw_retention_days)
+        self.minute_retention_days = app.config.get("WEIGHT_MINUTE_ROLLUP_RETENTION_DAYS", self.minute_retention_days)
+        self.settle_seconds = app.config.get("WEIGHT_ROLLUP_SETTLE_SECONDS", self.settle_seconds)
+        app.extensions["weight_rollups"] = self
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="weight-rollup", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    from extensions import db
+                    db.session.rollback()
+                    print(f"Weight rollup failed: {e}")
+
+    def run_once(self):
+        rolled = 0
+        while True:
+            processed = self.rollup_batch()
+            rolled += processed
+            if processed < self.batch_size:
+                break
+        pruned = self.prune_raw()
+        pruned_rollups = self.prune_minute_rollups()
+        return {"rolled_up": rolled, "pruned_raw": pruned, "pruned_minute_rollups": pruned_rollups}
+
+    # ------------------------------------------------------------------ #
+    # Incremental rollup
+    # ------------------------------------------------------------------ #
+    def _state(self, session, lock=True):
+        from models.weight import WeightRollupState
+
+        query = session.query(WeightRollupState).filter_by(name=STATE_NAME)
+        state = (query.with_for_update() if lock else query).first()
+        if state is None:
+            state = WeightRollupState(name=STATE_NAME, last_entry_id=0)
+            session.add(state)
+            session.flush()
+        return state
+
+    def _settled(self, session):
+        """Largest weight_entry id below which no row can still be uncommitted"""
+        from models.weight import WeightEntry
+
+        now = time.monotonic()
+        latest = session.execute(select(func.max(WeightEntry.id))).scalar() or 0
+        if not self._horizons or self._horizons[-1][1] != latest:
+            self._horizons.append((now, latest))
+        while self._horizons and now - self._horizons[0][0] >= self.settle_seconds:
+            self._settled_id = max(self._settled_id, self._horizons.popleft()[1])
+        return self._settled_id
+
+    def rollup_batch(self):
+        """Fold the next batch of settled rows after the watermark; returns rows processed"""
+        from extensions import db
+        from models.weight import WeightEntry, WeightRollup
+
+        session = db.session
+        settled = self._settled(session)
+        # The row lock serialises concurrent workers on the same watermark
+        state = self._state(session)
+        rows = session.execute(
+            select(WeightEntry.id, WeightEntry.scale_id, WeightEntry.timestamp,
+                   WeightEntry.current_weight, WeightEntry.status)
+            .where(WeightEntry.id > state.last_entry_id, WeightEntry.id <= settled)
+            .order_by(WeightEntry.id)
+            .limit(self.batch_size)
+        ).all()
+        if not rows:
+            session.commit()
+            return 0
+
+        partials = {}
+        for entry_id, scale_id, timestamp, weight, status in rows:
+            for resolution in RESOLUTIONS:
+                key = (scale_id or 0, resolution, bucket_start(timestamp, resolution))
+                p = partials.get(key)
+                if p is None:
+                    p = partials[key] = [0, weight, weight, 0.0, 0.0, 0]
+                p[0] += 1
+                p[1] = min(p[1], weight)
+                p[2] = max(p[2], weight)
+                p[3] += weight
+                p[4] += weight * weight
+                p[5] += 1 if status == 0 else 0
+
+        existing = {
+            (r.scale_id, r.resolution, r.bucket_start): r
+            for r in session.query(WeightRollup).filter(
+                tuple_(WeightRollup.scale_id, WeightRollup.resolution, WeightRollup.bucket_start).in_(list(partials))
+            )
+        }
+        for key, (count, minimum, maximum, total, total_sq, stable) in partials.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                session.add(WeightRollup(
+                    scale_id=key[0], resolution=key[1], bucket_start=key[2],
+                    count=count, min_weight=minimum, max_weight=maximum,
+                    sum_weight=total, sum_sq_weight=total_sq, stable_count=stable,
+                ))
+            else:
+                rollup.count += count
+                rollup.min_weight = min(rollup.min_weight, minimum)
+                rollup.max_weight = max(rollup.max_weight, maximum)
+                rollup.sum_weight += total
+                rollup.sum_sq_weight += total_sq
+                rollup.stable_count += stable
+
+        state.last_entry_id = rows[-1][0]
+        session.commit()
+        return len(rows)
+
+    # ------------------------------------------------------------------ #
+    # Retention
+    # ------------------------------------------------------------------ #
+    def prune_raw(self):
+        """Delete raw rows past retention, in small batches, only those already rolled up.
+
+        Every id up to the watermark has been folded into weight_rollup: the
+        watermark never passes an id that could still commit later.
+        """
+        if not self.raw_retention_days:
+            return 0
+        from extensions import db
+        from models.weight import WeightEntry
+
+        session = db.session
+        watermark = self._state(session, lock=False).last_entry_id
+        session.commit()
+        cutoff = datetime.utcnow() - timedelta(days=self.raw_retention_days)
+
+        deleted = 0
+        while not self._stop.is_set():
+            ids = session.execute(
+                select(WeightEntry.id)
+                .where(WeightEntry.timestamp < cutoff, WeightEntry.id <= watermark)
+                .order_by(WeightEntry.timestamp)
+                .limit(self.prune_batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            session.execute(delete(WeightEntry).where(WeightEntry.id.in_(ids)))
+            session.commit()
+            deleted += len(ids)
+        return deleted
+
+    def prune_minute_rollups(self):
+        if not self.minute_retention_days:
+            return 0
+        from extensions import db
+        from models.weight import WeightRollup
+
+        cutoff = datetime.utcnow() - timedelta(days=self.minute_retention_days)
+        result = db.session.execute(
+            delete(WeightRollup).where(WeightRollup.resolution == "minute", WeightRollup.bucket_start < cutoff)
+        )
+        db.session.commit()
+        return result.rowcount
@@ -0,0 +1,319 @@
+# services/weight_trace.py
+"""Compact weight curves of dispensings.
+
+A trace is every net-weight sample of one scale between start() and
+stop(), stored as one blob per dispensing instead of a WeightEntry row per
+sample. Encoding (ENCODING): times as uint32 milliseconds since the start
+and weights as float32, each delta-encoded, the weight deltas taken on the
+float32 bit patterns so decoding is exact. The bytes of every array are
+split into planes (all first bytes, all second bytes, ...) before zlib,
+which puts the mostly-zero high bytes of small deltas next to each other.
+"""
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime, timezone
+
+ENCODING = "f32-delta-zlib-1"
+_HEADER = struct.Struct("<4sBxxxI")  # magic, version, sample count
+_MAGIC = b"WTRC"
+_MASK = 0xFFFFFFFF
+
+
+def _shuffle(data, width=4):
+    return b"".join(data[i::width] for i in range(width))
+
+
+def _unshuffle(data, width=4):
+    n = len(data) // width
+    out = bytearray(len(data))
+    for i in range(width):
+        out[i::width] = data[i * n:(i + 1) * n]
+    return bytes(out)
+
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _deltas(values):
+    previous = 0
+    out = array("I")
+    for value in values:
+        out.append((value - previous) & _MASK)
+        previous = value
+    return out
+
+
+def _running_sum(deltas):
+    total = 0
+    out = array("I")
+    for delta in deltas:
+        total = (total + delta) & _MASK
+        out.append(total)
+    return out
+
+
+def encode_trace(times, weights):
+    """times: seconds since the start of the trace; weights: net weights"""
+    if len(times) != len(weights):
+        raise ValueError("times and weights must have the same length")
+    millis = [int(round(t * 1000)) & _MASK for t in times]
+    bits = array("I", array("f", weights).tobytes())  # float32 bit patterns
+    body = _shuffle(_little_endian(_deltas(millis)).tobytes()) + _shuffle(_little_endian(_deltas(bits)).tobytes())
+    return _HEADER.pack(_MAGIC, 1, len(times)) + zlib.compress(body, 9)
+
+
+def decode_trace(blob):
+    """(times in seconds, weights) from encode_trace()"""
+    magic, version, count = _HEADER.unpack_from(blob)
+    if magic != _MAGIC or version != 1:
+        raise ValueError("Not a version 1 weight trace")
+    body = zlib.decompress(blob[_HEADER.size:])
+    size = count * 4
+    millis = _running_sum(_little_endian(array("I", _unshuffle(body[:size]))))
+    bits = _running_sum(_little_endian(array("I", _unshuffle(body[size:2 * size]))))
+    weights = array("f", bits.tobytes())
+    return [m / 1000.0 for m in millis], [round(w, 4) for w in weights]
+
+
+class _Recording:
+    def __init__(self, dispensing_id, scale_id, max_samples, started=None):
+        self.dispensing_id = dispensing_id
+        self.scale_id = scale_id
+        self.max_samples = max_samples
+        self.started = time.time() if started is None else started
+        self.started_at = None  # DispensingTrace.started_at as stored; identifies this run of the trace
+        self.times = []
+        self.weights = []
+        self.truncated = False
+
+    def add(self, sample):
+        weight = sample.values.get("net_weight")
+        if sample.timestamp < self.started or weight is None:
+            return
+        t = sample.timestamp - self.started
+        if self.times and t <= self.times[-1]:
+            return  # already have it (backfilled from the ring)
+        if len(self.times) >= self.max_samples:
+            self.truncated = True
+            return
+        self.times.append(t)
+        self.weights.append(weight)
+
+
+class TraceRecorder:
+    """Records the weight curve of dispensings from the acquisition feed.
+
+    start() marks the dispensing's trace as recording; samples of its scale
+    are buffered in memory until stop() encodes and stores them on the
+    DispensingTrace row. A trace is capped at DISPENSING_TRACE_MAX_SAMPLES.
+
+    The recording row is the marker every worker goes by: each process
+    sees every sample (the acquisition leader polls, followers mirror), and
+    every DISPENSING_TRACE_SYNC_INTERVAL seconds a worker adopts recording
+    rows it isn't buffering, backfilled from its sample ring, and drops the
+    ones stopped elsewhere. So stop() works on any worker, and the first
+    stop to store wins. A row still recording after
+    DISPENSING_TRACE_MAX_DURATION seconds (its worker died, nobody stopped
+    it) is stored as it stands and marked truncated.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.max_samples = 100000
+        self.sync_interval = 1.0
+        self.max_duration = 3600.0
+        self._recordings = {}  # dispensing_id -> _Recording
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stored = 0
+        self.stored_bytes = 0
+        self.adopted = 0
+        self.expired = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from extensions import acquisition
+
+        self.app = app
+        self.max_samples = app.config.get("DISPENSING_TRACE_MAX_SAMPLES", self.max_samples)
+        self.sync_interval = app.config.get("DISPENSING_TRACE_SYNC_INTERVAL", self.sync_interval)
+        self.max_duration = app.config.get("DISPENSING_TRACE_MAX_DURATION", self.max_duration)
+        app.extensions["dispensing_traces"] = self
+        acquisition.add_listener(self._on_sample)
+        if acquisition.enabled and self.sync_interval:
+            self.start_sync()
+
+    def start_sync(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="dispensing-trace-sync", daemon=True)
+            self._thread.start()
+
+    def stop_sync(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            with self.app.app_context():
+                try:
+                    self.sync()
+                except Exception as e:
+                    from extensions import db
+                    db.session.rollback()
+                    print(f"Dispensing trace sync failed: {e}")
+
+    def _on_sample(self, sample):
+        for recording in list(self._recordings.values()):
+            if recording.scale_id == sample.scale_id:
+                recording.add(sample)
+
+    def recording(self, dispensing_id):
+        return dispensing_id in self._recordings
+
+    def start(self, dispensing_id, scale_id):
+        """Start (or restart) recording; LookupError for an unknown dispensing or scale"""
+        from extensions import db, acquisition
+        from models.production import BatchMaterialDispensing, DispensingTrace
+
+        if db.session.get(BatchMaterialDispensing, dispensing_id) is None:
+            raise LookupError(f"Dispensing {dispensing_id} not found")
+        scale_id = acquisition.channel(scale_id).scale_id
+        recording = _Recording(dispensing_id, scale_id, self.max_samples)
+
+        trace = db.session.get(DispensingTrace, dispensing_id) or DispensingTrace(dispensing_id=dispensing_id)
+        trace.scale_id = scale_id
+        trace.status = "recording"
+        trace.started_at = datetime.fromtimestamp(recording.started, tz=timezone.utc).replace(tzinfo=None)
+        trace.duration = trace.sample_count = trace.size_bytes = None
+        trace.truncated = False
+        trace.data = None
+        db.session.add(trace)
+        db.session.commit()
+        recording.started_at = trace.started_at  # reloaded: the value as the database stored it
+        with self._lock:
+            self._recordings[dispensing_id] = recording
+        return trace
+
+    def _adopt(self, dispensing_id, scale_id, started_at):
+        """Buffer a trace another worker started, backfilled from the local sample ring"""
+        from extensions import acquisition
+
+        started = started_at.replace(tzinfo=timezone.utc).timestamp()
+        recording = _Recording(dispensing_id, scale_id, self.max_samples, started)
+        recording.started_at = started_at
+        channel = acquisition.channels.get(scale_id)
+        ring = channel.ring if channel is not None else None
+        samples = ring.recent(ring.capacity) if ring is not None else []
+        if ring is not None and len(samples) == ring.capacity and samples[0].timestamp > started:
+            recording.truncated = True  # the ring no longer reaches back to the start
+        for sample in samples:
+            recording.add(sample)
+        with self._lock:
+            recording = self._recordings.setdefault(dispensing_id, recording)
+        if ring is not None:
+            # Samples that arrived while registering; add() skips what it already has
+            for sample in ring.recent(ring.capacity):
+                recording.add(sample)
+        self.adopted += 1
+        return recording
+
+    def sync(self):
+        """Adopt recording rows, drop the ones stopped elsewhere, expire orphans; needs an app context"""
+        from extensions import db
+        from models.production import DispensingTrace
+
+        checked = time.time()
+        rows = {row.dispensing_id: row for row in db.session.execute(
+            db.select(DispensingTrace.dispensing_id, DispensingTrace.scale_id, DispensingTrace.started_at)
+            .where(DispensingTrace.status == "recording")
+        )}
+        db.session.rollback()  # end the read transaction before the slow part
+        with self._lock:
+            for dispensing_id, recording in list(self._recordings.items()):
+                row = rows.get(dispensing_id)
+                if recording.started > checked:
+                    continue  # started after the query
+                if row is None or row.started_at != recording.started_at:
+                    del self._recordings[dispensing_id]  # stored or restarted by another worker
+        for dispensing_id, row in rows.items():
+            if checked - row.started_at.replace(tzinfo=timezone.utc).timestamp() > self.max_duration:
+                with self._lock:
+                    recording = self._recordings.pop(dispensing_id, None)
+                if recording is None or recording.started_at != row.started_at:
+                    recording = _Recording(dispensing_id, row.scale_id, self.max_samples,
+                                           row.started_at.replace(tzinfo=timezone.utc).timestamp())
+                    recording.started_at = row.started_at
+                recording.truncated = True
+                if self._store(recording) is not None:
+                    self.expired += 1
+            elif dispensing_id not in self._recordings:
+                self._adopt(dispensing_id, row.scale_id, row.started_at)
+
+    def stop(self, dispensing_id):
+        """Encode and store the trace; None if it isn't being recorded"""
+        from extensions import db
+        from models.production import DispensingTrace
+
+        with self._lock:
+            recording = self._recordings.pop(dispensing_id, None)
+        with self.app.app_context():
+            if recording is None:
+                # Started on another worker and not adopted here yet
+                trace = db.session.get(DispensingTrace, dispensing_id)
+                if trace is None or trace.status != "recording":
+                    return None
+                self._adopt(trace.dispensing_id, trace.scale_id, trace.started_at)
+                with self._lock:
+                    recording = self._recordings.pop(dispensing_id, None)
+                if recording is None:
+                    return None
+            return self._store(recording)
+
+    def _store(self, recording):
+        """Write the trace if its row is still this recording; the stored trace's dict, else None"""
+        from extensions import db
+        from models.production import DispensingTrace
+
+        times, weights = list(recording.times), list(recording.weights)
+        blob = encode_trace(times, weights)
+        stored = db.session.execute(
+            db.update(DispensingTrace)
+            .where(DispensingTrace.dispensing_id == recording.dispensing_id,
+                   DispensingTrace.status == "recording",
+                   DispensingTrace.started_at == recording.started_at)
+            .values(status="complete", encoding=ENCODING,
+                    duration=round(times[-1], 3) if times else 0.0,
+                    sample_count=len(times), truncated=recording.truncated,
+                    size_bytes=len(blob), data=blob)
+        ).rowcount
+        db.session.commit()
+        trace = db.session.get(DispensingTrace, recording.dispensing_id)
+        if trace is None:  # the dispensing was deleted meanwhile
+            return None
+        if stored:
+            self.stored += 1
+            self.stored_bytes += len(blob)
+        elif trace.status != "complete":
+            return None  # restarted meanwhile
+        return trace.to_dict()
+
+    def stats(self):
+        return {
+            "recording": [
+                {"dispensing_id": r.dispensing_id, "scale_id": r.scale_id, "samples": len(r.times)}
+                for r in list(self._recordings.values())
+            ],
+            "stored": self.stored,
+            "stored_bytes": self.stored_bytes,
+            "adopted": self.adopted,
+            "expired": self.expired,
+        }
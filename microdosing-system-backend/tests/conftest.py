@@ -0,0 +1,41 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py builds the app at import time, so the environment has to be in place first
+_workdir = tempfile.mkdtemp(prefix="microdosing-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    "FLASK_ENV": "development",
+    "SCALE_ACQUISITION_ENABLED": "false",
+    "SCALE_TABLE_PATH": "",
+    "SCALES": "[]",
+    "WEIGHT_ROLLUP_ENABLED": "false",
+    "EXPORT_JOBS_ENABLED": "false",
+    "BARCODE_CACHE_DIR": os.path.join(_workdir, "barcodes"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def session(app):
+    from extensions import db
+
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
@@ -0,0 +1,88 @@
+# tests/test_production_orders.py
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+
+@contextmanager
+def count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed_orders(session, count, prefix):
+    """count planned orders, each created by its own user"""
+    from models.user import User
+    from models.recipe import Recipe
+    from models.production import ProductionOrder
+
+    users = [
+        User(username=f"{prefix}-user-{i}", full_name=f"User {i}", email=f"{prefix}-{i}@example.com",
+             password_hash=generate_password_hash("pw", method="pbkdf2:sha256:1000"), role="operator")
+        for i in range(count)
+    ]
+    session.add_all(users)
+    session.flush()
+    recipe = Recipe(name=f"{prefix} recipe", code=f"{prefix}-R", version="1", created_by=users[0].user_id)
+    session.add(recipe)
+    session.flush()
+    session.add_all([
+        ProductionOrder(order_number=f"{prefix}-{i}", recipe_id=recipe.recipe_id, batch_size=1,
+                        scheduled_date=date(2026, 1, 1) + timedelta(days=i), status="planned",
+                        created_by=user.user_id)
+        for i, user in enumerate(users)
+    ])
+    session.commit()
+
+
+@pytest.mark.parametrize("query", ["", "?limit=50", "?status=planned&date_from=2026-01-01"])
+def test_list_runs_a_constant_number_of_queries(app, client, session, query):
+    from extensions import db
+
+    seed_orders(session, 3, f"few{len(query)}")
+    with count_queries(db.engine) as few:
+        response = client.get(f"/api/production_orders{query}")
+    assert response.status_code == 200
+
+    seed_orders(session, 20, f"many{len(query)}")
+    with count_queries(db.engine) as many:
+        response = client.get(f"/api/production_orders{query}")
+    assert response.status_code == 200
+
+    body = response.get_json()
+    orders = body if isinstance(body, list) else body["orders"]
+    assert len({order["created_by_username"] for order in orders}) >= 23
+    assert len(many) == len(few)
+
+
+def test_cursor_pages_cover_every_order_once(app, client, session):
+    seed_orders(session, 5, "paged")
+    seen = []
+    url = "/api/production_orders?limit=2&status=planned"
+    while url:
+        body = client.get(url).get_json()
+        assert len(body["orders"]) <= 2
+        seen += [order["order_number"] for order in body["orders"]]
+        cursor = body["next_cursor"]
+        url = f"/api/production_orders?limit=2&status=planned&cursor={cursor}" if cursor else None
+    paged = [number for number in seen if number.startswith("paged-")]
+    assert paged == [f"paged-{i}" for i in range(5)]
+    assert len(seen) == len(set(seen))
+
+
+@pytest.mark.parametrize("limit", [-1, -50])
+def test_negative_limit_is_rejected(app, client, limit):
+    response = client.get(f"/api/production_orders?limit={limit}")
+    assert response.status_code == 400
+    assert "limit" in response.get_json()["error"]
@@ -52,43 +52,29 @@ const ActiveOrders = () => {
           return;
         }
 
-        // Fallback to recipe materials if no active material
-        const recipeResponse = await axios.get('http://127.0.0.1:5000/api/recipe_materials');
-        const recipeMaterials = recipeResponse.data || [];
-
-        const enrichedMaterials = await Promise.all(
-          recipeMaterials.map(async (mat, idx) => {
-            try {
-              const [recipeRes, materialRes] = await Promise.all([
-                axios.get(`http://127.0.0.1:5000/api/recipes/${mat.recipe_id}`),
-                axios.get(`http://127.0.0.1:5000/api/materials/${mat.material_id}`),
-              ]);
-
-              return {
-                id: mat.recipe_material_id || idx + 1,
-                title: materialRes.data?.title || `Material #${mat.material_id}`,
-                recipeName: recipeRes.data?.name || `Recipe #${mat.recipe_id}`,
-                barcode: materialRes.data?.barcode_id,
-                setPoint: mat.set_point,
-                actual: mat.actual,
-                unit: materialRes.data?.unit_of_measure || '',
-                status: mat.status,
-                dosed: false,
-                margin: materialRes.data?.margin,
-              };
-            } catch (innerErr) {
-
-              alert(`Error fetching names for recipe_id ${mat.recipe_id} or material_id ${mat.material_id} : ${innerErr}`);
-              return null;
-            }
-          })
-        );
-
-        const validMaterials = enrichedMaterials.filter(Boolean);
+        // Fallback to the active recipe: one request returns the recipe and all of its materials
+        const dosingResponse = await axios.get('http://127.0.0.1:5000/api/active_dosing', {
+          params: { include_scale: false },
+        });
+        const { recipe, materials: recipeMaterials = [] } = dosingResponse.data || {};
+
+        const validMaterials = recipeMaterials.map((mat, idx) => ({
+          id: mat.recipe_material_id || idx + 1,
+          title: mat.title || `Material #${mat.material_id}`,
+          recipeName: recipe?.name || `Recipe #${recipe?.recipe_id}`,
+          barcode: mat.barcode_id,
+          setPoint: mat.set_point,
+          actual: mat.actual,
+          unit: mat.unit_of_measure || '',
+          status: mat.status,
+          dosed: false,
+          margin: mat.margin,
+        }));
+
         setOrder(prev => ({
           ...prev,
           materials: validMaterials,
-          recipe_name: validMaterials[0]?.recipeName || 'Formula A',
+          recipe_name: recipe?.name || 'Formula A',
         }));
 
       } catch (error) {
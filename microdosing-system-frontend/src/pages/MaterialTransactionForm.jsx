@@ -71,17 +71,14 @@ const MaterialTransactionForm = () => {
       const changed = updatedMaterials.find((mat) => mat.material_id === material_id);
       const original = materials.find((mat) => mat.material_id === material_id);
 
-      if (!changed || changed.current_quantity === original?.current_quantity) return;
+      if (!changed || changed.current_quantity === original?.current_quantity) return false;
 
+      // The balance itself is moved by the transaction posted in handleSubmit
       setMaterials(updatedMaterials);
-
-      await axios.put(`http://127.0.0.1:5000/api/materials/${material_id}`, {
-        current_quantity: changed.current_quantity,
-      });
-
-      alert("Quantity added successfully!");
+      return true;
     } catch (error) {
       alert(`Error adding quantity: ${error}`);
+      return false;
     }
   };
 
@@ -107,17 +104,14 @@ const MaterialTransactionForm = () => {
       const changed = updatedMaterials.find((mat) => mat.material_id === material_id);
       const original = materials.find((mat) => mat.material_id === material_id);
 
-      if (!changed || changed.current_quantity === original?.current_quantity) return;
+      if (!changed || changed.current_quantity === original?.current_quantity) return false;
 
+      // The balance itself is moved by the transaction posted in handleSubmit
       setMaterials(updatedMaterials);
-
-      await axios.put(`http://127.0.0.1:5000/api/materials/${material_id}`, {
-        current_quantity: changed.current_quantity,
-      });
-
-      alert("Quantity removed successfully!");
+      return true;
     } catch (error) {
       alert(`Error subtracting quantity: ${error}`);
+      return false;
     }
   };
 
@@ -131,13 +125,13 @@ const MaterialTransactionForm = () => {
     }
 
     try {
-      if (transaction_type === "addition") {
-        await handleAddQuantity(material_id);
-      } else if (transaction_type === "removal") {
-        await handleSubtractQuantity(material_id);
-      }
+      const allowed = transaction_type === "addition"
+        ? await handleAddQuantity(material_id)
+        : await handleSubtractQuantity(material_id);
+      if (!allowed) return;
 
       await axios.post("http://127.0.0.1:5000/api/material-transactions", transaction);
+      alert(transaction_type === "addition" ? "Quantity added successfully!" : "Quantity removed successfully!");
       navigate("/material");
     } catch (error) {
       alert(`Error handling transaction: ${error}`);